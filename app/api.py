@@ -1,22 +1,102 @@
 from datetime import datetime
 
+import numpy as np
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.utils import timezone
 
-from . import enums
-from .oanda import Endpoint
+from . import enums, resample
+from .cassette import Cassette
+from .oanda import AsyncEndpoint, Endpoint, decode_candles
+from .stream import PricingStream, QuoteBoard
+from .throttle import CircuitBreaker, TokenBucket
 
 API_ACCOUNT = settings.OANDA_API
 API_TOKEN = settings.OANDA_SECRET
 BASE_URL = settings.OANDA_BASE_URL
+STREAM_URL = settings.OANDA_STREAM_URL
+CONCURRENCY = settings.OANDA_CONCURRENCY
+CONFAC_TTL = 60  # Home conversions change slowly, refresh them once a minute
+RESAMPLE_BASE = settings.OANDA_RESAMPLE_BASE
+RESAMPLE_SIZE = settings.OANDA_RESAMPLE_SIZE
+MAX_COUNT = 5000  # Candles per request at most
 
-api = Endpoint(API_ACCOUNT, API_TOKEN, BASE_URL)
+# Rate limiters and circuit breaker are shared by sync and async endpoints
+limiters = {k: TokenBucket(*v) for k, v in settings.OANDA_RATE_LIMITS.items()}
+breaker = CircuitBreaker(*settings.OANDA_CIRCUIT_BREAKER)
+
+# Requests are recorded to or replayed from the cassette if it's set
+cassette = (
+    Cassette(
+        settings.OANDA_CASSETTE,
+        settings.OANDA_CASSETTE_MODE,
+        settings.OANDA_CASSETTE_REALTIME,
+    )
+    if settings.OANDA_CASSETTE
+    else None
+)
+
+api = Endpoint(
+    API_ACCOUNT,
+    API_TOKEN,
+    BASE_URL,
+    limiters=limiters,
+    breaker=breaker,
+    cassette=cassette,
+)
+quotes = QuoteBoard()
+_stream: PricingStream | None = None
+
+
+def async_api() -> AsyncEndpoint:
+    """Return a new async endpoint, it has to be entered inside of the running loop."""
+    return AsyncEndpoint(
+        API_ACCOUNT,
+        API_TOKEN,
+        BASE_URL,
+        concurrency=CONCURRENCY,
+        limiters=limiters,
+        breaker=breaker,
+        cassette=cassette,
+    )
+
+
+def use_cassette(new: Cassette | None):
+    """Record to or replay from the given cassette from now on, None goes back to the API."""
+    global cassette
+    cassette = api.api.cassette = new
+
+
+def get_client_state() -> dict:
+    """Return state of the rate limiters, the circuit breaker and request metrics."""
+    return api.api.get_state()
+
+
+def start_stream(pairs: list[str]):
+    """Start streaming prices of the pairs into "quotes" unless it's already running."""
+    global _stream
+    # Streamed prices aren't recorded, replays use the recorded pricing requests
+    if not settings.OANDA_STREAMING or (cassette and cassette.mode == Cassette.REPLAY):
+        return
+    if _stream and _stream.is_alive() and set(pairs) <= set(_stream.instruments):
+        return
+    if _stream:
+        _stream.stop()
+    _stream = PricingStream(
+        API_ACCOUNT,
+        API_TOKEN,
+        STREAM_URL,
+        sorted(set(pairs) | set(_stream.instruments if _stream else [])),
+        quotes,
+    )
+    _stream.start()
 
 
 def get_account() -> dict:
     if data := api.summary():
         return {
             "account_margin": float(data["account"]["marginAvailable"]),
+            "last_transaction_id": data["lastTransactionID"],
         }
     return {}
 
@@ -27,26 +107,343 @@ def get_instruments() -> list:
     return []
 
 
+class CandleCache:
+    """
+    Window of the latest candles per instrument and granularity stored as columnar arrays.
+    Once the window is filled only candles newer than its last complete one are requested.
+    Empty windows are seeded from the "store" and fetched candles are saved into it.
+    Arrays are read-only since analysis frames wrap them without copying.
+    """
+
+    def __init__(self):
+        self.windows: dict[tuple[str, str], dict[str, np.ndarray]] = {}
+        self.seeded: set[tuple[str, str]] = set()
+        self.store = None  # Set to "Candle.objects" when the app is ready
+
+    def seed(self, pair: str, interval: str, count: int):
+        """Fill an empty window with stored candles once."""
+        key = (pair, interval)
+        if self.store is None or key in self.seeded:
+            return
+        self.seeded.add(key)
+        candles = self.store.arrays(pair, interval, count=count)
+        if len(candles["time"]) > self.size(key):
+            self.windows[key] = _freeze(candles)
+
+    def save(self, pair: str, interval: str, candles: dict[str, np.ndarray]):
+        if self.store is not None:
+            self.store.upsert(pair, interval, candles)
+
+    def size(self, key: tuple[str, str]) -> int:
+        return len(self.windows[key]["time"]) if key in self.windows else 0
+
+    def since(self, pair: str, interval: str, count: int) -> float | None:
+        """Return time of the last complete candle or None if the window has to be fetched whole."""
+        key = (pair, interval)
+        if self.size(key) < count:
+            return None
+        window = self.windows[key]
+        complete = np.flatnonzero(window["complete"])
+        if complete.size:
+            return float(window["time"][complete[-1]])
+        return None
+
+    def merge(
+        self,
+        pair: str,
+        interval: str,
+        count: int,
+        candles: dict[str, np.ndarray],
+        since: float | None = None,
+    ) -> dict[str, np.ndarray]:
+        """Append new candles replacing the incomplete ones and evict the oldest."""
+        key = (pair, interval)
+        if since is None:
+            window = candles
+        else:
+            window = self.windows[key]
+            size = self.size(key)
+            keep = np.searchsorted(window["time"], since, side="right")
+            window = {
+                k: np.concatenate([v[:keep], candles[k]])[-size:]
+                for k, v in window.items()
+            }
+        self.windows[key] = window = _freeze(window)
+        return {k: v[-count:] for k, v in window.items()}
+
+
+def _freeze(candles: dict[str, np.ndarray]) -> dict[str, np.ndarray]:
+    for v in candles.values():
+        v.flags.writeable = False
+    return candles
+
+
+candle_cache = CandleCache()
+resamplers: dict[str, resample.Resampler] = {}
+
+
+def _resampler(pair: str, interval: str, count: int) -> resample.Resampler | None:
+    """Return the resampler of the pair if candles of the interval are built from the base."""
+    if not RESAMPLE_BASE:
+        return None
+    base, minutes = resample.INTERVALS[RESAMPLE_BASE], resample.INTERVALS[interval]
+    if (
+        minutes < base
+        or minutes % base
+        or (count + 1) * minutes // base > RESAMPLE_SIZE
+    ):
+        return None
+    if pair not in resamplers:
+        resamplers[pair] = resample.Resampler(base, RESAMPLE_SIZE)
+    return resamplers[pair]
+
+
+def _join_pages(pages: list[dict]) -> dict[str, np.ndarray]:
+    """Decode pages of candles fetched backwards, the newest first, into one window."""
+    windows = [decode_candles(x["candles"]) for x in reversed(pages)]
+    for k in range(len(windows) - 1):
+        keep = np.searchsorted(windows[k]["time"], windows[k + 1]["time"][:1])[0]
+        windows[k] = {f: v[:keep] for f, v in windows[k].items()}
+    return {f: np.concatenate([x[f] for x in windows]) for f in resample.FIELDS}
+
+
+def _base_requests(resampler: resample.Resampler, need: int):
+    """
+    Requests of the base candles the resampler is missing, a generator that yields the
+    arguments of every request, is sent its response and returns the responses to keep.
+    Only candles newer than the last complete one are requested, missing history
+    is fetched backwards in pages.
+    """
+    pages = []
+    if since := resampler.since(need):
+        data = yield {"count": MAX_COUNT, "since": since, "include_first": False}
+        # There is a gap bigger than a page, fetch the history again
+        if data and len(data["candles"]) >= MAX_COUNT:
+            since = None
+        elif data:
+            pages.append(data)
+    if not since:
+        to = None
+        while (fetched := sum(len(x["candles"]) for x in pages)) < need:
+            data = yield {"count": min(need - fetched, MAX_COUNT), "to": to}
+            if not data or not data["candles"]:
+                break
+            pages.append(data)
+            to = float(data["candles"][0]["time"])
+    return pages
+
+
+def _resampled(
+    resampler: resample.Resampler, interval: str, count: int, candles: dict | None
+) -> dict:
+    if candles is not None:
+        resampler.update(candles)
+    if not len(resampler):
+        return {}
+    return {"ohlc": _freeze(resampler.get(resample.INTERVALS[interval], count))}
+
+
+def _need(resampler: resample.Resampler, interval: str, count: int) -> int:
+    """Base candles the last "count" candles of the interval and the one before span."""
+    return (count + 1) * resample.INTERVALS[interval] // resampler.base
+
+
+def get_resampled_data(
+    resampler: resample.Resampler, pair: str, interval: str, count: int
+) -> dict:
+    """Candles of the interval built from the base granularity, see "_base_requests"."""
+    need = _need(resampler, interval, count)
+    if not len(resampler) and candle_cache.store is not None:
+        resampler.update(candle_cache.store.arrays(pair, RESAMPLE_BASE, count=need))
+
+    requests = _base_requests(resampler, need)
+    try:
+        params = next(requests)
+        while True:
+            params = requests.send(api.candles(pair, RESAMPLE_BASE, **params))
+    except StopIteration as stop:
+        pages = stop.value
+
+    candles = _join_pages(pages) if pages else None
+    if candles is not None:
+        candle_cache.save(pair, RESAMPLE_BASE, candles)
+    return _resampled(resampler, interval, count, candles)
+
+
+async def aget_resampled_data(
+    endpoint: AsyncEndpoint,
+    resampler: resample.Resampler,
+    pair: str,
+    interval: str,
+    count: int,
+) -> dict:
+    """Async counterpart of "get_resampled_data"."""
+    need = _need(resampler, interval, count)
+    if not len(resampler) and candle_cache.store is not None:
+        resampler.update(
+            await sync_to_async(candle_cache.store.arrays)(
+                pair, RESAMPLE_BASE, count=need
+            )
+        )
+
+    requests = _base_requests(resampler, need)
+    try:
+        params = next(requests)
+        while True:
+            params = requests.send(
+                await endpoint.candles(pair, RESAMPLE_BASE, **params)
+            )
+    except StopIteration as stop:
+        pages = stop.value
+
+    candles = _join_pages(pages) if pages else None
+    if candles is not None:
+        await sync_to_async(candle_cache.save)(pair, RESAMPLE_BASE, candles)
+    return _resampled(resampler, interval, count, candles)
+
+
+def _window_requests(pair: str, interval: str, count: int):
+    """
+    Requests of the candles the cached window is missing, a generator like "_base_requests"
+    that returns the decoded candles and the time they follow, None if there are none.
+    Only candles newer than the last complete one are requested once the window is filled.
+    """
+    since = candle_cache.since(pair, interval, count)
+    if since:
+        data = yield {"count": count, "since": since, "include_first": False}
+        # There is a gap bigger than the window, fetch it whole
+        if data and len(data["candles"]) >= count:
+            since = None
+    if not since:
+        data = yield {"count": count}
+    if data and (data["candles"] or since):
+        return decode_candles(data["candles"]), since
+    return None, since
+
+
+def _merged(
+    pair: str, interval: str, count: int, candles: dict | None, since: float | None
+) -> dict:
+    if candles is None:
+        return {}
+    return {"ohlc": candle_cache.merge(pair, interval, count, candles, since)}
+
+
 def get_ohlc_data(
     pair: str,
     interval: str,
     count: int,
 ) -> dict:
-    if data := api.candles(pair, interval, count):
-        return {"ohlc": data["candles"], "last_ohlc": data["candles"][-1]}
-    return {}
+    if (resampler := _resampler(pair, interval, count)) is not None:
+        return get_resampled_data(resampler, pair, interval, count)
+    candle_cache.seed(pair, interval, count)
+
+    requests = _window_requests(pair, interval, count)
+    try:
+        params = next(requests)
+        while True:
+            params = requests.send(api.candles(pair, interval, **params))
+    except StopIteration as stop:
+        candles, since = stop.value
+
+    if candles is not None:
+        candle_cache.save(pair, interval, candles)
+    return _merged(pair, interval, count, candles, since)
+
+
+async def aget_ohlc_data(
+    endpoint: AsyncEndpoint,
+    pair: str,
+    interval: str,
+    count: int,
+) -> dict:
+    """Async counterpart of "get_ohlc_data"."""
+    if (resampler := _resampler(pair, interval, count)) is not None:
+        return await aget_resampled_data(endpoint, resampler, pair, interval, count)
+    # The store is only accessible synchronously
+    await sync_to_async(candle_cache.seed)(pair, interval, count)
+
+    requests = _window_requests(pair, interval, count)
+    try:
+        params = next(requests)
+        while True:
+            params = requests.send(await endpoint.candles(pair, interval, **params))
+    except StopIteration as stop:
+        candles, since = stop.value
+
+    if candles is not None:
+        await sync_to_async(candle_cache.save)(pair, interval, candles)
+    return _merged(pair, interval, count, candles, since)
 
 
 def get_spread(pair: str) -> dict:
-    if data := api.pricing(pair):
-        return {
-            "tradeable": True if data["prices"][0]["status"] == "tradeable" else False,
-            "bid_price": float(data["prices"][0]["bids"][0]["price"]),
-            "ask_price": float(data["prices"][0]["asks"][0]["price"]),
-            "baseconfac": float(data["homeConversions"][0]["accountLoss"]),
-            "quoteconfac": float(data["homeConversions"][1]["accountLoss"]),
-        }
-    return {}
+    base, quote = pair.split("_")
+    return get_pricing([pair]).get(pair, base, quote)
+
+
+class PricingSnapshot:
+    """
+    Prices of a set of instruments and home conversions of their currencies
+    taken with a single request, so every bot decides against the same quotes.
+    """
+
+    def __init__(self, data: dict | None = None):
+        self.prices = {}
+        self.confacs = {}
+        if data:
+            for price in data["prices"]:
+                self.prices[price["instrument"]] = {
+                    "tradeable": price["status"] == "tradeable",
+                    "bid_price": float(price["bids"][0]["price"]),
+                    "ask_price": float(price["asks"][0]["price"]),
+                }
+            for conversion in data.get("homeConversions", []):
+                self.confacs[conversion["currency"]] = float(conversion["accountLoss"])
+
+    def get(self, pair: str, base: str, quote: str) -> dict:
+        """Return pricing of the pair in the same format as "get_spread"."""
+        if pair in self.prices and base in self.confacs and quote in self.confacs:
+            return self.prices[pair] | {
+                "baseconfac": self.confacs[base],
+                "quoteconfac": self.confacs[quote],
+            }
+        return {}
+
+    @classmethod
+    def from_board(cls, board: QuoteBoard, pairs: list[str]):
+        """Take the snapshot from the streamed quotes instead of requesting it."""
+        snapshot = cls()
+        for pair in pairs:
+            quote = board.quotes[pair]
+            snapshot.prices[pair] = {
+                "tradeable": quote.tradeable,
+                "bid_price": quote.bid_price,
+                "ask_price": quote.ask_price,
+            }
+        snapshot.confacs = board.confacs
+        return snapshot
+
+
+def get_pricing(pairs: list[str]) -> PricingSnapshot:
+    if quotes.has(pairs) and quotes.confacs_age() < CONFAC_TTL:
+        return PricingSnapshot.from_board(quotes, pairs)
+    if pairs and (data := api.pricing(pairs)):
+        return _set_pricing(data)
+    return PricingSnapshot()
+
+
+async def aget_pricing(endpoint: AsyncEndpoint, pairs: list[str]) -> PricingSnapshot:
+    if quotes.has(pairs) and quotes.confacs_age() < CONFAC_TTL:
+        return PricingSnapshot.from_board(quotes, pairs)
+    if pairs and (data := await endpoint.pricing(pairs)):
+        return _set_pricing(data)
+    return PricingSnapshot()
+
+
+def _set_pricing(data: dict) -> PricingSnapshot:
+    snapshot = PricingSnapshot(data)
+    quotes.set_confacs(snapshot.confacs)
+    return snapshot
 
 
 def open_position(
@@ -93,17 +490,46 @@ def adjust_stop_loss(
 
 def get_trade(trade_id: str) -> dict:
     if data := api.get_trade(trade_id):
-        status = enums.OrderStatus(data["trade"]["state"])
-        if status == enums.OrderStatus.CLOSED:
-            return {
-                "status": status,
-                "closetm": datetime.fromtimestamp(
-                    float(data["trade"].get("closeTime")),
-                    tz=timezone.get_current_timezone(),
-                ),
-                "net": round(float(data["trade"].get("realizedPL")), 2),
-                "closeprice": float(data["trade"].get("averageClosePrice")),
-            }
-        else:
-            return {"status": status}
+        return _parse_trade(data["trade"])
+    return {}
+
+
+def get_open_trades() -> dict | None:
+    """Return open trades by their ID or None if they couldn't be requested."""
+    if data := api.open_trades():
+        return {x["id"]: x for x in data["trades"]}
+    return None
+
+
+def get_changes(since: str) -> dict:
+    """
+    Return trades closed after the given transaction, the last transaction ID
+    and the margin available now.
+    """
+    if data := api.changes(since):
+        changes = {
+            "closed": {
+                x["id"]: _parse_trade(x) for x in data["changes"]["tradesClosed"]
+            },
+            "last_transaction_id": data["lastTransactionID"],
+        }
+        if "marginAvailable" in data.get("state", {}):
+            changes["account_margin"] = float(data["state"]["marginAvailable"])
+        return changes
     return {}
+
+
+def _parse_trade(trade: dict) -> dict:
+    status = enums.OrderStatus(trade["state"])
+    if status == enums.OrderStatus.CLOSED:
+        return {
+            "status": status,
+            "closetm": datetime.fromtimestamp(
+                float(trade.get("closeTime")),
+                tz=timezone.get_current_timezone(),
+            ),
+            "net": round(float(trade.get("realizedPL")), 2),
+            "closeprice": float(trade.get("averageClosePrice")),
+        }
+    else:
+        return {"status": status}
@@ -4,3 +4,9 @@ from django.apps import AppConfig  # type: ignore
 class AppConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "app"
+
+    def ready(self):
+        from . import api
+        from .models import Candle
+
+        api.candle_cache.store = Candle.objects
@@ -0,0 +1,723 @@
+import copy
+import gc
+import json
+import multiprocessing
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from . import candles, enums, incremental, indicators, panel, pipeline, resample, ta
+from .metrics import Registry
+from .oanda import decode_candles, loads
+from .tests import legacy
+from .utils import get_ohlc_analysis, prep_data
+
+# Slowdown or memory growth against a baseline that counts as a regression
+REGRESSION_THRESHOLD = 0.2
+
+
+def ohlc_arrays(shape: int | tuple[int, int], seed: int = 0) -> tuple:
+    """Return synthetic open, high, low and close prices, time is the last axis."""
+    rng = np.random.default_rng(seed)
+    close = 1.1 + np.cumsum(rng.normal(0, 0.0005, shape), axis=-1)
+    open_ = np.concatenate([close[..., :1], close[..., :-1]], axis=-1)
+    high = np.maximum(open_, close) + rng.uniform(0, 0.0005, shape)
+    low = np.minimum(open_, close) - rng.uniform(0, 0.0005, shape)
+    return open_, high, low, close
+
+
+def candles_payload(n: int, seed: int = 0) -> bytes:
+    """Return a synthetic candles response of the OANDA API."""
+    rng = np.random.default_rng(seed)
+    open_, high, low, close = ohlc_arrays(n, seed)
+    candles = [
+        {
+            "complete": i < n - 1,
+            "volume": int(rng.integers(1, 1000)),
+            "time": f"{1700000000 + 300 * i}.000000000",
+            "mid": {
+                "o": f"{open_[i]:.5f}",
+                "h": f"{high[i]:.5f}",
+                "l": f"{low[i]:.5f}",
+                "c": f"{close[i]:.5f}",
+            },
+        }
+        for i in range(n)
+    ]
+    return json.dumps(
+        {"instrument": "EUR_USD", "granularity": "M5", "candles": candles}
+    ).encode()
+
+
+def measure(func, repeat: int = 5) -> dict:
+    """
+    Return the best wall time, the peak of memory allocated by a single call
+    and the memory blocks it allocated that are still held once it returns, with their size.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    result = func()
+    retained, peak = tracemalloc.get_traced_memory()
+    retained_blocks = len(tracemalloc.take_snapshot().traces)
+    tracemalloc.stop()
+    del result
+
+    return {
+        "ms": round(min(times) * 1000, 3),
+        "peak_kib": round(peak / 1024, 1),
+        "retained_blocks": retained_blocks,
+        "retained_kib": round(retained / 1024, 1),
+    }
+
+
+def bench_decode(sizes: list[int]) -> list[dict]:
+    """
+    Compare parsing a candles response with "json" against the installed parser,
+    and decoding parsed candles into a DataFrame, legacy against columnar.
+    """
+    results = []
+    for n in sizes:
+        payload = candles_payload(n)
+        candles = loads(payload)["candles"]
+
+        results.append(
+            {"stage": "parse", "impl": "json", "n": n}
+            | measure(lambda: json.loads(payload))
+        )
+        results.append(
+            {"stage": "parse", "impl": loads.__module__, "n": n}
+            | measure(lambda: loads(payload))
+        )
+        results.append(
+            {"stage": "decode", "impl": "legacy", "n": n}
+            | measure(lambda: legacy.prep_data(candles))
+        )
+        results.append(
+            {"stage": "decode", "impl": "columnar", "n": n}
+            | measure(lambda: prep_data({"ohlc": decode_candles(candles)}))
+        )
+    return results
+
+
+def bench_metrics(sizes: list[int]) -> list[dict]:
+    """Cost of recording requests in the metrics registry."""
+    endpoints = [
+        "instruments/EUR_USD/candles",
+        "accounts/001-001-1234567-001/pricing",
+        "accounts/001-001-1234567-001/orders/1234",
+    ]
+    results = []
+    for n in sizes:
+        latencies = np.random.default_rng(0).lognormal(-3, 1, n).tolist()
+
+        def observe():
+            metrics = Registry()
+            for i, latency in enumerate(latencies):
+                metrics.observe("GET", endpoints[i % 3], 200, latency, 0, 4096)
+
+        results.append(
+            {"stage": "observe", "impl": "registry", "n": n} | measure(observe)
+        )
+    return results
+
+
+def ohlc_frame(n: int, seed: int = 0) -> pd.DataFrame:
+    """Return synthetic candles as a DataFrame like `prep_data` does."""
+    ohlc = decode_candles(loads(candles_payload(n, seed))["candles"])
+    return prep_data({"ohlc": ohlc})["df"]
+
+
+def _batch_indicators(df: pd.DataFrame) -> pd.DataFrame:
+    df = indicators.get_ema(df.copy())
+    df = indicators.get_atr(df)
+    df = indicators.get_rsi(df)
+    df = indicators.bollinger_bands(df)
+    df = indicators.get_stochastic_oscillator(df)
+    return df
+
+
+def _incremental_indicators() -> dict[str, incremental.Indicator]:
+    return {
+        "MA": incremental.EMA(),
+        "ATR": incremental.ATR(),
+        "RSI": incremental.RSI(),
+        "BB": incremental.Bollinger(),
+        "SO": incremental.Stochastic(),
+    }
+
+
+def _update(ind: dict[str, incremental.Indicator], high, low, close) -> dict:
+    bbl, bbh, bbd = ind["BB"].update(close)
+    return {
+        "MA": ind["MA"].update(close),
+        "ATR": ind["ATR"].update(high, low, close),
+        "RSI": ind["RSI"].update(close),
+        "BBL": bbl,
+        "BBH": bbh,
+        "BBD": bbd,
+        "SO": ind["SO"].update(high, low, close),
+    }
+
+
+def bench_incremental(sizes: list[int]) -> list[dict]:
+    """
+    Compare recomputing the indicators over a window of n bars against one update
+    of indicators fed the same bars, and the cost of serializing their state.
+    """
+    results = []
+    for n in sizes:
+        df = ohlc_frame(n)
+        ind = _incremental_indicators()
+        for high, low, close in zip(df.High, df.Low, df.Close):
+            _update(ind, high, low, close)
+
+        bar = (df.High.iat[-1], df.Low.iat[-1], df.Close.iat[-1])
+        results.append(
+            {"stage": "indicators", "impl": "batch", "n": n}
+            | measure(lambda: _batch_indicators(df))
+        )
+        results.append(
+            {"stage": "indicators", "impl": "update", "n": n}
+            | measure(lambda: _update(ind, *bar))
+        )
+        results.append(
+            {"stage": "state", "impl": "json", "n": n}
+            | measure(lambda: incremental.loads(incremental.dumps(ind)))
+        )
+    return results
+
+
+def bench_vectorized(sizes: list[int]) -> list[dict]:
+    """
+    Compare RSI and Stochastic Oscillator on arrays against the former DataFrame versions,
+    for a single series of n bars and for 100 pairs of n // 100 bars in one call.
+    """
+    results = []
+    for n in sizes:
+        _, high, low, close = ohlc_arrays(n)
+        df = pd.DataFrame({"High": high, "Low": low, "Close": close})
+
+        for stage, former, vectorized in [
+            ("rsi", legacy.get_rsi, lambda: indicators.calc_rsi(close)),
+            (
+                "so",
+                legacy.get_stochastic_oscillator,
+                lambda: indicators.calc_stochastic_oscillator(high, low, close),
+            ),
+        ]:
+            results.append(
+                {"stage": stage, "impl": "legacy", "n": n}
+                | measure(lambda: former(df.copy()), repeat=3)
+            )
+            results.append(
+                {"stage": stage, "impl": "numpy", "n": n}
+                | measure(vectorized, repeat=3)
+            )
+
+        if n < 100 * 15:
+            continue
+        _, high, low, close = ohlc_arrays((100, n // 100))
+        frames = [
+            pd.DataFrame({"High": h, "Low": l, "Close": c})
+            for h, l, c in zip(high, low, close)
+        ]
+
+        def legacy_panel():
+            for df in frames:
+                legacy.get_rsi(df.copy())
+                legacy.get_stochastic_oscillator(df.copy())
+
+        def numpy_panel():
+            indicators.calc_rsi(close)
+            indicators.calc_stochastic_oscillator(high, low, close)
+
+        results.append(
+            {"stage": "rsi+so 100p", "impl": "legacy", "n": n}
+            | measure(legacy_panel, repeat=3)
+        )
+        results.append(
+            {"stage": "rsi+so 100p", "impl": "numpy", "n": n}
+            | measure(numpy_panel, repeat=3)
+        )
+    return results
+
+
+def bench_trend(sizes: list[int]) -> list[dict]:
+    """
+    Compare the streaming trend detector against "get_trend" over 100 ticks of a sliding
+    window of n bars, one new bar per tick, the detector is seeded beforehand.
+    """
+    results = []
+    for n in sizes:
+        df = ohlc_frame(n + 100)
+        windows = [df.iloc[i : i + n].reset_index(drop=True) for i in range(101)]
+        seeded = ta.TrendDetector(size=n)
+        seeded.apply(windows[0].copy())
+
+        def batch():
+            for window in windows[1:]:
+                ta.get_trend(window.copy())
+
+        def streaming():
+            detector = copy.deepcopy(seeded)
+            for window in windows[1:]:
+                detector.apply(window.copy())
+
+        results.append(
+            {"stage": "trend 100t", "impl": "batch", "n": n} | measure(batch, repeat=3)
+        )
+        results.append(
+            {"stage": "trend 100t", "impl": "detector", "n": n}
+            | measure(streaming, repeat=3)
+        )
+    return results
+
+
+def bench_elliott(sizes: list[int]) -> list[dict]:
+    """
+    Compare labelling Elliott waves in a single pass against the former version,
+    also on random swings as trends of synthetic candles rarely get past wave 2.
+    """
+    results = []
+    for n in sizes:
+        df = ohlc_frame(n)
+        df = indicators.get_wave_length(ta.get_trend(indicators.get_atr(df)))
+        results.append(
+            {"stage": "elliott", "impl": "legacy", "n": n}
+            | measure(lambda: legacy.get_elliott(df.copy()), repeat=3)
+        )
+        results.append(
+            {"stage": "elliott", "impl": "single", "n": n}
+            | measure(lambda: indicators.get_elliott(df.copy()), repeat=3)
+        )
+
+        swings = legacy.random_swings(n)
+        results.append(
+            {"stage": "elliott rnd", "impl": "legacy", "n": n}
+            | measure(lambda: legacy.get_elliott(swings.copy()), repeat=3)
+        )
+        results.append(
+            {"stage": "elliott rnd", "impl": "single", "n": n}
+            | measure(lambda: indicators.get_elliott(swings.copy()), repeat=3)
+        )
+    return results
+
+
+def bench_zones(sizes: list[int]) -> list[dict]:
+    """
+    Compare value zones against the former frames, and looking up the zone of a price
+    in the index against a frame mask.
+    """
+    results = []
+    for n in sizes:
+        df = ohlc_frame(n)
+        df = ta.get_trend(indicators.get_atr(df))
+        frame = legacy.get_value_zones(df)
+        zones = ta.get_value_zones(df)
+        prices = df.Close.to_numpy()[-100:]
+        results.append(
+            {"stage": "zones", "impl": "frame", "n": n}
+            | measure(lambda: legacy.get_value_zones(df))
+        )
+        results.append(
+            {"stage": "zones", "impl": "index", "n": n}
+            | measure(lambda: ta.get_value_zones(df))
+        )
+        results.append(
+            {"stage": "zone 100q", "impl": "mask", "n": n}
+            | measure(
+                lambda: [frame[(frame.Top >= p) & (frame.Bottom <= p)] for p in prices]
+            )
+        )
+        results.append(
+            {"stage": "zone 100q", "impl": "bisect", "n": n}
+            | measure(lambda: [zones.contains(p) for p in prices])
+        )
+    return results
+
+
+def bench_pipeline(sizes: list[int]) -> list[dict]:
+    """
+    Compare the analysis pipeline against running every stage, with results of the window
+    memoized or not, and when only the ATR is requested.
+    """
+    results = []
+    for n in sizes:
+        df = ohlc_frame(n)
+
+        def cold(**kwargs):
+            pipeline.window_cache.clear()
+            get_ohlc_analysis({"df": df.copy()}, **kwargs)
+
+        for impl, func in [
+            ("legacy", lambda: legacy.get_ohlc_analysis(df.copy())),
+            ("cold", cold),
+            ("memoized", lambda: get_ohlc_analysis({"df": df.copy()})),
+            ("atr cold", lambda: cold(vz=False, columns=["ATR"])),
+        ]:
+            results.append({"stage": "analysis", "impl": impl, "n": n} | measure(func))
+    return results
+
+
+def _bot_group(pairs: int, compact: bool, payloads: list[bytes]) -> list:
+    """Unsaved bots with the analysis of three intervals cached, like after a tick."""
+    from .models import Bot, BotGroup, Pair
+
+    bg = BotGroup(compact=compact)
+    bots = []
+    for k in range(pairs):
+        bot = Bot(pair=Pair(name=f"P{k}_USD", altname=f"P{k}USD", cost_decimals=4))
+        bot.bg = bg
+        for i, payload in zip([60, 300, 14400], payloads[k::pairs]):
+            bot._data_is_valid(i)
+            bot._set_data(i, {"ohlc": decode_candles(loads(payload)["candles"])})
+        bots.append(bot)
+    return bots
+
+
+def _rss_kib() -> int | None:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _retained(pairs: int, compact: bool, payloads: list[bytes], conn):
+    """Memory the bots keep, run in a child process so the variants don't share a heap."""
+    gc.collect()
+    rss = _rss_kib()
+    tracemalloc.start()
+    start = time.perf_counter()
+    bots = _bot_group(pairs, compact, payloads)
+    elapsed = time.perf_counter() - start
+    pipeline.window_cache.clear()
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    report = sum(x["total"] for bot in bots for x in bot.memory_report().values())
+    conn.send(
+        {
+            "ms": round(elapsed * 1000, 3),
+            "peak_kib": round(peak / 1024, 1),
+            "retained_kib": round(retained / 1024, 1),
+            "report_kib": round(report / 1024, 1),
+            "rss_kib": rss and _rss_kib() - rss,
+        }
+    )
+    conn.close()
+
+
+def bench_memory(sizes: list[int]) -> list[dict]:
+    """
+    Memory held by the cached analysis of a group of "n" pairs on three intervals,
+    compact or not. RSS is the growth of the resident set while the group is built.
+    """
+    results = []
+    for n in sizes:
+        payloads = [candles_payload(500, seed) for seed in range(3 * n)]
+
+        context = multiprocessing.get_context("fork")
+        for impl, compact in [("float64", False), ("compact", True)]:
+            parent, child = context.Pipe()
+            process = context.Process(
+                target=_retained, args=(n, compact, payloads, child)
+            )
+            process.start()
+            result = parent.recv()
+            process.join()
+            results.append({"stage": "bot group", "impl": impl, "n": n} | result)
+    return results
+
+
+def bench_panel(sizes: list[int]) -> list[dict]:
+    """
+    Analysis of n pairs of 500 bars on the same times, pair by pair against a panel
+    computing EMA, ATR and swings of all pairs at once, alone and with the rest of a tick.
+    RSI and Bollinger bands are timed as panel stages too.
+    """
+    columns = ["RSI", "BBL", "BBH", "BBD"]
+    results = []
+    for n in sizes:
+        frames = {k: ohlc_frame(500, k) for k in range(n)}
+
+        def pairs(names=panel.COLUMNS):
+            pipeline.window_cache.clear()
+            for df in frames.values():
+                analysis = pipeline.Analysis(df)
+                for name in names:
+                    analysis[name]
+
+        def panels(names=panel.COLUMNS):
+            pipeline.window_cache.clear()
+            panel.compute(frames, names)
+
+        # Detectors are seeded already, as on every tick but the first
+        detectors = {k: ta.TrendDetector() for k in frames}
+        for k, df in frames.items():
+            detectors[k].apply(df.copy())
+
+        def analysis(values=None):
+            pipeline.window_cache.clear()
+            for k, df in frames.items():
+                get_ohlc_analysis(
+                    {"df": df.copy()},
+                    detector=detectors[k],
+                    values=values and values[k],
+                )
+
+        for stage, impl, func in [
+            ("stages", "pairs", pairs),
+            ("stages", "panel", panels),
+            ("rsi bb", "pairs", lambda: pairs(columns)),
+            ("rsi bb", "panel", lambda: panels(columns)),
+            ("analysis", "pairs", analysis),
+            ("analysis", "panel", lambda: analysis(panel.compute(frames))),
+        ]:
+            results.append(
+                {"stage": stage, "impl": impl, "n": n} | measure(func, repeat=3)
+            )
+    return results
+
+
+def trading_times(n: int, minutes: int, start: int = 1767225600) -> np.ndarray:
+    """
+    Open times of "n" candles of the interval, epoch seconds,
+    skipping the weekend from Friday 17:00 to Sunday 17:00 New York time.
+    """
+    times = np.empty(0, dtype=np.int64)
+    while len(times) < n:
+        t = start + np.arange(2 * n + 1000) * minutes * 60
+        local = pd.to_datetime(t, unit="s", utc=True).tz_convert("America/New_York")
+        weekday, hour = local.weekday.to_numpy(), local.hour.to_numpy()
+        closed = (
+            ((weekday == 4) & (hour >= 17))
+            | (weekday == 5)
+            | ((weekday == 6) & (hour < 17))
+        )
+        times = np.r_[times, t[~closed]]
+        start = int(t[-1]) + minutes * 60
+    return times[:n]
+
+
+def base_candles(n: int, minutes: int = 5, seed: int = 0) -> dict[str, np.ndarray]:
+    """Synthetic candles like "decode_candles" returns, the last one is incomplete."""
+    open_, high, low, close = ohlc_arrays(n, seed)
+    complete = np.ones(n, dtype=bool)
+    complete[-1:] = False
+    return {
+        "time": trading_times(n, minutes).astype(float),
+        "open": open_,
+        "high": high,
+        "low": low,
+        "close": close,
+        "volume": np.random.default_rng(seed).integers(1, 1000, n),
+        "complete": complete,
+    }
+
+
+# Volatility regimes of "market_candles", relative to the base volatility
+REGIMES = np.array([0.5, 1.0, 2.5])
+
+
+def market_candles(n: int, minutes: int = 5, seed: int = 0) -> dict[str, np.ndarray]:
+    """
+    Synthetic candles like "decode_candles" returns, a random walk that switches between
+    volatility regimes, opens with gaps after the weekend break and now and then in the week.
+    Prices have 5 decimals and about a tenth of the candles close at their high or low.
+    """
+    rng = np.random.default_rng(seed)
+    times = trading_times(n, minutes)
+    sigma = 0.0004 * np.sqrt(minutes / 5)  # Of log returns
+
+    # A regime lasts 500 candles on average
+    switches = np.cumsum(rng.random(n) < 1 / 500)
+    volatility = (
+        sigma * REGIMES[rng.integers(0, len(REGIMES), switches[-1] + 1)][switches]
+    )
+
+    move = rng.normal(0, volatility)
+    weekend = np.r_[False, np.diff(times) > minutes * 60]
+    gap = np.where(weekend, rng.normal(0, 10 * volatility), 0.0)
+    gap += np.where(rng.random(n) < 0.002, rng.normal(0, 5 * volatility), 0.0)
+    # Log returns, so long series stay positive
+    close = 1.1 * np.exp(np.cumsum(gap + move))
+    open_ = close * np.exp(-move)
+
+    wicks = np.abs(rng.normal(0, volatility / 2, (2, n))) * (rng.random((2, n)) > 0.1)
+    wicks *= close
+    prices = [
+        open_,
+        np.fmax(open_, close) + wicks[0],
+        np.fmin(open_, close) - wicks[1],
+        close,
+    ]
+    open_, high, low, close = (np.round(x, 5) for x in prices)
+    return {
+        "time": times.astype(float),
+        "open": open_,
+        "high": high,
+        "low": low,
+        "close": close,
+        "volume": rng.poisson(200 * volatility / sigma) + 1,
+        "complete": np.r_[np.ones(n - 1, dtype=bool), False],
+    }
+
+
+def bench_resample(sizes: list[int]) -> list[dict]:
+    """
+    Compare rolling candles resampled from n M5 candles forward candle by candle against
+    resampling the whole window, over 100 new M5 candles for every longer interval,
+    the resampler is seeded beforehand.
+    """
+    base = enums.Interval.FIVE_MIN
+    intervals = [x.value for x in enums.Interval if x > base]
+    results = []
+    for n in sizes:
+        candles = base_candles(n + 100)
+        window = {k: v[:n] for k, v in candles.items()}
+
+        seeded = resample.Resampler(base, n)
+        seeded.update(window)
+        for minutes in intervals:
+            seeded.get(minutes, n)
+
+        def roll():
+            resampler = copy.deepcopy(seeded)
+            # Every tick the incomplete candle is replaced and a new one starts
+            for j in range(n, n + 100):
+                tick = {k: v[j - 1 : j + 1].copy() for k, v in candles.items()}
+                tick["complete"][:] = [True, False]
+                resampler.update(tick)
+            return resampler
+
+        def rebuild():
+            for j in range(n, n + 100):
+                tick = {k: v[j - n + 1 : j + 1] for k, v in candles.items()}
+                for minutes in intervals:
+                    resample.aggregate(tick, minutes, base)
+
+        results.append(
+            {"stage": "resample", "impl": "rebuild", "n": n}
+            | measure(rebuild, repeat=3)
+        )
+        results.append(
+            {"stage": "resample", "impl": "roll", "n": n} | measure(roll, repeat=3)
+        )
+    return results
+
+
+def bench_candles(sizes: list[int]) -> list[dict]:
+    """
+    Compare labelling the candle patterns of a series bar by bar with the former single-bar
+    code against one pass over it, the former code only up to 5000 bars.
+    """
+    results = []
+    for n in sizes:
+        open_, high, low, close = (np.round(x, 4) for x in ohlc_arrays(n))
+        df = pd.DataFrame({"Open": open_, "High": high, "Low": low, "Close": close})
+
+        def bar_by_bar():
+            return [legacy.candle_analysis(df.iloc[i - 1 : i + 1]) for i in range(1, n)]
+
+        if n <= 5000:
+            results.append(
+                {"stage": "candles", "impl": "legacy", "n": n}
+                | measure(bar_by_bar, repeat=3)
+            )
+        results.append(
+            {"stage": "candles", "impl": "numpy", "n": n}
+            | measure(lambda: candles.calc_candle_patterns(open_, high, low, close))
+        )
+    return results
+
+
+def bench_analysis(sizes: list[int]) -> list[dict]:
+    """
+    Cost of every stage of the analysis on n M5 candles from "market_candles",
+    indicators, trend and value zones on their own and the whole analysis without memoized results.
+    """
+    results = []
+    for n in sizes:
+        ohlc = market_candles(n)
+        df = prep_data({"ohlc": ohlc})["df"]
+        analysed = get_ohlc_analysis({"df": df.copy()}, vz=False)["df"]
+        pipeline.window_cache.clear()
+
+        def analysis():
+            pipeline.window_cache.clear()
+            return get_ohlc_analysis({"df": df.copy()})
+
+        repeat = 5 if n <= 50000 else 1
+        for stage, func in [
+            ("prep_data", lambda: prep_data({"ohlc": ohlc})),
+            ("get_ema", lambda: indicators.get_ema(df.copy())),
+            ("get_atr", lambda: indicators.get_atr(df.copy())),
+            ("get_rsi", lambda: indicators.get_rsi(df.copy())),
+            (
+                "get_so",
+                lambda: indicators.get_stochastic_oscillator(df.copy()),
+            ),
+            ("bollinger", lambda: indicators.bollinger_bands(df.copy())),
+            ("get_trend", lambda: ta.get_trend(df.copy())),
+            ("value_zones", lambda: ta.get_value_zones(analysed)),
+            ("analysis", analysis),
+        ]:
+            results.append(
+                {"stage": stage, "impl": "market", "n": n} | measure(func, repeat)
+            )
+        pipeline.window_cache.clear()
+    return results
+
+
+SUITES = {
+    "decode": (bench_decode, [500, 5000]),
+    "metrics": (bench_metrics, [10000]),
+    "incremental": (bench_incremental, [500, 5000]),
+    "vectorized": (bench_vectorized, [500, 50000, 1000000]),
+    "trend": (bench_trend, [500, 5000]),
+    "elliott": (bench_elliott, [500, 50000, 500000]),
+    "zones": (bench_zones, [500, 50000]),
+    "pipeline": (bench_pipeline, [500, 5000]),
+    "memory": (bench_memory, [100]),
+    "panel": (bench_panel, [10, 100]),
+    "resample": (bench_resample, [5000, 30000]),
+    "candles": (bench_candles, [500, 5000, 1000000]),
+    "analysis": (bench_analysis, [500, 5000, 50000, 1000000]),
+}
+
+
+def _key(result: dict) -> tuple:
+    return result.get("suite"), result["stage"], result["impl"], result["n"]
+
+
+def compare(
+    results: list[dict], baseline: list[dict], threshold: float = REGRESSION_THRESHOLD
+) -> list[dict]:
+    """
+    Results slower or with a higher memory peak than the baseline's by more than
+    the threshold, a fraction, with the ratios. Results missing from the baseline are skipped.
+    """
+    previous = {_key(x): x for x in baseline}
+    regressions = []
+    for result in results:
+        if (base := previous.get(_key(result))) is None:
+            continue
+        ratios = {
+            f"{k}_ratio": round(result[k] / base[k], 3)
+            for k in ("ms", "peak_kib")
+            if base.get(k) and result.get(k) is not None
+        }
+        if any(x > 1 + threshold for x in ratios.values()):
+            regressions.append(result | ratios)
+    return regressions
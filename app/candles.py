@@ -1,76 +1,105 @@
-def candle_is_bullish(df):
-    o1, h1, l1, c1 = df.iloc[-2, 1:5].to_numpy()
-    o2, h2, l2, c2 = df.iloc[-1, 1:5].to_numpy()
+import numpy as np
 
-    if c2 == h2:
-        if c2 > h1:
-            return True
+# Values of the pattern columns
+NONE = 0
+BEARISH = 1
+BULLISH = 2
 
-        # if (c2 - l2) > abs(o1 - c1):
-        #     return True
+OHLC = ["Open", "High", "Low", "Close"]
+PATTERNS = ["Breakout", "Engulf", "Closed", "Hammer"]
 
-        # if o2 > mid and (h2 - l2) >= (h1 - l1):
-        #     return True
 
-    return False
+def _prev(x: np.ndarray) -> np.ndarray:
+    """Values of the previous bar along the last axis, NaN for the first one."""
+    prev = np.full(x.shape, np.nan)
+    prev[..., 1:] = x[..., :-1]
+    return prev
 
 
-def candle_is_bearish(df):
-    o1, h1, l1, c1 = df.iloc[-2, 1:5].to_numpy()
-    o2, h2, l2, c2 = df.iloc[-1, 1:5].to_numpy()
+def _label(bullish: np.ndarray, bearish: np.ndarray) -> np.ndarray:
+    return np.where(bullish, BULLISH, np.where(bearish, BEARISH, NONE)).astype(np.int8)
 
-    if c2 == l2:
-        if c2 < l1:
-            return True
 
-        # if (h2 - c2) > abs(o1 - c1):
-        #     return True
+def _prices(df, bars: int | None = None) -> list[np.ndarray]:
+    return [df[x].to_numpy()[-bars if bars else None :] for x in OHLC]
 
-        # if o2 < mid and (h2 - l2) >= (h1 - l1):
-        #     return True
 
-    return False
+def calc_breakout(
+    open_: np.ndarray, high: np.ndarray, low: np.ndarray, close: np.ndarray
+) -> np.ndarray:
+    """Bars closing at their high above the previous high or at their low below the previous low."""
+    bullish = (close == high) & (close > _prev(high))
+    bearish = (close == low) & (close < _prev(low))
+    return _label(bullish, bearish)
 
 
-def get_candle_analysis(df):
-    o1, h1, l1, c1 = df.iloc[-2, 1:5].to_numpy()
-    o2, h2, l2, c2 = df.iloc[-1, 1:5].to_numpy()
-    if c2 > o2:
-        t2 = "u"
-    elif c2 < o2:
-        t2 = "d"
-    else:
-        t2 = "s"
-    if t2 == "u":
-        if (c2 - o2) > abs(o1 - c1):
-            df.at[df.index[-1], "Engulf"] = 2
-        else:
-            df.at[df.index[-1], "Engulf"] = 0
-        if c2 > h1:
-            df.at[df.index[-1], "Closed"] = 2
-        else:
-            df.at[df.index[-1], "Closed"] = 0
-    elif t2 == "d":
-        if (o2 - c2) > abs(o1 - c1):
-            df.at[df.index[-1], "Engulf"] = 1
-        else:
-            df.at[df.index[-1], "Engulf"] = 0
-        if c2 < l1:
-            df.at[df.index[-1], "Closed"] = 1
-        else:
-            df.at[df.index[-1], "Closed"] = 0
-    else:
-        df.at[df.index[-1], "Engulf"] = 0
-        df.at[df.index[-1], "Closed"] = 0
-
-    fri382 = h2 - ((h2 - l2) * 0.382)
-    if o2 > fri382 and c2 > fri382:
-        df.at[df.index[-1], "Hammer"] = 2
-    else:
-        fri382 = l2 + ((h2 - l2) * 0.382)
-        if o2 < fri382 and c2 < fri382:
-            df.at[df.index[-1], "Hammer"] = 1
-        else:
-            df.at[df.index[-1], "Hammer"] = 0
+def calc_engulf(
+    open_: np.ndarray, high: np.ndarray, low: np.ndarray, close: np.ndarray
+) -> np.ndarray:
+    """Bars with a body bigger than the previous one, by their direction."""
+    prev_body = np.abs(_prev(open_) - _prev(close))
+    return _label(
+        (close > open_) & (close - open_ > prev_body),
+        (close < open_) & (open_ - close > prev_body),
+    )
+
+
+def calc_closed(
+    open_: np.ndarray, high: np.ndarray, low: np.ndarray, close: np.ndarray
+) -> np.ndarray:
+    """Rising bars closing above the previous high, falling ones below the previous low."""
+    return _label(
+        (close > open_) & (close > _prev(high)),
+        (close < open_) & (close < _prev(low)),
+    )
+
+
+def calc_hammer(
+    open_: np.ndarray, high: np.ndarray, low: np.ndarray, close: np.ndarray
+) -> np.ndarray:
+    """Hammers with the body above the 0.382 level from the high, shooting stars below it from the low."""
+    top = high - ((high - low) * 0.382)
+    bottom = low + ((high - low) * 0.382)
+    return _label(
+        (open_ > top) & (close > top),
+        (open_ < bottom) & (close < bottom),
+    )
+
+
+def calc_candle_patterns(
+    open_: np.ndarray, high: np.ndarray, low: np.ndarray, close: np.ndarray
+) -> dict[str, np.ndarray]:
+    """
+    Patterns of every bar of 1-D or 2-D (pairs x time) prices as int8 arrays:
+    "BULLISH", "BEARISH" or "NONE". Patterns comparing two bars are "NONE" for the first one.
+    """
+    prices = [np.asarray(x, dtype=float) for x in (open_, high, low, close)]
+    return {
+        "Breakout": calc_breakout(*prices),
+        "Engulf": calc_engulf(*prices),
+        "Closed": calc_closed(*prices),
+        "Hammer": calc_hammer(*prices),
+    }
+
 
+def get_candle_patterns(df):
+    """Add the patterns of every candle as "Breakout", "Engulf", "Closed" and "Hammer" columns."""
+    for name, values in calc_candle_patterns(*_prices(df)).items():
+        df[name] = values
+    return df
+
+
+def candle_is_bullish(df):
+    return bool(calc_breakout(*_prices(df, 2))[-1] == BULLISH)
+
+
+def candle_is_bearish(df):
+    return bool(calc_breakout(*_prices(df, 2))[-1] == BEARISH)
+
+
+def get_candle_analysis(df):
+    """Add the patterns of the last candle, see "get_candle_patterns" for every candle."""
+    for name, values in calc_candle_patterns(*_prices(df, 2)).items():
+        if name != "Breakout":
+            df.at[df.index[-1], name] = values[-1]
     return df
@@ -0,0 +1,105 @@
+import atexit
+import gzip
+import json
+import threading
+from collections import defaultdict
+from typing import NamedTuple
+
+
+class Response(NamedTuple):
+    status: int | None  # None if the request failed to connect or timed out
+    reason: str | None
+    retry_after: str | None
+    body: bytes
+
+
+NOT_RECORDED = Response(
+    404, "Not Recorded", None, b'{"errorMessage": "Request is not in the cassette"}'
+)
+
+
+class Cassette:
+    """
+    OANDA-API interactions stored as gzipped JSON lines, one per request attempt.
+    In "record" mode interactions are appended as they happen.
+    In "replay" mode requests are answered from the file in the recorded order,
+    the last recorded response of a request repeats once they run out.
+    Requests that were not recorded with the same query, e.g. candles since a different time,
+    fall back to the responses of the same path.
+    "realtime" replays wait as long as the original requests took, otherwise they don't wait at all.
+    """
+
+    RECORD = "record"
+    REPLAY = "replay"
+
+    def __init__(self, path: str, mode: str = REPLAY, realtime: bool = False):
+        self.path = path
+        self.mode = mode
+        self.realtime = realtime
+        self.lock = threading.Lock()
+
+        if mode == self.RECORD:
+            self.file = gzip.open(path, "at", encoding="utf-8")
+            atexit.register(self.close)
+            return
+
+        self.requests = defaultdict(list)
+        self.paths = defaultdict(list)
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                x = json.loads(line)
+                response = Response(
+                    x["status"], x["reason"], x["retry_after"], x["body"].encode()
+                )
+                entry = (response, x["elapsed"])
+                self.requests[(x["method"], x["path"], x["data"])].append(entry)
+                self.paths[(x["method"], x["path"].split("?")[0])].append(entry)
+        self.cursors: dict[tuple, int] = defaultdict(int)
+
+    def record(
+        self,
+        method: str,
+        path: str,
+        data: str | None,
+        response: Response,
+        elapsed: float,
+    ):
+        line = json.dumps(
+            {
+                "method": method,
+                "path": path,
+                "data": data,
+                "status": response.status,
+                "reason": response.reason,
+                "retry_after": response.retry_after,
+                "elapsed": round(elapsed, 6),
+                "body": response.body.decode(),
+            }
+        )
+        with self.lock:
+            self.file.write(line + "\n")
+            self.file.flush()
+
+    def play(self, method: str, path: str, data: str | None) -> tuple[Response, float]:
+        """Returns the next recorded response of the request and the time it took."""
+        for key, entries in [
+            ((method, path, data), self.requests),
+            ((method, path.split("?")[0]), self.paths),
+        ]:
+            if key in entries:
+                with self.lock:
+                    i = self.cursors[key]
+                    self.cursors[key] = i + 1
+                recorded = entries[key]
+                return recorded[min(i, len(recorded) - 1)]
+        print(f"[-] OANDA-API request '{method} {path}' is not in the cassette")
+        return NOT_RECORDED, 0
+
+    def rewind(self):
+        """Replay from the start again."""
+        with self.lock:
+            self.cursors = defaultdict(int)
+
+    def close(self):
+        if self.mode == self.RECORD and not self.file.closed:
+            self.file.close()
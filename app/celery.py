@@ -20,4 +20,8 @@ app.conf.beat_schedule = {
             "expires": 6.0,
         },
     },
+    "refresh_instruments": {
+        "task": "app.tasks.refresh_instruments",
+        "schedule": 24 * 60 * 60.0,
+    },
 }
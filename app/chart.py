@@ -12,9 +12,10 @@ from django_plotly_dash import DjangoDash
 
 from app import enums
 
-from .api import get_ohlc_data
+from .api import get_ohlc_data, quotes, start_stream
 from .enums import Interval, OrderDir
 from .models import Bot, Order, Pair
+from .ta import ValueZoneIndex
 from .utils import get_ohlc_analysis, prep_data
 
 kc_app = DjangoDash("CandleChart")
@@ -202,6 +203,8 @@ def update_data(pair, interval, refresh, data):
     if not i in data[pair]:
         data[pair][i] = {}
 
+    start_stream(PAIRS)
+
     ohlc_data = get_ohlc_data(pair, interval, 500)
     prepped_data = prep_data(ohlc_data)
     ready_data = get_ohlc_analysis(prepped_data)
@@ -209,9 +212,11 @@ def update_data(pair, interval, refresh, data):
     dfz = ready_data["dfz"]
 
     data[pair][i]["df"] = df.to_json()
-    data[pair][i]["dfz"] = dfz.to_json()
+    data[pair][i]["dfz"] = dfz.to_dict()
     data[pair][i]["atr"] = df.ATR.iloc[-2]
     data[pair][i]["orders"] = _get_orders(pair, since=prepped_data["first"])
+    if quote := quotes.get(pair):
+        data[pair][i]["quote"] = [quote.bid_price, quote.ask_price]
     for pair in data.keys():
         for i in data[pair].keys():
             data[pair][i]["refresh"] = refresh
@@ -233,7 +238,7 @@ def update_figure(data, height, pair, interval):
     df = pd.read_json(StringIO(data[pair][interval]["df"]))
     df["Date"] = pd.to_datetime(df["Date"], unit="s", utc=True)
     df["Date"] = df["Date"].dt.tz_convert(settings.TIME_ZONE)
-    dfz = pd.read_json(StringIO(data[pair][interval]["dfz"]))
+    dfz = ValueZoneIndex.from_dict(data[pair][interval]["dfz"])
     orders = data[pair][interval]["orders"]
 
     fig = go.Figure(
@@ -328,10 +333,19 @@ def update_figure(data, height, pair, interval):
         )
     )
 
-    for idx in range(len(dfz.index)):
+    if quote := data[pair][interval].get("quote"):
+        for price in quote:
+            fig.add_hline(
+                y=price,
+                line_width=1,
+                line_dash="dot",
+                line_color=MAVG_COLOR,
+            )
+
+    for bottom, top in dfz:
         fig.add_hrect(
-            y0=dfz.Top.iloc[idx],
-            y1=dfz.Bottom.iloc[idx],
+            y0=top,
+            y1=bottom,
             fillcolor="rgba(128,0,128,0.1)",
             line_width=0,
         )
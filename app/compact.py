@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+FLAGS = ("H", "L", "UpT", "DnT", "HH", "LL")  # Bits of the "flags" array
+PRICES = ("Open", "High", "Low", "Close")
+LOSSY = ("MA", "ATR")  # Kept as float32
+SCRATCH = ("Bmax", "Bmin")  # Only needed while the trend is detected
+
+
+class CompactFrame:
+    """
+    Analysis frame in a compact layout, "frame()" restores it.
+    Prices are integer points (a tenth of a pip) when that's exact, otherwise they stay float64.
+    Trend flags are packed into a bitfield, break points are recomputed from the candle bodies.
+    """
+
+    def __init__(self, df: pd.DataFrame, decimals: int):
+        self.columns = [x for x in df.columns if x not in SCRATCH]
+        self.tz = df.Date.dt.tz
+        self.scale = 10 ** (decimals + 1)
+        self.arrays: dict[str, np.ndarray] = {}
+        self.dtypes = {}
+
+        flags = np.zeros(len(df), dtype=np.uint8)
+        for column in self.columns:
+            values = df[column].to_numpy()
+            self.dtypes[column] = df[column].dtype
+            if column in FLAGS:
+                flags |= values.astype(np.uint8) << FLAGS.index(column)
+                continue
+            if column == "BP":
+                continue
+            if column == "Date":
+                values = _compact_time(df.Date.values.view("i8"))
+            elif column == "Volume":
+                values = _narrow(values, np.int32)
+            elif column in PRICES:
+                points = np.rint(values * self.scale)
+                if np.array_equal(points / self.scale, values, equal_nan=True):
+                    values = _narrow(points, np.int32)
+            elif column in LOSSY:
+                values = values.astype(np.float32)
+            self.arrays[column] = values
+        self.arrays["flags"] = flags
+
+    def __len__(self):
+        return len(self.arrays["flags"])
+
+    @property
+    def nbytes(self) -> int:
+        return sum(x.nbytes for x in self.arrays.values())
+
+    def _column(self, column: str):
+        values = self.arrays[column]
+        if column == "Date":
+            return (
+                pd.to_datetime(
+                    values.astype("i8"), unit="s" if values.dtype == np.uint32 else "ns"
+                )
+                .tz_localize("UTC")
+                .tz_convert(self.tz or settings.TIME_ZONE)
+            )
+        if column in PRICES and values.dtype.kind in "iu":
+            return values / self.scale
+        return values.astype(self.dtypes[column])
+
+    def frame(self) -> pd.DataFrame:
+        """Restore the frame, only moving average and ATR lose precision."""
+        data = {}
+        for column in self.columns:
+            if column in FLAGS:
+                bit = FLAGS.index(column)
+                data[column] = (self.arrays["flags"] >> bit & 1).astype(bool)
+            elif column != "BP":
+                data[column] = self._column(column)
+        if "BP" in self.columns:
+            body = (data["Open"], data["Close"])
+            data["BP"] = np.where(
+                data["H"], np.fmax(*body), np.where(data["L"], np.fmin(*body), np.nan)
+            )
+        return pd.DataFrame(data, columns=self.columns)
+
+
+def _compact_time(ns: np.ndarray) -> np.ndarray:
+    """Whole seconds as uint32 if they fit, nanoseconds otherwise."""
+    if ns.size and (ns % 10**9).any() or ((ns < 0) | (ns // 10**9 >= 2**32)).any():
+        return ns.copy()
+    return (ns // 10**9).astype(np.uint32)
+
+
+def _narrow(values: np.ndarray, dtype) -> np.ndarray:
+    """Cast to the smaller integer type if no value changes."""
+    narrow = values.astype(dtype)
+    return narrow if np.array_equal(narrow, values) else values
+
+
+def nbytes(data: dict) -> dict[str, int]:
+    """Bytes held by the cached analysis of an interval, by entry."""
+    sizes = {}
+    if (df := data.get("df")) is not None:
+        if isinstance(df, CompactFrame):
+            sizes["df"] = df.nbytes
+        else:
+            sizes["df"] = int(df.memory_usage(index=True, deep=True).sum())
+    if (dfz := data.get("dfz")) is not None:
+        sizes["dfz"] = dfz.nbytes
+    return sizes
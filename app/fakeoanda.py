@@ -0,0 +1,934 @@
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+
+# Rough value of the currencies in USD, ordered by OANDA's pair naming priority
+CURRENCIES = {
+    "EUR": 1.08,
+    "GBP": 1.27,
+    "AUD": 0.66,
+    "NZD": 0.61,
+    "USD": 1.0,
+    "CAD": 0.73,
+    "CHF": 1.12,
+    "SGD": 0.74,
+    "HKD": 0.128,
+    "NOK": 0.094,
+    "SEK": 0.095,
+    "DKK": 0.145,
+    "PLN": 0.25,
+    "CZK": 0.043,
+    "HUF": 0.0028,
+    "TRY": 0.031,
+    "ZAR": 0.054,
+    "MXN": 0.058,
+    "CNH": 0.138,
+    "THB": 0.028,
+    "JPY": 0.0067,
+}
+
+# Most traded first, instruments of the most traded currencies are listed first
+LIQUIDITY = [
+    "USD",
+    "EUR",
+    "JPY",
+    "GBP",
+    "AUD",
+    "CAD",
+    "CHF",
+    "NZD",
+    "CNH",
+    "HKD",
+    "SGD",
+    "SEK",
+    "NOK",
+    "MXN",
+    "ZAR",
+    "TRY",
+    "PLN",
+    "DKK",
+    "CZK",
+    "HUF",
+    "THB",
+]
+
+GRANULARITIES = {
+    "S5": 5,
+    "S10": 10,
+    "S15": 15,
+    "S30": 30,
+    "M1": 60,
+    "M2": 120,
+    "M4": 240,
+    "M5": 300,
+    "M10": 600,
+    "M15": 900,
+    "M30": 1800,
+    "H1": 3600,
+    "H2": 7200,
+    "H3": 10800,
+    "H4": 14400,
+    "H6": 21600,
+    "H8": 28800,
+    "H12": 43200,
+    "D": 86400,
+    "W": 604800,
+}
+
+# Periods in seconds and amplitudes in log price of the waves prices follow
+WAVES = [
+    (4 * 3600, 0.0015),
+    (1.7 * 86400, 0.004),
+    (9.3 * 86400, 0.008),
+    (47 * 86400, 0.02),
+]
+
+MAX_CANDLES = 5000
+
+
+class ApiError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _uniform(key: int, k: np.ndarray) -> np.ndarray:
+    """Stateless uniform noise in [0, 1) for the given key and integer steps (splitmix64)."""
+    z = k.astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15) + np.uint64(key)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    z = z ^ (z >> np.uint64(31))
+    return (z >> np.uint64(11)).astype(np.float64) * 2.0**-53
+
+
+class Market:
+    """
+    Deterministic synthetic prices.
+    Mid price of an instrument is a function of time only: a sum of slow waves
+    with per-instrument phases plus per-minute and per-second noise.
+    Candles of every granularity are sampled from the same path, so they agree
+    with each other and with the quoted prices. Markets never close
+    and cross rates are not arbitrage-free.
+    """
+
+    def __init__(self, pairs: int = 100, seed: int = 0):
+        names = list(CURRENCIES)
+        rank = {x: i for i, x in enumerate(LIQUIDITY)}
+        combos = sorted(
+            (
+                (names[a], names[b])
+                for a in range(len(names))
+                for b in range(a + 1, len(names))
+            ),
+            key=lambda x: sorted([rank[x[0]], rank[x[1]]], reverse=True),
+        )
+        self.instruments = {}
+        for i, (base, quote) in enumerate(combos[:pairs]):
+            price = CURRENCIES[base] / CURRENCIES[quote]
+            pip_location = math.floor(math.log10(price)) - 4
+            key = (seed * 1_000_003 + i * 7919) & 0xFFFFFFFFFFFFFFF
+            shape = _uniform(key, np.arange(len(WAVES) + 1))
+            self.instruments[f"{base}_{quote}"] = {
+                "key": key,
+                "base": base,
+                "quote": quote,
+                "log_price": math.log(price),
+                "scale": 0.5 + shape[0],
+                "phases": shape[1:] * 2 * math.pi,
+                "pip": 10.0**pip_location,
+                "pip_location": pip_location,
+                "precision": 1 - pip_location,
+                "margin_rate": 0.0333 if "USD" in (base, quote) else 0.05,
+            }
+
+    def get(self, instrument: str) -> dict:
+        if instrument not in self.instruments:
+            raise ApiError(
+                400, f"Invalid value specified for 'instrument': {instrument}"
+            )
+        return self.instruments[instrument]
+
+    def mid(self, instrument: str, t: np.ndarray) -> np.ndarray:
+        spec = self.instruments[instrument]
+        x = np.full(t.shape, spec["log_price"])
+        for (period, amplitude), phase in zip(WAVES, spec["phases"]):
+            x += spec["scale"] * amplitude * np.sin(2 * math.pi * t / period + phase)
+        x += 0.0004 * (2 * _uniform(spec["key"], t // 60) - 1)
+        x += 0.00005 * (2 * _uniform(spec["key"] + 1, t) - 1)
+        return np.exp(x)
+
+    def quote(self, instrument: str, t: float) -> tuple[float, float]:
+        """Returns rounded bid and ask prices."""
+        spec = self.instruments[instrument]
+        mid = float(self.mid(instrument, np.array([float(math.floor(t))]))[0])
+        half = 0.8 * spec["pip"]
+        return (
+            round(mid - half, spec["precision"]),
+            round(mid + half, spec["precision"]),
+        )
+
+    def candles(
+        self, instrument: str, starts: np.ndarray, granularity: int, now: float
+    ) -> list[dict]:
+        spec = self.instruments[instrument]
+        ends = np.minimum(starts + granularity, math.floor(now))
+        open_ = self.mid(instrument, starts.astype(np.float64))
+        close = self.mid(instrument, ends.astype(np.float64))
+        wick = 0.0003 * math.sqrt(granularity / 60) * open_
+        high = np.maximum(open_, close) + wick * _uniform(spec["key"] + 2, starts)
+        low = np.minimum(open_, close) - wick * _uniform(spec["key"] + 3, starts)
+        volume = 1 + (_uniform(spec["key"] + 4, starts) * granularity).astype(int)
+        complete = starts + granularity <= now
+
+        p = spec["precision"]
+        return [
+            {
+                "complete": bool(complete[i]),
+                "volume": int(volume[i]),
+                "time": f"{starts[i]}.000000000",
+                "mid": {
+                    "o": f"{open_[i]:.{p}f}",
+                    "h": f"{high[i]:.{p}f}",
+                    "l": f"{low[i]:.{p}f}",
+                    "c": f"{close[i]:.{p}f}",
+                },
+            }
+            for i in range(len(starts))
+        ]
+
+
+def _public(record: dict) -> dict:
+    return {k: v for k, v in record.items() if not k.startswith("_")}
+
+
+class FakeOanda:
+    """
+    In-memory v20 account trading on the synthetic "Market".
+    Market orders fill at the current bid/ask unless the price bound is violated,
+    stop-loss and trailing stop-loss orders are evaluated on every request and
+    stream tick, closing their trades at the current price.
+    Latency and errors can be injected into every REST request.
+    """
+
+    def __init__(
+        self,
+        pairs: int = 100,
+        seed: int = 0,
+        balance: float = 100000,
+        latency: float = 0,
+        jitter: float = 0,
+        error_rate: float = 0,
+        throttle_rate: float = 0,
+        stream_interval: float = 0.25,
+        home: str = "USD",
+        clock=time.time,
+    ):
+        self.market = Market(pairs, seed)
+        self.balance = balance
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.stream_interval = stream_interval
+        self.home = home
+        self.clock = clock
+
+        self.random = random.Random(seed)
+        self.lock = threading.RLock()
+        self.transactions: list[dict] = []
+        self.orders: dict[str, dict] = {}
+        self.trades: dict[str, dict] = {}
+
+    @property
+    def last_id(self) -> str:
+        return str(len(self.transactions))
+
+    def inject(self) -> tuple[int, dict] | None:
+        """Sleeps for the configured latency and returns an injected error if any."""
+        with self.lock:
+            delay = max(0, self.random.uniform(-1, 1) * self.jitter + self.latency)
+            r = self.random.random()
+        time.sleep(delay)
+        if r < self.error_rate:
+            return 503, {}
+        if r < self.error_rate + self.throttle_rate:
+            return 429, {"Retry-After": "1"}
+        return None
+
+    def _time(self) -> str:
+        return f"{self.clock():.9f}"
+
+    def _transaction(self, type: str, **fields) -> dict:
+        tx = {
+            "id": str(len(self.transactions) + 1),
+            "time": self._time(),
+            "type": type,
+            **fields,
+        }
+        self.transactions.append(tx)
+        return tx
+
+    def _conversion(self, currency: str) -> float:
+        return CURRENCIES[currency] / CURRENCIES[self.home]
+
+    def _fmt(self, instrument: str, price: float) -> str:
+        return f"{price:.{self.market.instruments[instrument]['precision']}f}"
+
+    def _trade_view(self, trade: dict) -> dict:
+        view = _public(trade)
+        if trade["state"] == "OPEN":
+            spec = self.market.instruments[trade["instrument"]]
+            bid, ask = self.market.quote(trade["instrument"], self.clock())
+            units = trade["_units"]
+            price = bid if units > 0 else ask
+            view["unrealizedPL"] = (
+                f"{units * (price - trade['_price']) * self._conversion(spec['quote']):.4f}"
+            )
+            view["marginUsed"] = (
+                f"{abs(units) * self._conversion(spec['base']) * spec['margin_rate']:.4f}"
+            )
+        return view
+
+    def _account_state(self) -> dict:
+        trades = [
+            self._trade_view(x) for x in self.trades.values() if x["state"] == "OPEN"
+        ]
+        unrealized = sum(float(x["unrealizedPL"]) for x in trades)
+        margin = sum(float(x["marginUsed"]) for x in trades)
+        nav = self.balance + unrealized
+        return {
+            "balance": f"{self.balance:.4f}",
+            "NAV": f"{nav:.4f}",
+            "unrealizedPL": f"{unrealized:.4f}",
+            "marginUsed": f"{margin:.4f}",
+            "marginAvailable": f"{nav - margin:.4f}",
+            "openTradeCount": len(trades),
+            "trades": [
+                {k: x[k] for k in ("id", "unrealizedPL", "marginUsed")} for x in trades
+            ],
+        }
+
+    def step(self):
+        """Triggers stop-loss and trailing stop-loss orders at the current prices."""
+        with self.lock:
+            now = self.clock()
+            for order in list(self.orders.values()):
+                if order["state"] != "PENDING" or "tradeID" not in order:
+                    continue
+                trade = self.trades[order["tradeID"]]
+                bid, ask = self.market.quote(trade["instrument"], now)
+                long = trade["_units"] > 0
+                price = bid if long else ask
+                if order["type"] == "TRAILING_STOP_LOSS":
+                    distance = float(order["distance"])
+                    best = order["_best"] = (
+                        max(order["_best"], price)
+                        if long
+                        else min(order["_best"], price)
+                    )
+                    trigger = best - distance if long else best + distance
+                    order["trailingStopValue"] = self._fmt(trade["instrument"], trigger)
+                else:
+                    trigger = float(order["price"])
+                if (price <= trigger) if long else (price >= trigger):
+                    fill = self._transaction(
+                        "ORDER_FILL",
+                        orderID=order["id"],
+                        instrument=trade["instrument"],
+                        units=f"{-trade['_units']:.0f}",
+                        price=self._fmt(trade["instrument"], price),
+                        reason=f"{order['type']}_ORDER",
+                    )
+                    fill["tradesClosed"] = [self._close_trade(trade, price, fill)]
+                    order.update(
+                        state="FILLED",
+                        fillingTransactionID=fill["id"],
+                        filledTime=fill["time"],
+                    )
+
+    def _close_trade(self, trade: dict, price: float, fill: dict) -> dict:
+        spec = self.market.instruments[trade["instrument"]]
+        units = trade["_units"]
+        pl = units * (price - trade["_price"]) * self._conversion(spec["quote"])
+        self.balance += pl
+        trade.update(
+            state="CLOSED",
+            currentUnits="0",
+            realizedPL=f"{pl:.4f}",
+            averageClosePrice=self._fmt(trade["instrument"], price),
+            closeTime=fill["time"],
+            closingTransactionIDs=[fill["id"]],
+        )
+        for order in self.orders.values():
+            if order.get("tradeID") == trade["id"] and order["state"] == "PENDING":
+                self._cancel(order, "LINKED_TRADE_CLOSED")
+        return {
+            "tradeID": trade["id"],
+            "units": f"{-units:.0f}",
+            "price": trade["averageClosePrice"],
+            "realizedPL": trade["realizedPL"],
+        }
+
+    def _cancel(self, order: dict, reason: str) -> dict:
+        tx = self._transaction("ORDER_CANCEL", orderID=order["id"], reason=reason)
+        order.update(
+            state="CANCELLED",
+            cancellingTransactionID=tx["id"],
+            cancelledTime=tx["time"],
+        )
+        return tx
+
+    def _create_order(self, spec: dict, **fields) -> tuple[dict, dict]:
+        details = {k: v for k, v in _public(spec).items() if k != "type"}
+        tx = self._transaction(
+            f"{spec['type']}_ORDER", **details, reason="CLIENT_ORDER"
+        )
+        order = {
+            **_public(spec),
+            "id": tx["id"],
+            "createTime": tx["time"],
+            "state": "PENDING",
+            **fields,
+        }
+        self.orders[order["id"]] = order
+        return tx, order
+
+    def _market_order(self, spec: dict) -> dict:
+        instrument = spec.get("instrument", "")
+        self.market.get(instrument)
+        try:
+            units = float(spec.get("units", 0))
+        except ValueError:
+            units = 0
+        if not units:
+            raise ApiError(400, "Order units specified are invalid")
+
+        bid, ask = self.market.quote(instrument, self.clock())
+        price = ask if units > 0 else bid
+        create, order = self._create_order(spec)
+        reason = None
+        if bound := spec.get("priceBound"):
+            if (price > float(bound)) if units > 0 else (price < float(bound)):
+                reason = "BOUNDS_VIOLATION"
+        if sl := spec.get("stopLossOnFill"):
+            if (
+                (float(sl["price"]) >= bid)
+                if units > 0
+                else (float(sl["price"]) <= ask)
+            ):
+                reason = "STOP_LOSS_ON_FILL_LOSS"
+        if reason:
+            cancel = self._cancel(order, reason)
+            return {
+                "orderCreateTransaction": create,
+                "orderCancelTransaction": cancel,
+                "relatedTransactionIDs": [create["id"], cancel["id"]],
+                "lastTransactionID": self.last_id,
+            }
+
+        fill = self._transaction(
+            "ORDER_FILL",
+            orderID=order["id"],
+            instrument=instrument,
+            units=spec["units"],
+            price=self._fmt(instrument, price),
+            reason="MARKET_ORDER",
+        )
+        fill["tradeOpened"] = {
+            "tradeID": fill["id"],
+            "units": spec["units"],
+            "price": fill["price"],
+        }
+        order.update(
+            state="FILLED",
+            fillingTransactionID=fill["id"],
+            filledTime=fill["time"],
+            tradeOpenedID=fill["id"],
+        )
+        trade = {
+            "id": fill["id"],
+            "instrument": instrument,
+            "price": fill["price"],
+            "openTime": fill["time"],
+            "initialUnits": spec["units"],
+            "currentUnits": spec["units"],
+            "state": "OPEN",
+            "realizedPL": "0.0000",
+            "financing": "0.0000",
+            "_units": units,
+            "_price": price,
+        }
+        self.trades[trade["id"]] = trade
+        related = [create["id"], fill["id"]]
+        if sl:
+            related.append(
+                self._dependent_order(
+                    {"type": "STOP_LOSS", "tradeID": trade["id"], "price": sl["price"]}
+                )["orderCreateTransaction"]["id"]
+            )
+        return {
+            "orderCreateTransaction": create,
+            "orderFillTransaction": fill,
+            "relatedTransactionIDs": related,
+            "lastTransactionID": self.last_id,
+        }
+
+    def _dependent_order(self, spec: dict) -> dict:
+        spec = {**spec, "tradeID": str(spec.get("tradeID"))}
+        trade = self.trades.get(spec["tradeID"])
+        if trade is None or trade["state"] != "OPEN":
+            raise ApiError(400, "The Trade specified does not exist or is closed")
+        fields = {}
+        if spec["type"] == "TRAILING_STOP_LOSS":
+            bid, ask = self.market.quote(trade["instrument"], self.clock())
+            fields["_best"] = bid if trade["_units"] > 0 else ask
+        elif "price" not in spec:
+            raise ApiError(400, "Order price is missing")
+        related = []
+        key = {
+            "STOP_LOSS": "stopLossOrderID",
+            "TRAILING_STOP_LOSS": "trailingStopLossOrderID",
+        }[spec["type"]]
+        if (existing := self.orders.get(trade.get(key, ""))) and existing[
+            "state"
+        ] == "PENDING":
+            related.append(self._cancel(existing, "CLIENT_REQUEST_REPLACED")["id"])
+        create, order = self._create_order(spec, **fields)
+        trade[key] = order["id"]
+        return {
+            "orderCreateTransaction": create,
+            "relatedTransactionIDs": related + [create["id"]],
+            "lastTransactionID": self.last_id,
+        }
+
+    def _order(self, order_id: str) -> dict:
+        if order_id not in self.orders:
+            raise ApiError(404, "The Order specified does not exist")
+        return self.orders[order_id]
+
+    def _trade(self, trade_id: str) -> dict:
+        if trade_id not in self.trades:
+            raise ApiError(404, "The Trade specified does not exist")
+        return self.trades[trade_id]
+
+    # Endpoints return status code and response body
+
+    def summary(self, query: dict, body: dict) -> tuple[int, dict]:
+        state = self._account_state()
+        del state["trades"]
+        return 200, {
+            "account": {
+                "id": "fake",
+                "currency": self.home,
+                "pendingOrderCount": sum(
+                    x["state"] == "PENDING" for x in self.orders.values()
+                ),
+                "lastTransactionID": self.last_id,
+                **state,
+            },
+            "lastTransactionID": self.last_id,
+        }
+
+    def instruments(self, query: dict, body: dict) -> tuple[int, dict]:
+        return 200, {
+            "instruments": [
+                {
+                    "name": name,
+                    "type": "CURRENCY",
+                    "displayName": f"{x['base']}/{x['quote']}",
+                    "pipLocation": x["pip_location"],
+                    "displayPrecision": x["precision"],
+                    "tradeUnitsPrecision": 0,
+                    "minimumTradeSize": "1",
+                    "maximumOrderUnits": "100000000",
+                    "marginRate": f"{x['margin_rate']}",
+                }
+                for name, x in self.market.instruments.items()
+            ],
+            "lastTransactionID": self.last_id,
+        }
+
+    def candles(self, query: dict, body: dict, instrument: str) -> tuple[int, dict]:
+        self.market.get(instrument)
+        granularity = query.get("granularity", "S5")
+        if granularity not in GRANULARITIES:
+            raise ApiError(
+                400, f"Invalid value specified for 'granularity': {granularity}"
+            )
+        g = GRANULARITIES[granularity]
+        try:
+            count = int(query.get("count", 500))
+            since = float(query["from"]) if "from" in query else None
+            to = float(query["to"]) if "to" in query else None
+        except ValueError:
+            raise ApiError(400, "Invalid value specified for 'count', 'from' or 'to'")
+        if not 0 < count <= MAX_CANDLES:
+            raise ApiError(400, "Maximum value for 'count' exceeded")
+
+        now = self.clock()
+        current = math.floor(now / g)
+        if since is not None:
+            start = math.ceil(since / g)
+            if (
+                query.get("includeFirst", "true").lower() == "false"
+                and start * g == since
+            ):
+                start += 1
+            end = math.ceil(to / g) - 1 if to is not None else start + count - 1
+        else:
+            end = math.ceil(to / g) - 1 if to is not None else current
+            start = end - count + 1
+        end = min(end, current)
+        if end - start + 1 > MAX_CANDLES:
+            raise ApiError(400, "Maximum value for 'count' exceeded")
+
+        starts = np.arange(start, end + 1, dtype=np.int64) * g
+        return 200, {
+            "instrument": instrument,
+            "granularity": granularity,
+            "candles": self.market.candles(instrument, starts, g, now),
+        }
+
+    def pricing(self, query: dict, body: dict) -> tuple[int, dict]:
+        instruments = [x for x in query.get("instruments", "").split(",") if x]
+        if not instruments:
+            raise ApiError(400, "Invalid value specified for 'instruments'")
+        prices = [self.price(x) for x in instruments]
+        response = {"time": self._time(), "prices": prices}
+        if query.get("includeHomeConversions", "false").lower() == "true":
+            currencies = {self.home}
+            for x in instruments:
+                currencies |= {self.market.get(x)["base"], self.market.get(x)["quote"]}
+            response["homeConversions"] = [
+                {
+                    "currency": x,
+                    "accountGain": f"{self._conversion(x):.8f}",
+                    "accountLoss": f"{self._conversion(x):.8f}",
+                    "positionValue": f"{self._conversion(x):.8f}",
+                }
+                for x in sorted(currencies)
+            ]
+        return 200, response
+
+    def price(self, instrument: str) -> dict:
+        self.market.get(instrument)
+        bid, ask = self.market.quote(instrument, self.clock())
+        return {
+            "type": "PRICE",
+            "instrument": instrument,
+            "time": self._time(),
+            "status": "tradeable",
+            "tradeable": True,
+            "bids": [{"price": self._fmt(instrument, bid), "liquidity": 10000000}],
+            "asks": [{"price": self._fmt(instrument, ask), "liquidity": 10000000}],
+            "closeoutBid": self._fmt(instrument, bid),
+            "closeoutAsk": self._fmt(instrument, ask),
+        }
+
+    def create_order(self, query: dict, body: dict) -> tuple[int, dict]:
+        spec = body.get("order") or {}
+        if spec.get("type") == "MARKET":
+            return 201, self._market_order(spec)
+        if spec.get("type") in ["STOP_LOSS", "TRAILING_STOP_LOSS"]:
+            return 201, self._dependent_order(spec)
+        raise ApiError(400, f"Order type '{spec.get('type')}' is not supported")
+
+    def get_order(self, query: dict, body: dict, order_id: str) -> tuple[int, dict]:
+        return 200, {
+            "order": _public(self._order(order_id)),
+            "lastTransactionID": self.last_id,
+        }
+
+    def replace_order(self, query: dict, body: dict, order_id: str) -> tuple[int, dict]:
+        order = self._order(order_id)
+        if order["state"] != "PENDING":
+            raise ApiError(400, "The Order specified is not pending")
+        spec = body.get("order") or {}
+        if spec.get("type") not in ["STOP_LOSS", "TRAILING_STOP_LOSS"]:
+            raise ApiError(400, f"Order type '{spec.get('type')}' is not supported")
+        cancel = self._cancel(order, "CLIENT_REQUEST_REPLACED")
+        response = self._dependent_order(spec)
+        response["orderCancelTransaction"] = cancel
+        response["relatedTransactionIDs"].insert(0, cancel["id"])
+        return 201, response
+
+    def cancel_order(self, query: dict, body: dict, order_id: str) -> tuple[int, dict]:
+        order = self._order(order_id)
+        if order["state"] != "PENDING":
+            raise ApiError(404, "The Order specified is not pending")
+        cancel = self._cancel(order, "CLIENT_REQUEST")
+        return 200, {
+            "orderCancelTransaction": cancel,
+            "relatedTransactionIDs": [cancel["id"]],
+            "lastTransactionID": self.last_id,
+        }
+
+    def get_trade(self, query: dict, body: dict, trade_id: str) -> tuple[int, dict]:
+        return 200, {
+            "trade": self._trade_view(self._trade(trade_id)),
+            "lastTransactionID": self.last_id,
+        }
+
+    def open_trades(self, query: dict, body: dict) -> tuple[int, dict]:
+        return 200, {
+            "trades": [
+                self._trade_view(x)
+                for x in self.trades.values()
+                if x["state"] == "OPEN"
+            ],
+            "lastTransactionID": self.last_id,
+        }
+
+    def close_position(
+        self, query: dict, body: dict, instrument: str
+    ) -> tuple[int, dict]:
+        self.market.get(instrument)
+        bid, ask = self.market.quote(instrument, self.clock())
+        response: dict = {"relatedTransactionIDs": []}
+        for side, price, sign in [("long", bid, 1), ("short", ask, -1)]:
+            trades = [
+                x
+                for x in self.trades.values()
+                if x["instrument"] == instrument
+                and x["state"] == "OPEN"
+                and x["_units"] * sign > 0
+            ]
+            if body.get(f"{side}Units", "NONE") != "ALL" or not trades:
+                continue
+            units = sum(x["_units"] for x in trades)
+            create = self._transaction(
+                "MARKET_ORDER",
+                instrument=instrument,
+                units=f"{-units:.0f}",
+                reason="POSITION_CLOSEOUT",
+            )
+            fill = self._transaction(
+                "ORDER_FILL",
+                orderID=create["id"],
+                instrument=instrument,
+                units=f"{-units:.0f}",
+                price=self._fmt(instrument, price),
+                reason="MARKET_ORDER_POSITION_CLOSEOUT",
+            )
+            fill["tradesClosed"] = [self._close_trade(x, price, fill) for x in trades]
+            response[f"{side}OrderCreateTransaction"] = create
+            response[f"{side}OrderFillTransaction"] = fill
+            response["relatedTransactionIDs"] += [create["id"], fill["id"]]
+        if not response["relatedTransactionIDs"]:
+            raise ApiError(400, "The Position requested does not exist")
+        response["lastTransactionID"] = self.last_id
+        return 200, response
+
+    def changes(self, query: dict, body: dict) -> tuple[int, dict]:
+        try:
+            since = int(query["sinceTransactionID"])
+        except (KeyError, ValueError):
+            raise ApiError(400, "Invalid value specified for 'sinceTransactionID'")
+        if since > len(self.transactions):
+            raise ApiError(416, "The transaction ID is in the future")
+
+        changes: dict[str, dict] = {
+            k: {}
+            for k in [
+                "ordersCreated",
+                "ordersCancelled",
+                "ordersFilled",
+                "tradesOpened",
+                "tradesClosed",
+            ]
+        }
+        transactions = self.transactions[since:]
+        for tx in transactions:
+            if tx["type"].endswith("_ORDER") and tx["id"] in self.orders:
+                changes["ordersCreated"][tx["id"]] = self.orders[tx["id"]]
+            elif tx["type"] == "ORDER_CANCEL":
+                changes["ordersCancelled"][tx["orderID"]] = self.orders[tx["orderID"]]
+            elif tx["type"] == "ORDER_FILL":
+                if tx["orderID"] in self.orders:
+                    changes["ordersFilled"][tx["orderID"]] = self.orders[tx["orderID"]]
+                if "tradeOpened" in tx:
+                    trade_id = tx["tradeOpened"]["tradeID"]
+                    changes["tradesOpened"][trade_id] = self.trades[trade_id]
+                for closed in tx.get("tradesClosed", []):
+                    trade_id = closed["tradeID"]
+                    changes["tradesClosed"][trade_id] = self.trades[trade_id]
+        return 200, {
+            "changes": {
+                "ordersCreated": [
+                    _public(x) for x in changes["ordersCreated"].values()
+                ],
+                "ordersCancelled": [
+                    _public(x) for x in changes["ordersCancelled"].values()
+                ],
+                "ordersFilled": [_public(x) for x in changes["ordersFilled"].values()],
+                "ordersTriggered": [],
+                "tradesOpened": [
+                    self._trade_view(x) for x in changes["tradesOpened"].values()
+                ],
+                "tradesReduced": [],
+                "tradesClosed": [
+                    self._trade_view(x) for x in changes["tradesClosed"].values()
+                ],
+                "positions": [],
+                "transactions": transactions,
+            },
+            "state": self._account_state(),
+            "lastTransactionID": self.last_id,
+        }
+
+
+ROUTES = [
+    (method, re.compile(pattern), name)
+    for method, pattern, name in [
+        ("GET", "accounts/[^/]+/summary", "summary"),
+        ("GET", "accounts/[^/]+/instruments", "instruments"),
+        ("GET", "instruments/(?P<instrument>[^/]+)/candles", "candles"),
+        ("GET", "accounts/[^/]+/pricing", "pricing"),
+        ("GET", "accounts/[^/]+/pricing/stream", "stream"),
+        ("POST", "accounts/[^/]+/orders", "create_order"),
+        ("GET", r"accounts/[^/]+/orders/(?P<order_id>\d+)", "get_order"),
+        ("PUT", r"accounts/[^/]+/orders/(?P<order_id>\d+)", "replace_order"),
+        ("PUT", r"accounts/[^/]+/orders/(?P<order_id>\d+)/cancel", "cancel_order"),
+        ("GET", r"accounts/[^/]+/trades/(?P<trade_id>\d+)", "get_trade"),
+        ("GET", "accounts/[^/]+/openTrades", "open_trades"),
+        (
+            "PUT",
+            "accounts/[^/]+/positions/(?P<instrument>[^/]+)/close",
+            "close_position",
+        ),
+        ("GET", "accounts/[^/]+/changes", "changes"),
+    ]
+]
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "FakeServer"
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def do_PUT(self):
+        self.dispatch("PUT")
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def dispatch(self, method: str):
+        url = urlsplit(self.path)
+        path = url.path.strip("/").removeprefix("v3/")
+        query = dict(parse_qsl(url.query))
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length)) if length else {}
+        except ValueError:
+            return self.reply(400, {"errorMessage": "Invalid JSON in request body"})
+
+        for route_method, pattern, name in ROUTES:
+            if route_method == method and (match := pattern.fullmatch(path)):
+                break
+        else:
+            return self.reply(
+                404, {"errorMessage": "The requested resource does not exist"}
+            )
+
+        fake = self.server.fake
+        if name == "stream":
+            return self.stream(query.get("instruments", "").split(","))
+        if injected := fake.inject():
+            status, headers = injected
+            return self.reply(status, {"errorMessage": "Injected error"}, headers)
+        try:
+            with fake.lock:
+                fake.step()
+                status, payload = getattr(fake, name)(query, body, **match.groupdict())
+        except ApiError as e:
+            status, payload = e.status, {"errorMessage": e.message}
+        self.reply(status, payload)
+
+    def reply(self, status: int, payload: dict, headers: dict = {}):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def stream(self, instruments: list[str]):
+        """Sends prices of the instruments every "stream_interval" and heartbeats every 5 seconds."""
+        fake = self.server.fake
+        try:
+            for x in instruments:
+                fake.market.get(x)
+        except ApiError as e:
+            return self.reply(e.status, {"errorMessage": e.message})
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        heartbeat = 0.0
+        try:
+            while not self.server.closing.is_set():
+                with fake.lock:
+                    fake.step()
+                    lines = [fake.price(x) for x in instruments]
+                if time.monotonic() - heartbeat >= 5:
+                    heartbeat = time.monotonic()
+                    lines.append({"type": "HEARTBEAT", "time": fake._time()})
+                data = b"".join(json.dumps(x).encode() + b"\n" for x in lines)
+                self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+                self.server.closing.wait(fake.stream_interval)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        self.close_connection = True
+
+
+class FakeServer(ThreadingHTTPServer):
+    """
+    Fake OANDA v20 REST and pricing stream server.
+    Both "OANDA_BASE_URL" and "OANDA_STREAM_URL" can point at its "url".
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self, address: tuple[str, int], fake: FakeOanda, verbose: bool = False
+    ):
+        super().__init__(address, Handler)
+        self.fake = fake
+        self.verbose = verbose
+        self.closing = threading.Event()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v3/"
+
+    def server_close(self):
+        self.closing.set()
+        super().server_close()
+
+
+def start(host: str = "127.0.0.1", port: int = 0, **kwargs) -> FakeServer:
+    """Starts the server in a background thread, port 0 picks a free one."""
+    server = FakeServer((host, port), FakeOanda(**kwargs))
+    threading.Thread(
+        target=server.serve_forever, daemon=True, name="fake-oanda"
+    ).start()
+    return server
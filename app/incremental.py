@@ -0,0 +1,381 @@
+import json
+import math
+from abc import ABC, abstractmethod
+from collections import deque
+
+import numpy as np
+
+NAN = float("nan")
+
+
+class Indicator(ABC):
+    """
+    Stateful indicator updated bar by bar in constant time.
+    Outputs match the batch functions of `indicators` over the same bars.
+    `state()` is plain JSON, `load()` restores an indicator from it, e.g. after a worker restart.
+    """
+
+    fields: tuple[str, ...] = ()
+
+    def seed(self, *columns):
+        """Feed history, columns are the arguments of `update` as sequences of equal length."""
+        value = NAN
+        for bar in zip(*columns):
+            value = self.update(*bar)
+        return value
+
+    @abstractmethod
+    def update(self, *bar):
+        """Add a complete bar and return the value at it."""
+
+    def peek(self, *bar):
+        """Value of a bar that is not complete yet, the state is left unchanged."""
+        return load(self.state()).update(*bar)
+
+    def state(self) -> dict:
+        state = {"type": type(self).__name__}
+        for field in self.fields:
+            value = getattr(self, field)
+            if isinstance(value, deque):
+                value = [list(x) if isinstance(x, tuple) else x for x in value]
+            elif isinstance(value, float) and math.isnan(value):
+                value = None
+            state[field] = value
+        return state
+
+    @classmethod
+    def from_state(cls, state: dict):
+        self = cls.__new__(cls)
+        for field in cls.fields:
+            value = state[field]
+            if isinstance(value, list):
+                value = deque(tuple(x) if isinstance(x, list) else x for x in value)
+            elif value is None:
+                value = NAN
+            setattr(self, field, value)
+        return self
+
+
+class EMA(Indicator):
+    """Exponential moving average, see `indicators.get_ema`."""
+
+    fields = ("period", "alpha", "value")
+
+    def __init__(self, period=50):
+        self.period = period
+        self.alpha = 2 / (period + 1)
+        self.value = NAN
+
+    def update(self, x: float) -> float:
+        if math.isnan(self.value):
+            self.value = x
+        else:
+            self.value += self.alpha * (x - self.value)
+        return self.value
+
+
+class ATR(Indicator):
+    """Average true range with Wilder smoothing, see `indicators.get_atr`."""
+
+    fields = ("period", "close", "value")
+
+    def __init__(self, period=14):
+        self.period = period
+        self.close = NAN
+        self.value = NAN
+
+    def update(self, high: float, low: float, close: float) -> float:
+        tr = abs(high - low)
+        if not math.isnan(self.close):
+            tr = max(tr, abs(high - self.close), abs(low - self.close))
+        self.close = close
+        if math.isnan(self.value):
+            self.value = tr
+        else:
+            self.value += (tr - self.value) / self.period
+        return self.value
+
+
+class RSI(Indicator):
+    """
+    Relative strength index, see `indicators.get_rsi`.
+    Averages start as the mean of the first `period` changes, then Wilder smoothing.
+    """
+
+    fields = ("period", "close", "count", "up", "down", "value")
+
+    def __init__(self, period=14):
+        self.period = period
+        self.close = NAN
+        self.count = 0
+        self.up = 0.0
+        self.down = 0.0
+        self.value = NAN
+
+    def update(self, x: float) -> float:
+        if math.isnan(self.close):
+            self.close = x
+            return self.value
+        delta, self.close = x - self.close, x
+        u, d = max(delta, 0.0), max(-delta, 0.0)
+        self.count += 1
+        if self.count < self.period:
+            self.up += u
+            self.down += d
+            return self.value
+        if self.count == self.period:
+            self.up = (self.up + u) / self.period
+            self.down = (self.down + d) / self.period
+        else:
+            self.up += (u - self.up) / self.period
+            self.down += (d - self.down) / self.period
+        if self.down:
+            self.value = 100 - 100 / (1 + self.up / self.down)
+        else:
+            self.value = 100.0 if self.up else NAN
+        return self.value
+
+
+class SMA(Indicator):
+    """
+    Simple moving average, see `indicators.get_sma`.
+    Sums are kept relative to the first value to stay precise,
+    and are recomputed from the window once per period against drift.
+    """
+
+    fields = ("period", "window", "shift", "sum", "sumsq", "updates")
+
+    def __init__(self, period=50):
+        self.period = period
+        self.window = deque()
+        self.shift = NAN
+        self.sum = 0.0
+        self.sumsq = 0.0
+        self.updates = 0
+
+    def push(self, x: float):
+        if math.isnan(self.shift):
+            self.shift = x
+        x -= self.shift
+        self.window.append(x)
+        self.sum += x
+        self.sumsq += x * x
+        if len(self.window) > self.period:
+            old = self.window.popleft()
+            self.sum -= old
+            self.sumsq -= old * old
+        self.updates += 1
+        if self.updates % self.period == 0:
+            self.sum = math.fsum(self.window)
+            self.sumsq = math.fsum(y * y for y in self.window)
+
+    def mean(self) -> float:
+        if len(self.window) < self.period:
+            return NAN
+        return self.shift + self.sum / self.period
+
+    def std(self) -> float:
+        if len(self.window) < self.period:
+            return NAN
+        mean = self.sum / self.period
+        return math.sqrt(max(self.sumsq / self.period - mean * mean, 0.0))
+
+    def update(self, x: float) -> float:
+        self.push(x)
+        return self.mean()
+
+
+class Bollinger(SMA):
+    """Bollinger bands as (BBL, BBH, BBD), see `indicators.bollinger_bands`."""
+
+    fields = SMA.fields + ("sigma",)
+
+    def __init__(self, length=20, sigma=2):
+        super().__init__(length)
+        self.sigma = sigma
+
+    def update(self, x: float) -> tuple[float, float, float]:
+        self.push(x)
+        mean, std = self.mean(), self.std()
+        return mean - std * self.sigma, mean + std * self.sigma, std
+
+
+class RollingMin(Indicator):
+    """Minimum of the last `period` values, kept in a monotonic deque."""
+
+    fields = ("period", "count", "window")
+
+    def __init__(self, period=14):
+        self.period = period
+        self.count = 0
+        self.window = deque()  # (index, value), values increase
+
+    def better(self, a: float, b: float) -> bool:
+        return a <= b
+
+    def update(self, x: float) -> float:
+        while self.window and self.better(x, self.window[-1][1]):
+            self.window.pop()
+        self.window.append((self.count, x))
+        self.count += 1
+        if self.window[0][0] <= self.count - 1 - self.period:
+            self.window.popleft()
+        return self.window[0][1] if self.count >= self.period else NAN
+
+
+class RollingMax(RollingMin):
+    """Maximum of the last `period` values, kept in a monotonic deque."""
+
+    def better(self, a: float, b: float) -> bool:
+        return a >= b
+
+
+class Stochastic(Indicator):
+    """
+    Stochastic oscillator entries as 1 (long), -1 (short) or 0,
+    see `indicators.get_stochastic_oscillator`.
+    """
+
+    fields = ("period", "low", "high", "k", "d", "long", "short")
+
+    def __init__(self, period=14):
+        self.period = period
+        self.low = RollingMin(period)
+        self.high = RollingMax(period)
+        self.k = deque()  # last 3 %K
+        self.d = NAN
+        self.long = NAN
+        self.short = NAN
+
+    def update(self, high: float, low: float, close: float) -> float:
+        l14, h14 = self.low.update(low), self.high.update(high)
+        try:
+            k = 100 * ((close - l14) / (h14 - l14))
+        except ZeroDivisionError:
+            k = NAN if close == l14 else math.copysign(math.inf, close - l14)
+        prev_k = self.k[-1] if self.k else NAN
+        prev_d = self.d
+        self.k.append(k)
+        if len(self.k) > 3:
+            self.k.popleft()
+        d = self.d = sum(self.k) / 3 if len(self.k) == 3 else NAN
+        if math.isinf(d):
+            d = self.d = NAN
+
+        if math.isnan(self.long):
+            self.long = self.short = 0.0
+        else:
+            if k < d and prev_k > prev_d and d > 80:
+                self.short = -1.0
+            elif k > d and prev_k < prev_d:
+                self.short = 0.0
+            if k > d and prev_k < prev_d and d < 20:
+                self.long = 1.0
+            elif k < d and prev_k > prev_d:
+                self.long = 0.0
+        return self.long + self.short
+
+    def state(self) -> dict:
+        return super().state() | {
+            "low": self.low.state(),
+            "high": self.high.state(),
+            "k": [None if math.isnan(x) else x for x in self.k],
+        }
+
+    @classmethod
+    def from_state(cls, state: dict):
+        self = super().from_state(state)
+        self.low = load(state["low"])
+        self.high = load(state["high"])
+        self.k = deque(NAN if x is None else x for x in state["k"])
+        return self
+
+
+INDICATORS = {
+    cls.__name__: cls
+    for cls in [EMA, ATR, RSI, SMA, Bollinger, RollingMin, RollingMax, Stochastic]
+}
+
+
+def load(state: dict) -> Indicator:
+    """Restore an indicator from its `state()`."""
+    return INDICATORS[state["type"]].from_state(state)
+
+
+def dumps(indicators: dict[str, Indicator]) -> str:
+    return json.dumps({name: x.state() for name, x in indicators.items()})
+
+
+def loads(data: str) -> dict[str, Indicator]:
+    return {name: load(state) for name, state in json.loads(data).items()}
+
+
+# Pipeline columns kept by `Columns` and the candle columns their indicators are fed
+COLUMNS = {"MA": ("Close",), "ATR": ("High", "Low", "Close"), "RSI": ("Close",)}
+
+
+class Columns:
+    """
+    Indicator columns of a candle window kept per pair and interval, the counterpart of
+    `ta.TrendDetector` for the "MA", "ATR" and "RSI" stages of the pipeline.
+    Complete bars are fed once and their values kept, the incomplete last bar is peeked at.
+    Values continue the indicators seeded with the first window, so on a sliding window
+    the first bars differ slightly from the batch functions, which start at the window's first bar.
+    """
+
+    def __init__(self, size=500):
+        self.size = size  # Bars of values to keep
+        self.indicators = {"MA": EMA(50), "ATR": ATR(14), "RSI": RSI(14)}
+        self.times = np.empty(0, dtype=np.int64)
+        self.values = {name: np.empty(0) for name in COLUMNS}
+
+    def reset(self):
+        self.__init__(self.size)
+
+    @property
+    def nbytes(self) -> int:
+        return self.times.nbytes + sum(x.nbytes for x in self.values.values())
+
+    def _sync(self, times: np.ndarray, bars: dict[str, np.ndarray], complete: int):
+        """Add complete bars not seen yet, start over if they don't follow the ones kept."""
+        k = -1
+        if len(self.times) and complete and len(times) <= self.size:
+            k = int(np.searchsorted(times[:complete], self.times[-1]))
+            seen = self.times[len(self.times) - k - 1 :]
+            if (
+                k == complete
+                or len(seen) != k + 1
+                or not np.array_equal(seen, times[: k + 1])
+            ):
+                k = -1
+        if k < 0:
+            self.reset()
+            self.size = max(self.size, len(times))
+        new = slice(k + 1, complete)
+        self.times = np.concatenate([self.times, times[new]])[-self.size :]
+        for name, indicator in self.indicators.items():
+            columns = [bars[x][new].tolist() for x in COLUMNS[name]]
+            added = [indicator.update(*bar) for bar in zip(*columns)]
+            self.values[name] = np.concatenate([self.values[name], added])[-self.size :]
+
+    def columns(
+        self,
+        times: np.ndarray,
+        bars: dict[str, np.ndarray],
+        complete: int | None = None,
+    ) -> dict[str, np.ndarray]:
+        """
+        Indicator columns of the window, "bars" are its candle columns.
+        Bars from "complete" on (the last one by default) aren't complete yet.
+        """
+        n = len(times)
+        complete = n - 1 if complete is None else complete
+        self._sync(times, bars, complete)
+        results = {}
+        for name, indicator in self.indicators.items():
+            peeked = load(indicator.state())
+            columns = [bars[x][complete:].tolist() for x in COLUMNS[name]]
+            incomplete = [peeked.update(*bar) for bar in zip(*columns)]
+            kept = self.values[name][len(self.values[name]) - complete :]
+            results[name] = np.concatenate([kept, incomplete])
+        return results
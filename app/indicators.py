@@ -2,14 +2,26 @@ import numpy as np
 import pandas as pd
 
 
+def calc_true_range(
+    high: np.ndarray, low: np.ndarray, prev_close: np.ndarray
+) -> np.ndarray:
+    """True range, "prev_close" is NaN for the first bar."""
+    return np.fmax(
+        np.fmax(abs(high - low), abs(high - prev_close)), abs(low - prev_close)
+    )
+
+
+def calc_atr(true_range: np.ndarray, period=14) -> np.ndarray:
+    """Average True Range of 1-D or 2-D (pairs x time) true range."""
+    return _ewm_mean(true_range, alpha=1 / period, adjust=False)
+
+
 def get_atr(df: pd.DataFrame, period=14):
     """Add Average True Range index as "ATR" column."""
-    df2 = df[["High", "Low", "Close"]].copy()
-    df2["tr1"] = abs(df2.High - df2.Low)
-    df2["tr2"] = abs(df2.High - df2.Close.shift())
-    df2["tr3"] = abs(df2.Low - df2.Close.shift())
-    tr = df2[["tr1", "tr2", "tr3"]].max(axis=1)
-    df["ATR"] = tr.ewm(alpha=1 / period, adjust=False).mean()
+    tr = calc_true_range(
+        df.High.to_numpy(), df.Low.to_numpy(), _shift(df.Close.to_numpy())
+    )
+    df["ATR"] = calc_atr(tr, period)
     return df
 
 
@@ -19,9 +31,14 @@ def get_sma(df: pd.DataFrame, period=50):
     return df
 
 
+def calc_ema(x: np.ndarray, period=50) -> np.ndarray:
+    """Exponential Moving Average of 1-D or 2-D (pairs x time) values."""
+    return _ewm_mean(x, span=period, adjust=False)
+
+
 def get_ema(df: pd.DataFrame, period=50):
     """Add Exponensial Price Moving Average index as "MA" column."""
-    df["MA"] = df["Close"].ewm(span=period, adjust=False).mean()
+    df["MA"] = calc_ema(df["Close"].to_numpy(), period)
     return df
 
 
@@ -31,37 +48,108 @@ def get_vma(df: pd.DataFrame, period=50):
     return df
 
 
+def calc_bollinger_bands(
+    close: np.ndarray, length=20, sigma=2
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Bollinger Bands low, high and deviation of 1-D or 2-D (pairs x time) close prices."""
+    close_mean = _rolling(close, length, "mean")
+    std_dev = _rolling(close, length, "std", ddof=0)
+    return close_mean - (std_dev * sigma), close_mean + (std_dev * sigma), std_dev
+
+
 def bollinger_bands(df: pd.DataFrame, length=20, sigma=2):
     """Add Bollinder Bands index as "BBL", "BBH" and "BBD" columns."""
-    close = df.Close.rolling(length)
-    close_mean = close.mean()
-    std_dev = close.std(ddof=0)
-    df["BBL"] = close_mean - (std_dev * sigma)
-    df["BBH"] = close_mean + (std_dev * sigma)
-    df["BBD"] = std_dev
+    df["BBL"], df["BBH"], df["BBD"] = calc_bollinger_bands(
+        df.Close.to_numpy(), length, sigma
+    )
     return df
 
 
+def _ffill(x: np.ndarray) -> np.ndarray:
+    """Forward fill NaN along the last axis."""
+    idx = np.where(np.isnan(x), 0, np.arange(x.shape[-1]))
+    np.maximum.accumulate(idx, axis=-1, out=idx)
+    return np.take_along_axis(x, idx, axis=-1)
+
+
+def _shift(x: np.ndarray) -> np.ndarray:
+    """Shift by one along the last axis."""
+    out = np.empty_like(x)
+    out[..., 0] = np.nan
+    out[..., 1:] = x[..., :-1]
+    return out
+
+
+def _rolling(x: np.ndarray, window: int, how: str, **kwargs) -> np.ndarray:
+    """Rolling "mean", "std", "min" or "max" along the last axis of 1-D or 2-D array, computed by pandas."""
+    rolling = pd.DataFrame(np.atleast_2d(x).T, copy=False).rolling(window)
+    return getattr(rolling, how)(**kwargs).to_numpy().T.reshape(x.shape)
+
+
+def _ewm_mean(x: np.ndarray, **kwargs) -> np.ndarray:
+    """Exponential mean along the last axis of 1-D or 2-D array, computed by pandas."""
+    df = pd.DataFrame(np.atleast_2d(x).T, copy=False)
+    return df.ewm(**kwargs).mean().to_numpy().T.reshape(x.shape)
+
+
+def calc_rsi(close: np.ndarray, period=14) -> np.ndarray:
+    """
+    Relative Strength Index of close prices, 1-D or 2-D (pairs x time).
+    First `period` bars are NaN.
+    """
+    close = np.asarray(close, dtype=float)
+    rsi = np.full(close.shape, np.nan)
+    if close.shape[-1] <= period:
+        return rsi
+
+    delta = np.diff(close, axis=-1)
+    u = np.where(delta > 0, delta, delta * 0)
+    d = np.where(delta < 0, -delta, delta * 0)
+    u[..., period - 1] = np.mean(u[..., :period], axis=-1)
+    d[..., period - 1] = np.mean(d[..., :period], axis=-1)
+    up = _ewm_mean(u[..., period - 1 :], com=period - 1, adjust=False)
+    down = _ewm_mean(d[..., period - 1 :], com=period - 1, adjust=False)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi[..., period:] = 100 - 100 / (1 + up / down)
+    return rsi
+
+
 def get_rsi(df: pd.DataFrame, period=14):
     """Add Relative Strength Index as "RSI" column."""
-
-    delta = df["Close"].diff().dropna()
-    u = delta * 0
-    d = u.copy()
-    u[delta > 0] = delta[delta > 0]  # type: ignore
-    d[delta < 0] = -delta[delta < 0]  # type: ignore
-    u[u.index[period - 1]] = np.mean(u[:period])
-    u = u.drop(u.index[: (period - 1)])
-    d[d.index[period - 1]] = np.mean(d[:period])
-    d = d.drop(d.index[: (period - 1)])
-    rs = (
-        pd.DataFrame.ewm(u, com=period - 1, adjust=False).mean()  # type: ignore
-        / pd.DataFrame.ewm(d, com=period - 1, adjust=False).mean()  # type: ignore
-    )
-    df["RSI"] = 100 - 100 / (1 + rs)
+    df["RSI"] = calc_rsi(df["Close"].to_numpy(), period)
     return df
 
 
+def calc_stochastic_oscillator(
+    high: np.ndarray, low: np.ndarray, close: np.ndarray, period=14
+) -> np.ndarray:
+    """
+    Trade direction recommendation according to Stochastic Oscillator,
+    1-D or 2-D (pairs x time) prices.
+    """
+    high, low, close = (np.asarray(x, dtype=float) for x in (high, low, close))
+    l14 = _rolling(low, period, "min")
+    h14 = _rolling(high, period, "max")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        k = 100 * ((close - l14) / (h14 - l14))
+    d = _rolling(k, 3, "mean")
+    k1, d1 = _shift(k), _shift(d)
+    up = (k > d) & (k1 < d1)
+    down = (k < d) & (k1 > d1)
+
+    short = np.full(k.shape, np.nan)
+    short[down & (d > 80)] = -1
+    short[up] = 0
+    short[..., 0] = 0
+
+    long = np.full(k.shape, np.nan)
+    long[up & (d < 20)] = 1
+    long[down] = 0
+    long[..., 0] = 0
+
+    return _ffill(long) + _ffill(short)
+
+
 def get_stochastic_oscillator(df: pd.DataFrame, period=14):
     """
     Add column "SO" indicating trade direction recommendation accordint to Stochastic Oscillator.
@@ -69,38 +157,9 @@ def get_stochastic_oscillator(df: pd.DataFrame, period=14):
     "-1": Short entry
     "0": No entry
     """
-
-    df2 = df.copy()
-    df2["L14"] = df2["Low"].rolling(period).min()
-    df2["H14"] = df2["High"].rolling(period).max()
-    df2["%K"] = 100 * ((df2["Close"] - df2["L14"]) / (df2["H14"] - df2["L14"]))
-    df2["%D"] = df2["%K"].rolling(3).mean()
-
-    df2["Sell Entry"] = (
-        (df2["%K"] < df2["%D"]) & (df2["%K"].shift(1) > df2["%D"].shift(1))
-    ) & (df2["%D"] > 80)
-    df2["Sell Exit"] = (df2["%K"] > df2["%D"]) & (
-        df2["%K"].shift(1) < df2["%D"].shift(1)
+    df["SO"] = calc_stochastic_oscillator(
+        df["High"].to_numpy(), df["Low"].to_numpy(), df["Close"].to_numpy(), period
     )
-    df2["Short"] = np.nan
-    df2.loc[df2["Sell Entry"], "Short"] = -1
-    df2.loc[df2["Sell Exit"], "Short"] = 0
-    df2.loc[0, "Short"] = 0
-    df2["Short"] = df2["Short"].ffill()
-
-    df2["Buy Entry"] = (
-        (df2["%K"] > df2["%D"]) & (df2["%K"].shift(1) < df2["%D"].shift(1))
-    ) & (df2["%D"] < 20)
-    df2["Buy Exit"] = (df2["%K"] < df2["%D"]) & (
-        df2["%K"].shift(1) > df2["%D"].shift(1)
-    )
-    df2["Long"] = np.nan
-    df2.loc[df2["Buy Entry"], "Long"] = 1
-    df2.loc[df2["Buy Exit"], "Long"] = 0
-    df2.loc[0, "Long"] = 0
-    df2["Long"] = df2["Long"].ffill()
-
-    df["SO"] = df2["Long"] + df2["Short"]
     return df
 
 
@@ -131,75 +190,42 @@ def get_wave_length(df: pd.DataFrame):
 def get_elliott(df: pd.DataFrame):
     """Add "Wave" column representing the number of the wave according to Elliot Wave Theory."""
 
-    df.insert(9, "Wave", 0, True)
-
-    # Get waves "1"
-    df2 = df[df.HH | df.LL]
-    df.loc[df2[df2.WL > df2.ATR].index, "Wave"] = 1  # type: ignore
-
-    # Get waves "2"
-    df2 = df[df.HH | df.LL]
-    df3 = df2[
-        (df2.Wave.shift() == 1)
-        & (
-            (df2.LL & (df2.BP > df2.BP.shift(2)))
-            | (df2.HH & (df2.BP < df2.BP.shift(2)))
-        )
-    ]
-    df.loc[df3.index, "Wave"] = 2  # type: ignore
-
-    # Get waves "3"
-    df2 = df[df.HH | df.LL]
-    try:
-        df3 = df2[
-            (df2.Wave.shift() == 2)
-            & ((df2.WL > df2.WL.shift(2)) | (df2.WL > df2.WL.shift(-2)))
-        ]
-        df.loc[df3.index, "Wave"] = 3  # type: ignore
-    except IndexError:
-        df3 = df2[(df2.Wave.shift() == 2) & (df2.WL > df2.WL.shift(2))]
-        df.loc[df3.index, "Wave"] = 3  # type: ignore
-
-    # Get waves "4"
-    df2 = df[df.HH | df.LL]
-    df3 = df2[
-        (df2.Wave.shift() == 3)
-        & (
-            (df2.LL & (df2.BP > df2.BP.shift(3)))
-            | (df2.HH & (df2.BP < df2.BP.shift(3)))
-        )
-    ]
-    df.loc[df3.index, "Wave"] = 4  # type: ignore
-
-    # Get waves "5"
-    df2 = df[df.HH | df.LL]
-    df3 = df2[
-        (df2.Wave.shift() == 4)
-        & (
-            (df2.HH & (df2.BP > df2.BP.shift(2)))
-            | (df2.LL & (df2.BP < df2.BP.shift(2)))
-        )
-    ]
-    df.loc[df3.index, "Wave"] = 5  # type: ignore
-
-    n = 5
-    while not df3.empty:  # type: ignore
-        df2 = df[df.HH | df.LL]
-        df3 = df2[
-            (df2.Wave.shift() == n)
-            & (
-                (df2.LL & (df2.BP > df2.BP.shift(2)))
-                | (df2.HH & (df2.BP < df2.BP.shift(2)))
+    # Wave "n" follows wave "n - 1" on the previous swing, so labels are carried along the swings
+    # as sets of chains, the highest label wins.
+    idx = np.flatnonzero((df.HH | df.LL).to_numpy())
+    hh = df.HH.to_numpy()[idx]
+    ll = df.LL.to_numpy()[idx]
+    bp = df.BP.to_numpy()[idx]
+    wl = df.WL.to_numpy()[idx]
+    atr = df.ATR.to_numpy()[idx]
+    n = idx.size
+
+    def back(x: np.ndarray, i: int, k: int) -> float:
+        return x[i - k] if 0 <= i - k < n else np.nan
+
+    def follows(i: int, wave: int) -> bool:
+        """Whether the swing can be wave "wave" if the previous swing is wave "wave - 1"."""
+        if wave == 3:
+            return wl[i] > back(wl, i, 2) or wl[i] > back(wl, i, -2)
+        if wave == 5:
+            return (hh[i] and bp[i] > back(bp, i, 2)) or (
+                ll[i] and bp[i] < back(bp, i, 2)
             )
-        ]
-        df.loc[df3.index, "Wave"] = n + 1  # type: ignore
-
-        df2 = df[df.HH | df.LL]
-        df3 = df2[(df2.Wave.shift() == n + 1)]
-        df.loc[df3.index, "Wave"] = n + 2  # type: ignore
-
-        n += 2
-
+        if wave > 6 and wave % 2:
+            return True
+        k = 3 if wave == 4 else 2
+        return (ll[i] and bp[i] > back(bp, i, k)) or (hh[i] and bp[i] < back(bp, i, k))
+
+    waves = np.zeros(len(df), dtype=np.int64)
+    chains: list[int] = []
+    for i in range(n):
+        chains = [x + 1 for x in chains if follows(i, x + 1)]
+        if wl[i] > atr[i]:
+            chains.append(1)
+        if chains:
+            waves[idx[i]] = max(chains)
+
+    df.insert(9, "Wave", waves, True)
     return df
 
 
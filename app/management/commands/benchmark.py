@@ -0,0 +1,73 @@
+import json
+import platform
+
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+
+from app.benchmarks import REGRESSION_THRESHOLD, SUITES, compare
+
+FIELDS = ("suite", "stage", "impl", "n", "ms", "peak_kib")
+
+
+class Command(BaseCommand):
+    help = "Benchmark the data pipeline"
+
+    def add_arguments(self, parser):
+        parser.add_argument("suites", nargs="*", choices=list(SUITES))
+        parser.add_argument("--sizes", nargs="+", type=int)
+        parser.add_argument("--json", help="Write the results to JSON")
+        parser.add_argument(
+            "--baseline", help="Compare the results against a JSON written before"
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=REGRESSION_THRESHOLD,
+            help="Slowdown or memory growth against the baseline that fails, a fraction",
+        )
+
+    def handle(self, *args, **options):
+        results = []
+        for suite in options["suites"] or SUITES:
+            bench, sizes = SUITES[suite]
+            for result in bench(options["sizes"] or sizes):
+                result = {"suite": suite} | result
+                results.append(result)
+                self.stdout.write(self._line(result))
+
+        if options["json"]:
+            with open(options["json"], "w") as f:
+                json.dump(
+                    {
+                        "python": platform.python_version(),
+                        "numpy": np.__version__,
+                        "pandas": pd.__version__,
+                        "results": results,
+                    },
+                    f,
+                    indent=2,
+                )
+            self.stdout.write(f"[+] Results written to {options['json']}")
+
+        if options["baseline"]:
+            with open(options["baseline"]) as f:
+                baseline = json.load(f)["results"]
+            regressions = compare(results, baseline, options["threshold"])
+            for result in regressions:
+                self.stderr.write(f"[!] Regression: {self._line(result)}")
+            if regressions:
+                raise CommandError(
+                    f"{len(regressions)} result(s) regressed by more than "
+                    f"{options['threshold']:.0%} against {options['baseline']}"
+                )
+            self.stdout.write(f"[+] No regressions against {options['baseline']}")
+
+        self.stdout.write(self.style.SUCCESS("Benchmarks finished"))
+
+    def _line(self, result: dict) -> str:
+        extra = [f"{k}={v}" for k, v in result.items() if k not in FIELDS]
+        return (
+            f"{result["stage"]:<12} {result["impl"]:<10} n={result["n"]:<8} "
+            f"{result["ms"]:>10} ms {result["peak_kib"]:>10} KiB " + " ".join(extra)
+        )
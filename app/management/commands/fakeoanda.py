@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+
+from app.fakeoanda import FakeOanda, FakeServer
+
+
+class Command(BaseCommand):
+    help = "Run a fake OANDA v20 server"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8100)
+        parser.add_argument("--pairs", type=int, default=100)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--balance", type=float, default=100000)
+        parser.add_argument(
+            "--latency", type=float, default=0, help="Mean latency in seconds"
+        )
+        parser.add_argument(
+            "--jitter", type=float, default=0, help="Latency jitter in seconds"
+        )
+        parser.add_argument(
+            "--error-rate", type=float, default=0, help="Share of 503 responses"
+        )
+        parser.add_argument(
+            "--throttle-rate", type=float, default=0, help="Share of 429 responses"
+        )
+        parser.add_argument("--stream-interval", type=float, default=0.25)
+        parser.add_argument("--verbose", action="store_true")
+
+    def handle(self, *args, **options):
+        fake = FakeOanda(
+            pairs=options["pairs"],
+            seed=options["seed"],
+            balance=options["balance"],
+            latency=options["latency"],
+            jitter=options["jitter"],
+            error_rate=options["error_rate"],
+            throttle_rate=options["throttle_rate"],
+            stream_interval=options["stream_interval"],
+        )
+        server = FakeServer(
+            (options["host"], options["port"]), fake, options["verbose"]
+        )
+        print(f"[+] Fake OANDA v20 server listening on {server.url}")
+        print(
+            f"[+] Set TRAIDER_OANDA_BASE_URL and TRAIDER_OANDA_STREAM_URL to {server.url}"
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        self.stdout.write(self.style.SUCCESS("Fake OANDA v20 server stopped"))
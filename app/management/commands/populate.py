@@ -1,15 +1,12 @@
 from django.core.management.base import BaseCommand
 
-from app.models import Bot, BotGroup, Pair
+from app.models import BotGroup
 
 
 class Command(BaseCommand):
     help = "Import Instruments"
 
     def handle(self, *args, **options):
-        Pair.add_pairs()
-        Bot.add_bots()
-        bg, created = BotGroup.objects.get_or_create(id=1)
-        bg.bots.set(Bot.objects.all())
+        bg = BotGroup.import_instruments()
         print(f"[+] BotGroup {bg.name} created...")
         self.stdout.write(self.style.SUCCESS("Successfully imported instruments"))
@@ -0,0 +1,106 @@
+import cProfile
+import io
+import pstats
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+
+from app import api, enums, pipeline, utils
+from app.cassette import Cassette
+from app.models import BotGroup
+
+TARGETS = ["tick", "analysis", "chart"]
+
+
+class Command(BaseCommand):
+    help = "Profile a bot group tick, the analysis and the chart against a cassette"
+
+    def add_arguments(self, parser):
+        parser.add_argument("cassette", help="Gzipped JSON lines file")
+        parser.add_argument("targets", nargs="*", choices=TARGETS)
+        parser.add_argument(
+            "--record",
+            action="store_true",
+            help="Record the requests to the cassette instead of replaying them",
+        )
+        parser.add_argument(
+            "--realtime",
+            action="store_true",
+            help="Replay requests with the original timing",
+        )
+        parser.add_argument("--group", type=int, default=1)
+        parser.add_argument("--repeat", type=int, default=1)
+        parser.add_argument("--sort", default="cumulative")
+        parser.add_argument("--limit", type=int, default=25)
+        parser.add_argument(
+            "--output", help="Dump stats of every target to OUTPUT.<target>"
+        )
+
+    def handle(self, *args, **options):
+        mode = Cassette.RECORD if options["record"] else Cassette.REPLAY
+        cassette = Cassette(options["cassette"], mode, options["realtime"])
+        api.use_cassette(cassette)
+        print(
+            f"[+] {mode.capitalize()}ing OANDA-API requests with {options['cassette']}"
+        )
+
+        # Candles are neither seeded from nor saved to the store, so every run requests the same
+        # windows and only the main thread writes to the database, which is rolled back.
+        # Nothing is sent to Telegram.
+        store, api.candle_cache.store = api.candle_cache.store, None
+        with override_settings(TELEGRAM_API=None):
+            for target in options["targets"] or TARGETS:
+                profiler = cProfile.Profile()
+                for _ in range(options["repeat"]):
+                    if mode == Cassette.REPLAY:
+                        cassette.rewind()
+                    api.candle_cache.windows.clear()
+                    api.resamplers.clear()
+                    pipeline.window_cache.clear()
+                    with transaction.atomic():
+                        getattr(self, f"run_{target}")(profiler, options["group"])
+                        transaction.set_rollback(True)
+
+                print(f"[+] Profile of {target}, {options['repeat']} run(s)")
+                out = io.StringIO()
+                stats = pstats.Stats(profiler, stream=out)
+                stats.sort_stats(options["sort"]).print_stats(options["limit"])
+                self.stdout.write(out.getvalue())
+                if options["output"]:
+                    stats.dump_stats(f"{options['output']}.{target}")
+
+        api.candle_cache.store = store
+        api.use_cassette(None)
+        cassette.close()
+        self.stdout.write(self.style.SUCCESS("Profiling finished"))
+
+    def run_tick(self, profiler: cProfile.Profile, group: int):
+        """Whole tick, market hours are not checked."""
+        bg = BotGroup.objects.get(id=group)
+        profiler.runcall(bg.tick)
+
+    def run_analysis(self, profiler: cProfile.Profile, group: int):
+        """Analysis of the candles of every bot, candles are fetched beforehand."""
+        bg = BotGroup.objects.get(id=group)
+        for bot in bg.bot_set:
+            for i in [bg.interval_long, bg.interval_short]:
+                if data := api.get_ohlc_data(
+                    bot.pair.name, enums.Interval(i).label, count=500
+                ):
+                    profiler.runcall(
+                        lambda: utils.get_ohlc_analysis(
+                            utils.prep_data(data, smooth=bg.smooth)
+                        )
+                    )
+
+    def run_chart(self, profiler: cProfile.Profile, group: int):
+        """The chart's data callback for every bot's pair and interval."""
+        from app.chart import update_data
+
+        bg = BotGroup.objects.get(id=group)
+        for bot in bg.bot_set:
+            for i in [bg.interval_long, bg.interval_short]:
+                profiler.runcall(
+                    update_data, bot.pair.name, enums.Interval(i).label, 1, None
+                )
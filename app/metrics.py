@@ -0,0 +1,296 @@
+import json
+import threading
+from bisect import bisect_left
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from requests import RequestException, Session
+
+# Upper bounds of the latency buckets in seconds, the last bucket is unbounded
+BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.075,
+    0.1,
+    0.15,
+    0.2,
+    0.3,
+    0.5,
+    0.75,
+    1.0,
+    1.5,
+    2.5,
+    5.0,
+    10.0,
+)
+
+_ID_SEGMENTS = {
+    "accounts": "{accountID}",
+    "instruments": "{instrument}",
+    "orders": "{orderSpecifier}",
+    "trades": "{tradeSpecifier}",
+    "positions": "{instrument}",
+}
+ROUTE_CACHE_SIZE = 1024  # Endpoints contain order and trade IDs, so routes are evicted
+
+
+@lru_cache(maxsize=ROUTE_CACHE_SIZE)
+def get_route(endpoint: str) -> str:
+    """
+    Returns the route template of the endpoint, so accounts, instruments and IDs
+    don't end up as separate series, e.g. "accounts/{accountID}/orders/{orderSpecifier}".
+    """
+    parts = endpoint.split("?")[0].split("/")
+    for i in range(1, len(parts)):
+        if parts[i - 1] in _ID_SEGMENTS:
+            parts[i] = _ID_SEGMENTS[parts[i - 1]]
+    return "/".join(parts)
+
+
+class Histogram:
+    """Fixed bucket histogram, quantiles are interpolated inside of the bucket."""
+
+    def __init__(self, buckets: tuple[float, ...] = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float | None:
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[i - 1] if i else 0.0
+                if i == len(self.buckets):
+                    return lower
+                return lower + (self.buckets[i] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+class EndpointMetrics:
+    def __init__(self):
+        self.requests = 0
+        self.statuses: dict[str, int] = {}
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.latency = Histogram()
+
+    def state(self) -> dict:
+        return {
+            "requests": self.requests,
+            "statuses": dict(self.statuses),
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+            "latency": {
+                "count": self.latency.count,
+                "sum": round(self.latency.sum, 6),
+                **{
+                    f"p{round(q * 100)}": self.latency.quantile(q)
+                    for q in (0.5, 0.95, 0.99)
+                },
+            },
+        }
+
+
+class Registry:
+    """
+    In-process registry of OANDA-API request metrics per method and route.
+    Every attempt is recorded, so retries show up in the counts as well.
+    Status is "error" if the request failed to connect or timed out.
+    """
+
+    def __init__(self):
+        self.endpoints: dict[tuple[str, str], EndpointMetrics] = {}
+        self.lock = threading.Lock()
+
+    def observe(
+        self,
+        method: str,
+        endpoint: str,
+        status: int | None,
+        seconds: float,
+        sent: int = 0,
+        received: int = 0,
+    ):
+        key = (method, get_route(endpoint))
+        with self.lock:
+            if (metrics := self.endpoints.get(key)) is None:
+                metrics = self.endpoints[key] = EndpointMetrics()
+            metrics.requests += 1
+            status_key = str(status) if status else "error"
+            metrics.statuses[status_key] = metrics.statuses.get(status_key, 0) + 1
+            metrics.bytes_sent += sent
+            metrics.bytes_received += received
+            metrics.latency.observe(seconds)
+
+    def reset(self):
+        with self.lock:
+            self.endpoints = {}
+
+    def state(self) -> dict:
+        with self.lock:
+            return {f"{m} {r}": v.state() for (m, r), v in self.endpoints.items()}
+
+    def dump(self) -> list[dict]:
+        """Raw counts of every endpoint as JSON, "load" restores them, e.g. in another process."""
+        with self.lock:
+            return [
+                {
+                    "method": method,
+                    "route": route,
+                    "requests": m.requests,
+                    "statuses": dict(m.statuses),
+                    "bytes_sent": m.bytes_sent,
+                    "bytes_received": m.bytes_received,
+                    "buckets": list(m.latency.counts),
+                    "sum": m.latency.sum,
+                }
+                for (method, route), m in self.endpoints.items()
+            ]
+
+    @classmethod
+    def load(cls, dump: list[dict]):
+        self = cls()
+        for x in dump:
+            m = self.endpoints[(x["method"], x["route"])] = EndpointMetrics()
+            m.requests = x["requests"]
+            m.statuses = x["statuses"]
+            m.bytes_sent = x["bytes_sent"]
+            m.bytes_received = x["bytes_received"]
+            m.latency.counts = x["buckets"]
+            m.latency.count = sum(x["buckets"])
+            m.latency.sum = x["sum"]
+        return self
+
+    def prometheus(self) -> str:
+        """Returns metrics in the Prometheus text exposition format."""
+        return prometheus({"": self})
+
+
+def prometheus(registries: dict[str, Registry]) -> str:
+    """
+    Metrics of the registries in the Prometheus text exposition format,
+    series are labelled with the "process" they're keyed by unless it's empty.
+    """
+    endpoints = []
+    for process, registry in registries.items():
+        with registry.lock:
+            for (method, route), m in sorted(registry.endpoints.items()):
+                labels = f'method="{method}",route="{route}"'
+                if process:
+                    labels = f'process="{process}",{labels}'
+                endpoints.append((labels, m))
+
+    lines = [
+        "# HELP oanda_requests_total OANDA-API requests by status code.",
+        "# TYPE oanda_requests_total counter",
+    ]
+    for labels, m in endpoints:
+        for status, count in sorted(m.statuses.items()):
+            lines.append(f'oanda_requests_total{{{labels},status="{status}"}} {count}')
+
+    for name, attr, help in [
+        ("oanda_request_bytes_total", "bytes_sent", "sent in request bodies"),
+        (
+            "oanda_response_bytes_total",
+            "bytes_received",
+            "received in response bodies",
+        ),
+    ]:
+        lines.append(f"# HELP {name} Bytes {help}.")
+        lines.append(f"# TYPE {name} counter")
+        for labels, m in endpoints:
+            lines.append(f"{name}{{{labels}}} {getattr(m, attr)}")
+
+    lines.append("# HELP oanda_request_duration_seconds OANDA-API request latency.")
+    lines.append("# TYPE oanda_request_duration_seconds histogram")
+    for labels, m in endpoints:
+        cumulative = 0
+        for bound, count in zip(m.latency.buckets, m.latency.counts):
+            cumulative += count
+            lines.append(
+                f'oanda_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}'
+            )
+        lines.append(
+            f'oanda_request_duration_seconds_bucket{{{labels},le="+Inf"}} {m.latency.count}'
+        )
+        lines.append(f"oanda_request_duration_seconds_sum{{{labels}}} {m.latency.sum}")
+        lines.append(
+            f"oanda_request_duration_seconds_count{{{labels}}} {m.latency.count}"
+        )
+    return "\n".join(lines) + "\n"
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Serves the registry of the process as "/metrics" and as JSON as "/metrics.json"."""
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/metrics":
+            body = registry.prometheus().encode()
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        elif path == "/metrics.json":
+            body = json.dumps(registry.dump()).encode()
+            content_type = "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_served = False
+_serving = threading.Lock()
+
+
+def serve(port: int, host: str = "127.0.0.1"):
+    """
+    Serve the registry of this process in a background thread, only the first call starts it,
+    so the metrics of the process running the bots can be scraped or fetched by the web process.
+    """
+    global _served
+    with _serving:
+        if _served:
+            return
+        _served = True
+        try:
+            server = ThreadingHTTPServer((host, port), MetricsHandler)
+        except OSError as e:
+            print(f"[!] OANDA-API metrics can't be served on {host}:{port}: {e}")
+            return
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"[+] OANDA-API metrics served on {host}:{port}...")
+
+
+_session = Session()
+
+
+def fetch(url: str, timeout: float = 2) -> Registry | None:
+    """Registry another process serves at the URL of its "/metrics.json", None if it's not reachable."""
+    try:
+        response = _session.get(url, timeout=timeout)
+        response.raise_for_status()
+        return Registry.load(response.json())
+    except (RequestException, ValueError) as e:
+        print(f"[-] OANDA-API metrics of {url} not available: {e}")
+        return None
+
+
+registry = Registry()
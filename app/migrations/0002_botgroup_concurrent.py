@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-17 21:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='botgroup',
+            name='concurrent',
+            field=models.BooleanField(default=True, verbose_name='Fetch market data concurrently'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-17 21:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0002_botgroup_concurrent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='botgroup',
+            name='last_transaction_id',
+            field=models.CharField(blank=True, max_length=24, verbose_name='Last processed transaction ID'),
+        ),
+    ]
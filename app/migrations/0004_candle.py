@@ -0,0 +1,35 @@
+# Generated by Django 5.0.14 on 2026-10-17 21:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0003_botgroup_last_transaction_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Candle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('instrument', models.CharField(max_length=16)),
+                ('granularity', models.CharField(max_length=4)),
+                ('time', models.BigIntegerField(verbose_name='Open time (epoch)')),
+                ('open', models.FloatField()),
+                ('high', models.FloatField()),
+                ('low', models.FloatField()),
+                ('close', models.FloatField()),
+                ('volume', models.IntegerField(default=0)),
+                ('complete', models.BooleanField(default=True)),
+            ],
+            options={
+                'ordering': ['time'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='candle',
+            constraint=models.UniqueConstraint(fields=('instrument', 'granularity', 'time'), name='unique_candle'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-17 23:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0004_candle'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='botgroup',
+            name='compact',
+            field=models.BooleanField(default=False, verbose_name='Keep analysis data compact'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-17 23:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_botgroup_compact'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='botgroup',
+            name='panel',
+            field=models.BooleanField(default=False, verbose_name='Analyse market data of all pairs at once'),
+        ),
+    ]
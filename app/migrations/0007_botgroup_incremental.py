@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-17 23:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_botgroup_panel'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='botgroup',
+            name='incremental',
+            field=models.BooleanField(default=False, verbose_name='Update indicators with new candles only'),
+        ),
+    ]
@@ -1,13 +1,17 @@
+import asyncio
+import io
 from datetime import datetime, timedelta
 
+import numpy as np
+import pandas as pd
 import pytz
 import requests
 from django.conf import settings
-from django.db import models
+from django.db import connection, models, transaction
 from django.urls import reverse
 from django.utils import timezone
 
-from . import api, enums, patterns, utils
+from . import api, compact, enums, incremental, panel, patterns, pipeline, ta, utils
 
 
 class Asset(models.Model):
@@ -62,38 +66,56 @@ class Pair(models.Model):
 
     @classmethod
     def add_pairs(cls):
+        """
+        Import instruments or update the imported ones in one transaction.
+        Number of queries doesn't depend on the number of instruments.
+        """
         pair_list = api.get_instruments()
-        for pair in pair_list:
-            base, _ = Asset.objects.get_or_create(
-                name=pair["displayName"].split("/")[0]
+        names = {x for pair in pair_list for x in pair["displayName"].split("/")}
+        fields = [
+            "base",
+            "quote",
+            "altname",
+            "cost_decimals",
+            "lot_decimals",
+            "ordermin",
+            "max_leverage",
+        ]
+
+        with transaction.atomic():
+            known = set(
+                Asset.objects.filter(name__in=names).values_list("name", flat=True)
             )
-            quote, _ = Asset.objects.get_or_create(
-                name=pair["displayName"].split("/")[1]
-            )
-            max_leverage = int(1 / float(pair["marginRate"]))
-            try:
-                p = Pair.objects.get(name=pair["name"])
-                p.base = base
-                p.quote = quote
-                p.altname = pair["displayName"]
-                p.cost_decimals = pair["pipLocation"] * -1
-                p.lot_decimals = pair["tradeUnitsPrecision"]
-                p.ordermin = pair["minimumTradeSize"]
-                p.max_leverage = max_leverage
-                p.save()
-            except Pair.DoesNotExist:
-                p = Pair(
-                    name=pair["name"],
-                    base=base,
-                    quote=quote,
-                    altname=pair["displayName"],
-                    cost_decimals=pair["pipLocation"] * -1,
-                    lot_decimals=pair["tradeUnitsPrecision"],
-                    ordermin=pair["minimumTradeSize"],
-                    max_leverage=max_leverage,
-                )
-                p.save()
-            print(f"[+] Pair {p.name} created...")
+            Asset.objects.bulk_create([Asset(name=x) for x in sorted(names - known)])
+            assets = {x.name: x for x in Asset.objects.filter(name__in=names)}
+            pairs = {
+                x.name: x
+                for x in cls.objects.filter(name__in=[y["name"] for y in pair_list])
+            }
+
+            created, updated = [], []
+            for pair in pair_list:
+                base, quote = pair["displayName"].split("/")
+                values = {
+                    "base_id": assets[base].pk,
+                    "quote_id": assets[quote].pk,
+                    "altname": pair["displayName"],
+                    "cost_decimals": pair["pipLocation"] * -1,
+                    "lot_decimals": pair["tradeUnitsPrecision"],
+                    "ordermin": float(pair["minimumTradeSize"]),
+                    "max_leverage": int(1 / float(pair["marginRate"])),
+                }
+                if p := pairs.get(pair["name"]):
+                    if any(getattr(p, k) != v for k, v in values.items()):
+                        for k, v in values.items():
+                            setattr(p, k, v)
+                        updated.append(p)
+                else:
+                    created.append(cls(name=pair["name"], **values))
+
+            cls.objects.bulk_create(created)
+            cls.objects.bulk_update(updated, fields)
+        print(f"[+] {len(created)} pairs created, {len(updated)} updated...")
 
 
 class Order(models.Model):
@@ -184,6 +206,8 @@ class Bot(models.Model):
         super().__init__(*args, **kwargs)
         self.bg: BotGroup
         self.data = {}
+        self.trends: dict[int, ta.TrendDetector] = {}
+        self.indicators: dict[int, incremental.Columns] = {}
         self.account_margin: float
         if self.pk:
             self.order: Order = self.open_order()
@@ -193,10 +217,12 @@ class Bot(models.Model):
 
     @classmethod
     def add_bots(cls):
-        pairs = Pair.objects.all()
-        for p in pairs:
-            bot, _ = cls.objects.get_or_create(pair=p)
-            print(f"[+] Bot {bot.pair.name} created...")
+        """Create a bot for every pair that doesn't have one yet."""
+        with transaction.atomic():
+            bots = cls.objects.bulk_create(
+                [cls(pair=p) for p in Pair.objects.filter(bot__isnull=True)]
+            )
+        print(f"[+] {len(bots)} bots created...")
 
     def get_log_url(self):
         return reverse("app:log", args=[str(self.pk)])
@@ -239,13 +265,15 @@ class Bot(models.Model):
             self._analyze()
 
     def _get_account(self):
-        if data := api.get_account():
+        if data := self.bg.get_account():
             self.account_margin = float(data["account_margin"])
             return True
         return False
 
     def _get_pricing(self):
-        if data := api.get_spread(self.pair.name):
+        if data := self.bg.get_pricing().get(
+            self.pair.name, self.pair.base.name, self.pair.quote.name
+        ):
             if not data["tradeable"]:
                 print(f"[-] {self.pair.name} isn't tradeable at the moment...")
                 return False
@@ -266,25 +294,84 @@ class Bot(models.Model):
     ):
         # Return cached data if it's not too old
         if self._data_is_valid(i) and valid:
-            return self.data[i]
+            return self.cached_data(i)
 
         count = 100 if simple else 500
 
         if api_data := api.get_ohlc_data(
             self.pair.name, enums.Interval(i).label, count=count
         ):
-            prepped_data = utils.prep_data(api_data, smooth=self.bg.smooth)
-            if simple:
-                self.data[i] = self.data[i] | utils.get_ohlc_analysis(
-                    prepped_data, vz=False
-                )
-            else:
-                self.data[i] = self.data[i] | utils.get_ohlc_analysis(prepped_data)
-            self.data[i]["last"] = datetime.now()
-            return self.data[i]
+            return self._set_data(i, api_data, simple)
 
         return {}
 
+    async def _aget_data(
+        self, endpoint, i: enums.Interval, prepped: dict | None = None
+    ):
+        """
+        Async counterpart of "_get_data" used to prefetch candles.
+        If "prepped" is given new candles are added to it to be analysed later.
+        """
+        if self._data_is_valid(i):
+            return self.cached_data(i)
+
+        if api_data := await api.aget_ohlc_data(
+            endpoint, self.pair.name, enums.Interval(i).label, count=500
+        ):
+            if prepped is not None:
+                prepped[self] = utils.prep_data(api_data, smooth=self.bg.smooth)
+                return prepped[self]
+            return self._set_data(i, api_data)
+
+        return {}
+
+    def _set_data(self, i: enums.Interval, api_data: dict, simple=False):
+        prepped_data = utils.prep_data(api_data, smooth=self.bg.smooth)
+        if simple:
+            # Processing an order only needs the ATR, the window isn't cached
+            return utils.get_ohlc_analysis(prepped_data, vz=False, columns=["ATR"])
+        return self._set_analysis(i, prepped_data)
+
+    def _set_analysis(self, i: enums.Interval, prepped_data: dict, values=None):
+        """Analyse and cache prepped candles, "values" are stage results computed already."""
+        data = utils.get_ohlc_analysis(
+            prepped_data,
+            detector=self.trends.setdefault(i, ta.TrendDetector()),
+            values=values,
+            indicators=(
+                self.indicators.setdefault(i, incremental.Columns())
+                if self.bg.incremental
+                else None
+            ),
+        )
+        data["last"] = datetime.now()
+        self.data[i] = self.data[i] | data
+        if self.bg.compact:
+            # The full frame is only kept until the caller is done with it
+            df = compact.CompactFrame(data["df"], self.pair.cost_decimals)
+            self.data[i]["df"] = df
+            return self.data[i] | data
+        return self.data[i]
+
+    def cached_data(self, i: enums.Interval) -> dict:
+        """Cached analysis of the interval, compact frames are restored."""
+        data = self.data.get(i, {})
+        if isinstance(df := data.get("df"), compact.CompactFrame):
+            return data | {"df": df.frame()}
+        return data
+
+    def memory_report(self) -> dict[int, dict[str, int]]:
+        """Bytes held by the cached analysis, the trend detector and indicators of every interval."""
+        report = {}
+        for i, data in self.data.items():
+            report[i] = compact.nbytes(data)
+            if i in self.trends:
+                report[i]["trend"] = self.trends[i].nbytes
+            if i in self.indicators:
+                report[i]["indicators"] = self.indicators[i].nbytes
+            report[i]["total"] = sum(report[i].values())
+        return report
+
     def _data_is_valid(self, i: enums.Interval):
         if i not in self.data or "last" not in self.data[i]:
             self.data[i] = {}
@@ -414,6 +501,8 @@ class Bot(models.Model):
             self.pair.base.save()
             self.pair.quote.save()
             self.bg.ready = False
+            # Margin is taken, the next bot has to see the new account state
+            self.bg.account = None
             self.log(f"Opened {self.order.order_dir} position", True)
         else:
             self.log("Failed to place order")
@@ -443,7 +532,11 @@ class Bot(models.Model):
                     self.log("Failed to place trailing stop")
 
     def _check_order(self):
-        if data := api.get_trade(self.order.trade_id):
+        # Closed trades are dispatched by the bot-group, only trail the stop-loss
+        if self.bg.tracking:
+            if self.order.status != enums.OrderStatus.TRAILING:
+                self._adjust_stop_loss()
+        elif data := api.get_trade(self.order.trade_id):
             if data["status"] == enums.OrderStatus.CLOSED:
                 self._close_order(data)
             elif self.order.status != enums.OrderStatus.TRAILING:
@@ -561,11 +654,29 @@ class BotGroup(models.Model):
     single = models.BooleanField(
         default=True, verbose_name="One position at a time only"
     )
+    concurrent = models.BooleanField(
+        default=True, verbose_name="Fetch market data concurrently"
+    )
+    compact = models.BooleanField(
+        default=False, verbose_name="Keep analysis data compact"
+    )
+    panel = models.BooleanField(
+        default=False, verbose_name="Analyse market data of all pairs at once"
+    )
+    incremental = models.BooleanField(
+        default=False, verbose_name="Update indicators with new candles only"
+    )
+    last_transaction_id = models.CharField(
+        max_length=24, blank=True, verbose_name="Last processed transaction ID"
+    )
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.ready = True
         self.closed = False
+        self.pricing: api.PricingSnapshot | None = None
+        self.account: dict | None = None
+        self.tracking = False
         if self.pk:
             self._init_bots()
 
@@ -573,12 +684,25 @@ class BotGroup(models.Model):
         self.bot_set = self.bots.all()
         for bot in self.bot_set:
             bot.bg = self
-            if self.ready and bot.open_order():
+            if self.ready and bot.order:
                 self.ready = False
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def import_instruments(cls) -> "BotGroup":
+        """
+        Import pairs, create bots for new ones and add every bot to the group,
+        together or not at all.
+        """
+        with transaction.atomic():
+            Pair.add_pairs()
+            Bot.add_bots()
+            bg, created = cls.objects.get_or_create(id=1)
+            bg.bots.set(Bot.objects.all())
+        return bg
+
     def start(self):
         self.on_status = True
         self.save(update_fields=["on_status"])
@@ -607,11 +731,178 @@ class BotGroup(models.Model):
             if self.closed:
                 print("[!] Forex opened...")
                 self.closed = False
-            for bot in self.bot_set:
-                if order := bot.open_order():
-                    bot.run(order)
-                elif not self.single or self.ready:
-                    bot.run()
+            self.tick()
+
+    def tick(self):
+        """Run all bots once."""
+        api.start_stream([bot.pair.name for bot in self.bot_set])
+        # Every bot analyses a window of the long and the short interval
+        pipeline.window_cache.reserve(2 * len(self.bot_set))
+        self.pricing = None
+        self.account = None
+        orders = self.open_orders()
+        self.tracking = self._reconcile(orders)
+        if self.concurrent:
+            asyncio.run(self._prefetch(orders))
+        for bot in self.bot_set:
+            if order := orders[bot.pk]:
+                bot.run(order)
+            elif not self.single or self.ready:
+                bot.run()
+
+    def memory_report(self) -> dict:
+        """Bytes held by the cached analysis of every bot, see "Bot.memory_report"."""
+        bots = {bot.name: bot.memory_report() for bot in self.bot_set}
+        total = sum(x["total"] for report in bots.values() for x in report.values())
+        return {"bots": bots, "total": total}
+
+    def open_orders(self) -> dict:
+        """Return the open order of every bot, loaded with a single query."""
+        bots = {bot.pk: bot for bot in self.bot_set}
+        orders = dict.fromkeys(bots)
+        for order in Order.objects.filter(bot__in=list(bots), closeprice=None):
+            order.bot = bots[order.bot_id]  # type: ignore
+            orders[order.bot_id] = order  # type: ignore
+        return orders
+
+    def _reconcile(self, orders: dict) -> bool:
+        """
+        Close orders whose trades were closed, with a constant number of requests.
+        Changes since the last processed transaction are used if they can be tracked,
+        otherwise orders are compared with the account's open trades
+        and only the trades that disappeared are requested.
+        Return False if trades have to be polled one by one.
+        """
+        if self._track_changes(orders):
+            return True
+
+        placed = [x for x in orders.values() if x and x.status and x.trade_id]
+        if not placed:
+            return True
+        if (trades := api.get_open_trades()) is None:
+            return False
+
+        for order in placed:
+            if order.trade_id in trades:
+                continue
+            data = api.get_trade(order.trade_id)
+            if data and data["status"] == enums.OrderStatus.CLOSED:
+                bot = order.bot
+                bot.order = order
+                bot._close_order(data)
+                orders[bot.pk] = None
+        return True
+
+    def _track_changes(self, orders: dict) -> bool:
+        """
+        Close orders whose trades were closed since the last processed transaction.
+        Return False if changes can't be tracked and trades have to be polled one by one.
+        """
+        if not self.last_transaction_id:
+            if data := self.get_account():
+                self.last_transaction_id = data["last_transaction_id"]
+                self.save(update_fields=["last_transaction_id"])
+            return False
+
+        if not (data := api.get_changes(self.last_transaction_id)):
+            # Resume from a fresh transaction ID after trades were polled this tick
+            self.last_transaction_id = ""
+            self.save(update_fields=["last_transaction_id"])
+            return False
+
+        for bot in self.bot_set:
+            order = orders[bot.pk]
+            if order and order.trade_id in data["closed"]:
+                bot.order = order
+                bot._close_order(data["closed"][order.trade_id])
+                orders[bot.pk] = None
+
+        if self.last_transaction_id != data["last_transaction_id"]:
+            self.last_transaction_id = data["last_transaction_id"]
+            self.save(update_fields=["last_transaction_id"])
+        if "account_margin" in data:
+            self.account = {
+                "account_margin": data["account_margin"],
+                "last_transaction_id": data["last_transaction_id"],
+            }
+        return True
+
+    async def _prefetch(self, orders: dict):
+        """
+        Fetch candles and prices the bots are going to need during this tick concurrently,
+        so the tick takes as long as the slowest request instead of all of them combined.
+        """
+        async with api.async_api() as endpoint:
+            # Bots with placed orders only need prices to adjust the stop-loss
+            trailing = [
+                bot
+                for bot in self.bot_set
+                if orders[bot.pk]
+                and orders[bot.pk].status
+                and orders[bot.pk].status != enums.OrderStatus.TRAILING
+            ]
+
+            analyze = []
+            if self.on_status and (not self.single or self.ready):
+                analyze = [
+                    bot for bot in self.bot_set if bot.on_status and not orders[bot.pk]
+                ]
+            await self._aget_data(endpoint, self.interval_long, analyze)
+
+            # Short interval data is only needed if there is a long trend
+            analyze = [
+                bot
+                for bot in analyze
+                if "df" in bot.data.get(self.interval_long, {})
+                and patterns.get_long_trend(bot.cached_data(self.interval_long))
+            ]
+            tasks = [self._aget_data(endpoint, self.interval_short, analyze)]
+            if analyze or trailing:
+                tasks.append(self._aget_pricing(endpoint))
+            await asyncio.gather(*tasks)
+
+    async def _aget_data(self, endpoint, i: enums.Interval, bots: list):
+        """
+        Fetch candles of the bots, in panel mode the stages that only depend on the candles
+        are computed for all pairs at once before every bot finishes its analysis.
+        Incremental indicators are left to the bots.
+        """
+        if not self.panel:
+            await asyncio.gather(*(bot._aget_data(endpoint, i) for bot in bots))
+            return
+
+        prepped = {}
+        await asyncio.gather(*(bot._aget_data(endpoint, i, prepped) for bot in bots))
+        columns = [
+            x
+            for x in panel.COLUMNS
+            if not (self.incremental and x in incremental.COLUMNS)
+        ]
+        values = panel.compute(
+            {bot: data["df"] for bot, data in prepped.items()}, columns
+        )
+        for bot, data in prepped.items():
+            bot._set_analysis(i, data, values[bot])
+
+    async def _aget_pricing(self, endpoint):
+        self.pricing = await api.aget_pricing(
+            endpoint, [bot.pair.name for bot in self.bot_set]
+        )
+
+    def get_account(self) -> dict:
+        """
+        Return account state, requested once per tick unless changes already brought it.
+        It's reset after an order is placed, so the next bot sees the margin it took.
+        """
+        if self.account is None:
+            self.account = api.get_account()
+        return self.account
+
+    def get_pricing(self) -> api.PricingSnapshot:
+        """Return prices of all the group's instruments, fetched once per tick."""
+        if self.pricing is None:
+            self.pricing = api.get_pricing([bot.pair.name for bot in self.bot_set])
+        return self.pricing
 
 
 class Log(models.Model):
@@ -626,6 +917,153 @@ class Log(models.Model):
         return f"{self.bot.name} {self.text}"
 
 
+class CandleQuerySet(models.QuerySet):
+    FIELDS = ["time", "open", "high", "low", "close", "volume", "complete"]
+
+    def upsert(self, instrument: str, granularity: str, candles: dict[str, np.ndarray]):
+        """Insert decoded candles or update the existing ones."""
+        rows = list(
+            zip(
+                [instrument] * len(candles["time"]),
+                [granularity] * len(candles["time"]),
+                candles["time"].astype(np.int64).tolist(),
+                candles["open"].tolist(),
+                candles["high"].tolist(),
+                candles["low"].tolist(),
+                candles["close"].tolist(),
+                candles["volume"].tolist(),
+                candles["complete"].tolist(),
+            )
+        )
+        if not rows:
+            return
+        if connection.vendor == "postgresql":
+            self._copy_upsert(rows)
+        else:
+            self.bulk_create(
+                [
+                    Candle(
+                        instrument=x[0],
+                        granularity=x[1],
+                        time=x[2],
+                        open=x[3],
+                        high=x[4],
+                        low=x[5],
+                        close=x[6],
+                        volume=x[7],
+                        complete=x[8],
+                    )
+                    for x in rows
+                ],
+                batch_size=500,
+                update_conflicts=True,
+                unique_fields=["instrument", "granularity", "time"],
+                update_fields=["open", "high", "low", "close", "volume", "complete"],
+            )
+
+    def _copy_upsert(self, rows: list[tuple]):
+        """COPY rows into a temporary table and merge it into the candle table."""
+        columns = (
+            "instrument, granularity, time, open, high, low, close, volume, complete"
+        )
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write("\t".join(map(str, row)) + "\n")
+        buffer.seek(0)
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Only dropped at the outermost commit, so a second call in the same
+            # transaction finds the table of the first one
+            cursor.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS candle_import ("
+                "instrument varchar(16), granularity varchar(4), time bigint, "
+                "open double precision, high double precision, low double precision, "
+                "close double precision, volume integer, complete boolean"
+                ") ON COMMIT DROP"
+            )
+            cursor.execute("TRUNCATE candle_import")
+            sql = f"COPY candle_import ({columns}) FROM STDIN"
+            raw = cursor.cursor
+            if hasattr(raw, "copy_expert"):  # psycopg2
+                raw.copy_expert(sql, buffer)
+            else:  # psycopg 3
+                with raw.copy(sql) as copy:
+                    copy.write(buffer.read())
+            cursor.execute(
+                f"INSERT INTO {Candle._meta.db_table} ({columns}) "
+                f"SELECT {columns} FROM candle_import "
+                "ON CONFLICT (instrument, granularity, time) DO UPDATE SET "
+                "open = EXCLUDED.open, high = EXCLUDED.high, low = EXCLUDED.low, "
+                "close = EXCLUDED.close, volume = EXCLUDED.volume, "
+                "complete = EXCLUDED.complete"
+            )
+
+    def window(
+        self,
+        instrument: str,
+        granularity: str,
+        start: float | None = None,
+        end: float | None = None,
+        count: int | None = None,
+    ):
+        """Return candles within [start, end), the last "count" of them if given."""
+        qs = self.filter(instrument=instrument, granularity=granularity)
+        if start is not None:
+            qs = qs.filter(time__gte=start)
+        if end is not None:
+            qs = qs.filter(time__lt=end)
+        if count is not None:
+            qs = qs.filter(pk__in=qs.order_by("-time")[:count].values("pk"))
+        return qs.order_by("time")
+
+    def arrays(self, *args, **kwargs) -> dict[str, np.ndarray]:
+        """
+        Return a window of candles as NumPy arrays in the same format as "oanda.decode_candles",
+        see "window" for arguments.
+        """
+        rows = list(self.window(*args, **kwargs).values_list(*self.FIELDS))  # type: ignore
+        data = np.array(rows, dtype=float).reshape(-1, len(self.FIELDS)).T.copy()
+        return {
+            "time": data[0],
+            "open": data[1],
+            "high": data[2],
+            "low": data[3],
+            "close": data[4],
+            "volume": data[5].astype(np.int64),
+            "complete": data[6].astype(bool),
+        }
+
+    def frame(self, *args, **kwargs) -> pd.DataFrame:
+        """Return a window of candles as a DataFrame in the same format as "utils.prep_data"."""
+        return utils.prep_data({"ohlc": self.arrays(*args, **kwargs)})["df"]
+
+
+class Candle(models.Model):
+    instrument = models.CharField(max_length=16)
+    granularity = models.CharField(max_length=4)
+    time = models.BigIntegerField(verbose_name="Open time (epoch)")
+    open = models.FloatField()
+    high = models.FloatField()
+    low = models.FloatField()
+    close = models.FloatField()
+    volume = models.IntegerField(default=0)
+    complete = models.BooleanField(default=True)
+
+    objects = CandleQuerySet.as_manager()
+
+    class Meta:
+        ordering = ["time"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["instrument", "granularity", "time"],
+                name="unique_candle",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.instrument} {self.granularity} {self.time}"
+
+
 def get_time():
     return timezone.localtime(timezone.now()).strftime("%m/%d/%y %H:%M:%S")
 
@@ -1,14 +1,31 @@
+import asyncio
 import json
 import time
 from typing import Any
 
+import numpy as np
+from aiohttp import ClientError, ClientSession, ClientTimeout, TCPConnector
 from requests import ConnectionError, ReadTimeout, Session
 
 from . import enums
+from .cassette import Cassette, Response
+from .metrics import Registry, registry
+from .throttle import CircuitBreaker, TokenBucket, backoff
+
+try:
+    from orjson import loads
+except ImportError:
+    from json import loads
 
 
 class Api:
-    """Defines a base api class."""
+    """
+    Defines a base api class.
+    Requests are rate limited per endpoint class, idempotent and throttled ones are retried
+    and the circuit breaker fails them fast while the API is down.
+    Every attempt is recorded in the metrics registry and, if a cassette is given,
+    recorded to it or played back from it instead of reaching the API.
+    """
 
     def __init__(
         self,
@@ -16,19 +33,28 @@ class Api:
         api_token: str,
         base_url: str,
         timeout: int = 3,
+        retries: int = 3,
+        limiters: dict[str, TokenBucket] | None = None,
+        breaker: CircuitBreaker | None = None,
+        metrics: Registry | None = None,
+        cassette: Cassette | None = None,
     ):
         self.api_account = api_account
         self.base_url = base_url
         self.timeout = timeout
+        self.retries = retries
+        self.limiters = limiters or {"default": TokenBucket(100)}
+        self.breaker = breaker or CircuitBreaker()
+        self.metrics = metrics or registry
+        self.cassette = cassette
+        self.headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_token}",
+            "Accept-Datetime-Format": "UNIX",
+        }
 
         self.session = Session()
-        self.session.headers.update(
-            {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {api_token}",
-                "Accept-Datetime-Format": "UNIX",
-            }
-        )
+        self.session.headers.update(self.headers)
 
     def get_query(self, params: dict) -> str:
         """Returns a query string of all given parameters."""
@@ -37,6 +63,83 @@ class Api:
             query += f"{key}={value}&"
         return query[:-1]
 
+    def get_limiter(self, endpoint: str) -> TokenBucket:
+        """Returns the rate limiter of the endpoint's class, or the default one."""
+        return self.limiters.get(endpoint_class(endpoint), self.limiters["default"])
+
+    def get_retry_delay(
+        self,
+        method: enums.Method,
+        status: int | None,
+        attempt: int,
+        retry_after: str | None = None,
+    ) -> float | None:
+        """
+        Returns seconds to wait before the next attempt or None if request shouldn't be retried.
+        "status" is None if the request failed to connect or timed out.
+        """
+        if attempt >= self.retries:
+            return None
+        if status == 429:
+            try:
+                return float(retry_after)  # type: ignore
+            except (TypeError, ValueError):
+                return backoff(attempt)
+        if method == enums.Method.GET and (status is None or status >= 500):
+            return backoff(attempt)
+        return None
+
+    def record(self, status: int | None):
+        """Count server errors and connection failures towards the circuit breaker."""
+        if status is None or status >= 500:
+            self.breaker.failure()
+        elif status != 429:
+            self.breaker.success()
+        else:
+            self.breaker.release()
+
+    def get_state(self) -> dict:
+        """Returns state of the rate limiters, the circuit breaker and request metrics."""
+        return {
+            "breaker": self.breaker.state(),
+            "limiters": {k: v.state() for k, v in self.limiters.items()},
+            "metrics": self.metrics.state(),
+        }
+
+    def get_path(self, url: str) -> str:
+        """Returns the URL relative to the base URL with the account ID left out, as it's recorded."""
+        path = url.removeprefix(self.base_url)
+        if self.api_account:
+            path = path.replace(self.api_account, "{accountID}")
+        return path
+
+    @property
+    def replaying(self) -> bool:
+        return self.cassette is not None and self.cassette.mode == Cassette.REPLAY
+
+    def pace(self, delay: float) -> float:
+        """Returns the delay to wait, replays that are not in real time don't wait."""
+        if self.replaying and not self.cassette.realtime:  # type: ignore
+            return 0
+        return delay
+
+    def transmit(self, method: enums.Method, url: str, data: str | None) -> Response:
+        try:
+            response = self.session.request(
+                method.value,
+                url,
+                data=data,
+                timeout=self.timeout,
+            )
+        except (ConnectionError, ReadTimeout):
+            return Response(None, None, None, b"")
+        return Response(
+            response.status_code,
+            response.reason,
+            response.headers.get("Retry-After"),
+            response.content,
+        )
+
     def send_request(
         self,
         method: enums.Method,
@@ -50,52 +153,246 @@ class Api:
         url = self.base_url + endpoint
         if method == enums.Method.GET:
             url += self.get_query(params)
+            data = None
+        else:
+            data = json.dumps(params)
+        sent = len(data.encode()) if data else 0
 
-        try:
-            if method == enums.Method.GET:
-                response = self.session.request(
-                    method.value,
-                    url,
-                    timeout=self.timeout,
+        limiter = self.get_limiter(endpoint)
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                print(
+                    f"[-] OANDA-API endpoint '{endpoint}' skipped, circuit breaker is open"
                 )
-            else:
-                response = self.session.request(
-                    method.value,
-                    url,
-                    data=json.dumps(params),
-                    timeout=self.timeout,
+                return None
+
+            time.sleep(self.pace(limiter.delay()))
+            start = time.perf_counter()
+            if self.replaying:
+                response, elapsed = self.cassette.play(  # type: ignore
+                    method.value, self.get_path(url), data
                 )
-        except (ConnectionError, ReadTimeout):
+                time.sleep(self.pace(elapsed))
+            else:
+                response = self.transmit(method, url, data)
+                if self.cassette:
+                    self.cassette.record(
+                        method.value,
+                        self.get_path(url),
+                        data,
+                        response,
+                        time.perf_counter() - start,
+                    )
+            self.metrics.observe(
+                method.value,
+                endpoint,
+                response.status,
+                time.perf_counter() - start,
+                sent,
+                len(response.body),
+            )
+            self.record(response.status)
+            delay = self.get_retry_delay(
+                method, response.status, attempt, response.retry_after
+            )
+            if delay is None:
+                return self.parse_response(endpoint, params, response)
+
+            time.sleep(self.pace(delay))
+            attempt += 1
+
+    def parse_response(self, endpoint: str, params: dict, response: Response) -> Any:
+        """Returns decoded response body or None if request failed."""
+
+        status, reason, body = response.status, response.reason, response.body
+        if status is None:
             print(
                 f"[-] OANDA-API endpoint '{endpoint}' returned with error 'ConnectionError'"
             )
             return None
 
-        if response.status_code in [400, 401, 403, 404, 405]:
-            res = json.loads(response.text)
+        if status in [400, 401, 403, 404, 405]:
+            res = loads(body)
             print(
-                f"[-] OANDA-API endpoint '{endpoint}' returned with error code '{response.status_code}'({response.reason}): {res["errorMessage"]}"
+                f"[-] OANDA-API endpoint '{endpoint}' returned with error code '{status}'({reason}): {res["errorMessage"]}"
             )
             print(json.dumps(params))
             return None
 
-        if response.status_code in [200, 201]:
-            return response.json()
+        if status in [200, 201]:
+            return loads(body)
 
         print(
-            f"[-] OANDA-API endpoint '{endpoint}' returned with error code '{response.status_code}'({response.reason})"
+            f"[-] OANDA-API endpoint '{endpoint}' returned with error code '{status}'({reason})"
         )
         return None
 
 
+class AsyncApi(Api):
+    """
+    Defines an asyncio api class.
+    Session is bound to the running event loop, so it has to be opened and closed inside of it.
+    """
+
+    def __init__(
+        self,
+        api_account: str,
+        api_token: str,
+        base_url: str,
+        concurrency: int = 10,
+        **kwargs,
+    ):
+        super().__init__(api_account, api_token, base_url, **kwargs)
+        self.concurrency = concurrency
+
+        self.session: ClientSession | None = None  # type: ignore
+        self.semaphore: asyncio.Semaphore | None = None
+
+    async def open(self):
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.session = ClientSession(
+            headers=self.headers,
+            timeout=ClientTimeout(total=self.timeout),
+            connector=TCPConnector(limit=self.concurrency),
+        )
+
+    async def close(self):
+        if self.session:
+            await self.session.close()
+        self.session = None
+
+    async def transmit(
+        self, method: enums.Method, url: str, data: str | None
+    ) -> Response:
+        try:
+            async with self.session.request(  # type: ignore
+                method.value,
+                url,
+                data=data,
+            ) as response:
+                return Response(
+                    response.status,
+                    response.reason,
+                    response.headers.get("Retry-After"),
+                    await response.read(),
+                )
+        except (ClientError, asyncio.TimeoutError):
+            return Response(None, None, None, b"")
+
+    async def send_request(
+        self,
+        method: enums.Method,
+        endpoint: str,
+        params: dict = {},
+    ) -> Any:
+        """
+        Sends a request with the given method to the given endpoint.
+        No more than "concurrency" requests are in flight at once.
+        """
+
+        url = self.base_url + endpoint
+        if method == enums.Method.GET:
+            url += self.get_query(params)
+            data = None
+        else:
+            data = json.dumps(params)
+        sent = len(data.encode()) if data else 0
+
+        limiter = self.get_limiter(endpoint)
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                print(
+                    f"[-] OANDA-API endpoint '{endpoint}' skipped, circuit breaker is open"
+                )
+                return None
+
+            await asyncio.sleep(self.pace(limiter.delay()))
+            async with self.semaphore:  # type: ignore
+                start = time.perf_counter()
+                if self.replaying:
+                    response, elapsed = self.cassette.play(  # type: ignore
+                        method.value, self.get_path(url), data
+                    )
+                    await asyncio.sleep(self.pace(elapsed))
+                else:
+                    response = await self.transmit(method, url, data)
+                    if self.cassette:
+                        self.cassette.record(
+                            method.value,
+                            self.get_path(url),
+                            data,
+                            response,
+                            time.perf_counter() - start,
+                        )
+                self.metrics.observe(
+                    method.value,
+                    endpoint,
+                    response.status,
+                    time.perf_counter() - start,
+                    sent,
+                    len(response.body),
+                )
+
+            self.record(response.status)
+            delay = self.get_retry_delay(
+                method, response.status, attempt, response.retry_after
+            )
+            if delay is None:
+                return self.parse_response(endpoint, params, response)
+
+            await asyncio.sleep(self.pace(delay))
+            attempt += 1
+
+
+def decode_candles(candles: list[dict]) -> dict[str, np.ndarray]:
+    """
+    Decode candles straight into preallocated columnar arrays.
+    Times and prices share one float64 block, so every column is contiguous.
+    """
+    n = len(candles)
+    mids = [x["mid"] for x in candles]
+    block = np.empty((5, n), dtype=np.float64)
+    block[0] = [x["time"] for x in candles]
+    block[1] = [x["o"] for x in mids]
+    block[2] = [x["h"] for x in mids]
+    block[3] = [x["l"] for x in mids]
+    block[4] = [x["c"] for x in mids]
+    volume = np.empty(n, dtype=np.int64)
+    volume[:] = [x["volume"] for x in candles]
+    complete = np.empty(n, dtype=bool)
+    complete[:] = [x["complete"] for x in candles]
+    return {
+        "time": block[0],
+        "open": block[1],
+        "high": block[2],
+        "low": block[3],
+        "close": block[4],
+        "volume": volume,
+        "complete": complete,
+    }
+
+
+def endpoint_class(endpoint: str) -> str:
+    """Returns the class of the endpoint rate limits are configured for."""
+    if endpoint.endswith("/candles"):
+        return "candles"
+    if "/pricing" in endpoint:
+        return "pricing"
+    if any(x in endpoint for x in ["/orders", "/trades", "/positions"]):
+        return "trading"
+    return "account"
+
+
 class Endpoint:
     """
     Class for handling all API endpoints
     https://developer.oanda.com/rest-live-v20/development-guide/
     """
 
-    def __init__(self, api_account: str, api_token: str, base_url: str):
-        self.api = Api(api_account, api_token, base_url)
+    def __init__(self, api_account: str, api_token: str, base_url: str, **kwargs):
+        self.api = Api(api_account, api_token, base_url, **kwargs)
 
     def summary(self) -> dict:
         headers = {
@@ -114,21 +411,31 @@ class Endpoint:
         self,
         pair: str,
         interval: str,
-        count: int = 500,
+        count: int | None = 500,
+        since: float | None = None,
+        to: float | None = None,
+        include_first: bool | None = None,
     ) -> dict:
-        params = {
+        params: dict = {
             "price": "M",
             "granularity": interval,
-            "count": count,
             "smooth": True,
         }
+        if count and not (since and to):
+            params["count"] = count
+        if since:
+            params["from"] = since
+        if to:
+            params["to"] = to
+        if include_first is not None:
+            params["includeFirst"] = include_first
         return self.api.send_request(
             enums.Method.GET, f"instruments/{pair}/candles", params
         )
 
-    def pricing(self, pair: str) -> dict:
+    def pricing(self, pairs: str | list[str]) -> dict:
         params = {
-            "instruments": pair,
+            "instruments": pairs if isinstance(pairs, str) else ",".join(pairs),
             "includeHomeConversions": True,
         }
         return self.api.send_request(
@@ -202,6 +509,22 @@ class Endpoint:
             f"accounts/{self.api.api_account}/trades/{trade_id}",
         )
 
+    def open_trades(self) -> dict:
+        return self.api.send_request(
+            enums.Method.GET,
+            f"accounts/{self.api.api_account}/openTrades",
+        )
+
+    def changes(self, since: str) -> dict:
+        params = {
+            "sinceTransactionID": since,
+        }
+        return self.api.send_request(
+            enums.Method.GET,
+            f"accounts/{self.api.api_account}/changes",
+            params,
+        )
+
     def cancel_order(self, order_id: str) -> dict:
         return self.api.send_request(
             enums.Method.PUT,
@@ -218,3 +541,33 @@ class Endpoint:
             f"accounts/{self.api.api_account}/positions/{pair}/close",
             params,
         )
+
+
+class AsyncEndpoint(Endpoint):
+    """
+    Asyncio counterpart of "Endpoint", every method returns an awaitable.
+    Use as an async context manager: "async with AsyncEndpoint(...) as endpoint:"
+    """
+
+    def __init__(
+        self,
+        api_account: str,
+        api_token: str,
+        base_url: str,
+        concurrency: int = 10,
+        **kwargs,
+    ):
+        self.api = AsyncApi(
+            api_account,
+            api_token,
+            base_url,
+            concurrency=concurrency,
+            **kwargs,
+        )
+
+    async def __aenter__(self):
+        await self.api.open()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.api.close()
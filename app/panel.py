@@ -0,0 +1,68 @@
+from collections import defaultdict
+from typing import Hashable
+
+import numpy as np
+import pandas as pd
+
+from . import pipeline
+
+# Stages a panel computes by default, the rest of the analysis runs per pair
+COLUMNS = ["MA", "ATR", "swing"]
+
+
+class Panel:
+    """
+    Candle windows of pairs that share one time axis as 2-D arrays (pairs x bars).
+    Stages that only depend on candle columns run once for all pairs.
+    The trend detector, value zones and frame assembly still run per pair,
+    so a tick's analysis as a whole still grows linearly with the pairs.
+    """
+
+    def __init__(self, frames: list[pd.DataFrame]):
+        self.frames = frames
+        self.time = frames[0].Date.values
+        self.values = {}
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        if name not in self.values:
+            if name in pipeline.CANDLES:
+                self.values[name] = np.stack(
+                    [df[name].to_numpy() for df in self.frames]
+                )
+            else:
+                stage = pipeline.STAGES[name]
+                results = stage.func(*[self[x] for x in stage.inputs])
+                if len(stage.outputs) == 1:
+                    results = (results,)
+                self.values.update(zip(stage.outputs, results))
+        return self.values[name]
+
+    def row(self, k: int, names: list[str]) -> dict[str, np.ndarray]:
+        """
+        Stage results of the k-th pair, copied since they're kept in the window cache
+        and views would keep the arrays of all pairs alive.
+        """
+        return {name: self[name][k].copy() for name in names}
+
+
+def compute(
+    frames: dict[Hashable, pd.DataFrame], columns: list[str] = COLUMNS
+) -> dict[Hashable, dict[str, np.ndarray]]:
+    """
+    Stage results the columns need for every candle window, to seed "pipeline.analyze" with.
+    Windows with the same times share a panel, stages depending on more than the candles are left out.
+    """
+    names = [x for x in pipeline.dependencies(columns) if pipeline.vectorized(x)]
+    axes = defaultdict(list)
+    for key, df in frames.items():
+        axes[df.Date.values.view("i8").tobytes()].append(key)
+
+    values = {}
+    for keys in axes.values():
+        panel = Panel([frames[key] for key in keys])
+        for k, key in enumerate(keys):
+            values[key] = panel.row(k, names)
+    return values
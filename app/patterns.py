@@ -11,12 +11,11 @@ def get_long_trend(data: dict):
     df2 = df[df.H | df.L]
     last = df.iloc[-1]
     prev = df2.iloc[-3]
-    z = dfz[(dfz.Top >= last.BP) & (dfz.Bottom <= last.BP)]
-    if not z.empty:
-        z = z.iloc[-1]
-        if last.DnT and (prev.BP > z.Top):
+    if z := dfz.contains(last.BP):
+        bottom, top = z
+        if last.DnT and (prev.BP > top):
             return OrderDir.LONG
-        elif last.UpT and (prev.BP < z.Bottom):
+        elif last.UpT and (prev.BP < bottom):
             return OrderDir.SHORT
 
 
@@ -0,0 +1,290 @@
+import copy
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import cache
+from typing import Callable, NamedTuple
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from . import candles, incremental, indicators, ta
+
+# Candle windows to keep stage results of besides the ones of the bot group, 0 turns memoizing off
+CACHE_SIZE = settings.ANALYSIS_CACHE_SIZE
+MUTABLE = ("zones",)  # Results callers may change, each one gets a copy
+
+CANDLES = ("Volume", "Date", "Open", "High", "Low", "Close")
+TREND = ("H", "L", "Bmax", "Bmin", "BP", "UpT", "DnT", "HH", "LL")
+
+# Where "get_ohlc_analysis" used to put the columns, None appends them
+LAYOUT = {
+    "MA": None,
+    "ATR": None,
+    "H": 5,
+    "L": 5,
+    "Bmax": None,
+    "Bmin": None,
+    "BP": None,
+    "UpT": 7,
+    "DnT": 7,
+    "HH": 7,
+    "LL": 7,
+}
+
+
+class Stage(NamedTuple):
+    func: Callable
+    inputs: tuple[str, ...]
+    outputs: tuple[str, ...]
+
+
+STAGES: dict[str, Stage] = {}  # By output
+
+
+def stage(*outputs: str, inputs: list[str]):
+    """
+    Register a function as the stage computing "outputs" from "inputs".
+    Inputs are candle columns, outputs of other stages, "df" for the window itself
+    or "detector" for the trend detector of the caller.
+    Outputs in "incremental.COLUMNS" are taken from the caller's indicators if it has them.
+    Stages that only depend on candle columns also take 2-D (pairs x time) arrays, see "panel".
+    """
+
+    def decorator(func):
+        for name in outputs:
+            STAGES[name] = Stage(func, tuple(inputs), outputs)
+        return func
+
+    return decorator
+
+
+@stage("prev_close", inputs=["Close"])
+def _prev_close(close):
+    prev_close = np.full(close.shape, np.nan)
+    prev_close[..., 1:] = close[..., :-1]
+    return prev_close
+
+
+@stage("true_range", inputs=["High", "Low", "prev_close"])
+def _true_range(high, low, prev_close):
+    return indicators.calc_true_range(high, low, prev_close)
+
+
+@stage("Bmax", "Bmin", inputs=["Open", "Close"])
+def _body(open_, close):
+    return np.fmax(open_, close), np.fmin(open_, close)
+
+
+@stage("swing", inputs=["Bmax", "Bmin"])
+def _swing(bmax, bmin):
+    return ta.calc_swings(bmax, bmin)
+
+
+@stage("MA", inputs=["Close"])
+def _ema(close):
+    return indicators.calc_ema(close)
+
+
+@stage("ATR", inputs=["true_range"])
+def _atr(true_range):
+    return indicators.calc_atr(true_range)
+
+
+@stage("RSI", inputs=["Close"])
+def _rsi(close):
+    return indicators.calc_rsi(close)
+
+
+@stage("SO", inputs=["High", "Low", "Close"])
+def _stochastic_oscillator(high, low, close):
+    return indicators.calc_stochastic_oscillator(high, low, close)
+
+
+@stage("BBL", "BBH", "BBD", inputs=["Close"])
+def _bollinger_bands(close):
+    return indicators.calc_bollinger_bands(close)
+
+
+@stage(*candles.PATTERNS, inputs=["Open", "High", "Low", "Close"])
+def _candle_patterns(open_, high, low, close):
+    patterns = candles.calc_candle_patterns(open_, high, low, close)
+    return tuple(patterns[x] for x in candles.PATTERNS)
+
+
+@stage(
+    "H",
+    "L",
+    "BP",
+    "UpT",
+    "DnT",
+    "HH",
+    "LL",
+    inputs=["df", "Bmax", "Bmin", "swing", "detector"],
+)
+def _trend(df, bmax, bmin, swing, detector):
+    names = ["H", "L", "BP", "UpT", "DnT", "HH", "LL"]
+    if detector:
+        flags = detector.detect(df.Date.values.view("i8"), bmax, bmin, swings=swing)
+        return tuple(flags[x] for x in names)
+    frame = df[list(CANDLES)].copy()
+    ta.get_trend(frame, body=(bmax, bmin), swings=swing)
+    return tuple(frame[x].to_numpy() for x in names)
+
+
+@stage("zones", inputs=["ATR", "UpT", "DnT", "BP"])
+def _zones(atr, upt, dnt, bp):
+    return ta.value_zones(atr, upt, dnt, bp)
+
+
+@cache
+def _depends(name: str, on: str) -> bool:
+    """Whether the stage output is or depends on "on", another output or an input."""
+    if name == on:
+        return True
+    if name not in STAGES:
+        return False
+    return any(_depends(x, on) for x in STAGES[name].inputs)
+
+
+@cache
+def vectorized(name: str) -> bool:
+    """Whether the stage only depends on candle columns, so it can run on many pairs at once."""
+    if name in CANDLES:
+        return True
+    if name not in STAGES:
+        return False
+    return all(vectorized(x) for x in STAGES[name].inputs)
+
+
+def dependencies(columns: list[str]) -> list[str]:
+    """Stages the columns need, each after its inputs."""
+    names = []
+
+    def visit(name):
+        if name in STAGES and name not in names:
+            for x in STAGES[name].inputs:
+                visit(x)
+            for x in STAGES[name].outputs:
+                if x not in names:
+                    names.append(x)
+
+    for name in columns:
+        visit(name)
+    return names
+
+
+def fingerprint(df: pd.DataFrame) -> bytes:
+    """Digest of the times and prices of the candle window."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(df.Date.values.view("i8").tobytes())
+    for column in ["Open", "High", "Low", "Close"]:
+        digest.update(df[column].to_numpy().tobytes())
+    return digest.digest()
+
+
+class WindowCache:
+    """
+    Stage results of the latest candle windows by their fingerprint.
+    "reserve" makes room for the windows a bot group analyses per tick on top of "size",
+    so they aren't evicted before the next tick.
+    """
+
+    def __init__(self, size: int = CACHE_SIZE):
+        self.base = self.size = size
+        self.windows: OrderedDict[bytes, dict] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def reserve(self, windows: int):
+        with self.lock:
+            self.size = self.base + windows if self.base else 0
+            while len(self.windows) > self.size:
+                self.windows.popitem(last=False)
+
+    def get(self, key: bytes) -> dict:
+        with self.lock:
+            if key in self.windows:
+                self.windows.move_to_end(key)
+                return self.windows[key]
+            values = self.windows[key] = {}
+            if len(self.windows) > self.size:
+                self.windows.popitem(last=False)
+            return values
+
+    def clear(self):
+        with self.lock:
+            self.windows.clear()
+
+
+window_cache = WindowCache()
+
+
+class Analysis:
+    """
+    Lazily computed stages of a candle window, each stage runs at most once per window.
+    Results of stages using the caller's trend detector or indicators aren't shared with other callers.
+    "values" are results computed already, e.g. by a panel of pairs.
+    """
+
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        detector: ta.TrendDetector | None = None,
+        values: dict | None = None,
+        indicators: incremental.Columns | None = None,
+    ):
+        self.df = df
+        self.detector = detector
+        self.indicators = indicators
+        self.values = window_cache.get(fingerprint(df))
+        self.values.update(values or {})
+        self.local = {}
+
+    def __getitem__(self, name: str):
+        if name == "df":
+            return self.df
+        if name == "detector":
+            return self.detector
+        if name in CANDLES:
+            return self.df[name].to_numpy()
+
+        values = self.local if self._is_local(name) else self.values
+        if name not in values and self.indicators and name in incremental.COLUMNS:
+            times = self.df.Date.values.view("i8")
+            bars = {x: self[x] for x in ("High", "Low", "Close")}
+            values.update(self.indicators.columns(times, bars))
+        if name not in values:
+            stage = STAGES[name]
+            results = stage.func(*[self[x] for x in stage.inputs])
+            if len(stage.outputs) == 1:
+                results = (results,)
+            values.update(zip(stage.outputs, results))
+        return copy.copy(values[name]) if name in MUTABLE else values[name]
+
+    def _is_local(self, name: str) -> bool:
+        if self.detector and _depends(name, "detector"):
+            return True
+        return bool(self.indicators) and any(
+            _depends(name, x) for x in incremental.COLUMNS
+        )
+
+
+def analyze(
+    df: pd.DataFrame,
+    columns: list[str],
+    detector: ta.TrendDetector | None = None,
+    values: dict | None = None,
+    indicators: incremental.Columns | None = None,
+) -> Analysis:
+    """Add the requested columns to the candles, only the stages they need are run."""
+    analysis = Analysis(df, detector, values, indicators)
+    names = [x for x in LAYOUT if x in columns]
+    names += [x for x in columns if x not in LAYOUT]
+    for name in names:
+        value = np.array(analysis[name])  # Frames don't share the results
+        if (position := LAYOUT.get(name)) is None:
+            df[name] = value
+        else:
+            df.insert(position, name, value, True)
+    return analysis
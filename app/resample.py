@@ -0,0 +1,154 @@
+import numpy as np
+import pandas as pd
+
+from . import enums
+
+# OANDA's default alignment of candles longer than an hour:
+# trading days start at 17:00 New York time and weeks on Friday at that time
+DAILY_ALIGNMENT = 17
+ALIGNMENT_TIMEZONE = "America/New_York"
+WEEKLY_ALIGNMENT = 4  # Monday is 0
+
+INTERVALS = {x.label: x.value for x in enums.Interval}  # Minutes by granularity
+FIELDS = ["time", "open", "high", "low", "close", "volume", "complete"]
+
+
+_offsets: dict[int, int] = {}  # By hour since the epoch
+
+
+def _utc_offsets(times: np.ndarray) -> np.ndarray:
+    """
+    Seconds the alignment timezone is ahead of UTC at the times.
+    Its offset only changes on the hour, so offsets are cached by the hour.
+    """
+    hours, inverse = np.unique(np.asarray(times) // 3600, return_inverse=True)
+    if missing := [x for x in hours.tolist() if x not in _offsets]:
+        utc = pd.to_datetime(np.array(missing) * 3600, unit="s", utc=True)
+        local = utc.tz_convert(ALIGNMENT_TIMEZONE).tz_localize(None)
+        _offsets.update(zip(missing, ((local.asi8 - utc.asi8) // 10**9).tolist()))
+    offsets = np.array([_offsets[x] for x in hours.tolist()], dtype=np.int64)
+    return offsets[inverse]
+
+
+def bucket_starts(times: np.ndarray, interval: int) -> np.ndarray:
+    """
+    Open time of the candle of the interval every time falls into, epoch seconds.
+    Up to an hour candles are aligned to the hour, longer ones to the trading day or week
+    in the alignment timezone, so they move with daylight saving time like OANDA's.
+    """
+    times = np.asarray(times, dtype=np.int64)
+    seconds = interval * 60
+    if interval <= enums.Interval.SIXTY_MIN:
+        return times // seconds * seconds
+
+    shift = DAILY_ALIGNMENT * 3600
+    local = times + _utc_offsets(times) - shift
+    if interval == enums.Interval.ONE_WEEK:
+        days = local // 86400  # Day 0 is Thursday
+        starts = (days - (days + 3 - WEEKLY_ALIGNMENT) % 7) * 86400
+    else:
+        starts = local // seconds * seconds
+
+    # Back to UTC with the offset at the start, it differs across a daylight saving change
+    starts, inverse = np.unique(starts + shift, return_inverse=True)
+    guess = starts - _utc_offsets(starts)
+    return (starts - _utc_offsets(guess))[inverse]
+
+
+def aggregate(candles: dict[str, np.ndarray], interval: int, base: int) -> dict:
+    """
+    Candles of the interval from consecutive candles of the shorter "base" interval.
+    The last one is complete once its last base candle is complete and closes the interval.
+    """
+    n = len(candles["time"])
+    if not n:
+        return {k: v[:0] for k, v in candles.items()}
+    keys = bucket_starts(candles["time"], interval)
+    starts = np.r_[0, np.flatnonzero(np.diff(keys)) + 1]
+    ends = np.r_[starts[1:], n] - 1
+
+    complete = np.ones(len(starts), dtype=bool)
+    last = candles["time"][ends[-1:]] + base * 60
+    complete[-1] = candles["complete"][ends[-1]] and (
+        bucket_starts(last, interval)[0] != keys[starts[-1]]
+    )
+    return {
+        "time": keys[starts].astype(np.float64),
+        "open": candles["open"][starts],
+        "high": np.maximum.reduceat(candles["high"], starts),
+        "low": np.minimum.reduceat(candles["low"], starts),
+        "close": candles["close"][ends],
+        "volume": np.add.reduceat(candles["volume"], starts),
+        "complete": complete,
+    }
+
+
+class Resampler:
+    """
+    Window of the latest candles of an instrument in a base interval,
+    candles of longer intervals are built from it once they're requested.
+    New base candles replace the ones from their first time on and longer candles
+    are rolled forward from the first one they touch instead of being rebuilt.
+    Candles of the first longer interval in the window are dropped unless it starts with it.
+    """
+
+    def __init__(self, base: int, size: int):
+        self.base = base
+        self.size = size  # Base candles to keep
+        self.window = {
+            k: np.empty(0, dtype=np.int64 if k == "volume" else float) for k in FIELDS
+        }
+        self.window["complete"] = self.window["complete"].astype(bool)
+        self.resampled: dict[int, dict[str, np.ndarray]] = {}
+
+    def __len__(self):
+        return len(self.window["time"])
+
+    def since(self, count: int) -> float | None:
+        """Time of the last complete base candle or None if the window has less than "count"."""
+        if len(self) < count:
+            return None
+        complete = np.flatnonzero(self.window["complete"])
+        return float(self.window["time"][complete[-1]]) if complete.size else None
+
+    def update(self, candles: dict[str, np.ndarray]):
+        """Add base candles, the window's candles from the same time on are replaced."""
+        if not len(candles["time"]):
+            return
+        first = candles["time"][0]
+        keep = np.searchsorted(self.window["time"], first)
+        self.window = {
+            k: np.concatenate([v[:keep], candles[k]])[-self.size :]
+            for k, v in self.window.items()
+        }
+        for interval in self.resampled:
+            self._roll(interval, first)
+
+    def _first(self, interval: int) -> float:
+        """Open time of the first candle of the interval the window has whole."""
+        start = self.window["time"][0]
+        key = bucket_starts(self.window["time"][:1], interval)[0]
+        return key if key == start else key + 1
+
+    def _roll(self, interval: int, first: float):
+        resampled = self.resampled[interval]
+        key = bucket_starts(np.array([first]), interval)[0]
+        i = np.searchsorted(self.window["time"], key)
+        keep = np.searchsorted(resampled["time"], key)
+        new = aggregate({k: v[i:] for k, v in self.window.items()}, interval, self.base)
+        cut = np.searchsorted(resampled["time"][:keep], self._first(interval))
+        self.resampled[interval] = {
+            k: np.concatenate([v[cut:keep], new[k]]) for k, v in resampled.items()
+        }
+
+    def get(self, interval: int, count: int) -> dict[str, np.ndarray]:
+        """Last "count" candles of the interval, fewer if the window doesn't cover them."""
+        if interval == self.base:
+            return {k: v[-count:] for k, v in self.window.items()}
+        if interval not in self.resampled:
+            candles = aggregate(self.window, interval, self.base)
+            if len(self):
+                cut = np.searchsorted(candles["time"], self._first(interval))
+                candles = {k: v[cut:] for k, v in candles.items()}
+            self.resampled[interval] = candles
+        return {k: v[-count:] for k, v in self.resampled[interval].items()}
@@ -0,0 +1,136 @@
+import json
+import threading
+import time
+from typing import NamedTuple
+
+from requests import RequestException, Session
+
+
+class Quote(NamedTuple):
+    instrument: str
+    time: float
+    bid_price: float
+    ask_price: float
+    tradeable: bool
+
+
+class QuoteBoard:
+    """
+    Latest quote per instrument.
+    The stream thread replaces whole immutable entries, so readers never need a lock.
+    """
+
+    def __init__(self, timeout: float = 10):
+        self.timeout = timeout
+        self.quotes: dict[str, Quote] = {}
+        self.confacs: dict[str, float] = {}
+        self.confacs_time = 0.0
+        self.heartbeat = 0.0
+
+    @property
+    def live(self) -> bool:
+        """Stream is alive if a price or heartbeat was received recently."""
+        return time.monotonic() - self.heartbeat < self.timeout
+
+    def get(self, instrument: str) -> Quote | None:
+        """Return latest quote of the instrument if the stream is alive."""
+        if self.live:
+            return self.quotes.get(instrument)
+        return None
+
+    def has(self, instruments: list[str]) -> bool:
+        return self.live and all(x in self.quotes for x in instruments)
+
+    def update(self, quote: Quote):
+        self.quotes[quote.instrument] = quote
+        self.heartbeat = time.monotonic()
+
+    def beat(self):
+        self.heartbeat = time.monotonic()
+
+    def set_confacs(self, confacs: dict[str, float]):
+        self.confacs = self.confacs | confacs
+        self.confacs_time = time.monotonic()
+
+    def confacs_age(self) -> float:
+        return time.monotonic() - self.confacs_time
+
+
+class PricingStream(threading.Thread):
+    """
+    Long-lived consumer of the pricing stream endpoint
+    https://developer.oanda.com/rest-live-v20/pricing-ep/
+    Feeds newline-delimited price messages into the board and reconnects
+    with an exponential backoff when the stream errors out or goes silent.
+    """
+
+    def __init__(
+        self,
+        api_account: str,
+        api_token: str,
+        stream_url: str,
+        instruments: list[str],
+        board: QuoteBoard,
+        max_backoff: float = 30,
+    ):
+        super().__init__(daemon=True, name="pricing-stream")
+        self.url = (
+            f"{stream_url}accounts/{api_account}/pricing/stream"
+            f"?instruments={",".join(instruments)}"
+        )
+        self.instruments = instruments
+        self.board = board
+        self.max_backoff = max_backoff
+        self.stopped = threading.Event()
+
+        self.session = Session()
+        self.session.headers.update(
+            {
+                "Authorization": f"Bearer {api_token}",
+                "Accept-Datetime-Format": "UNIX",
+            }
+        )
+
+    def stop(self):
+        self.stopped.set()
+
+    def run(self):
+        backoff = 1.0
+        while not self.stopped.is_set():
+            try:
+                with self.session.get(
+                    self.url,
+                    stream=True,
+                    timeout=(3, self.board.timeout),
+                ) as response:
+                    if response.status_code != 200:
+                        print(
+                            f"[-] OANDA-API pricing stream returned with error code '{response.status_code}'({response.reason})"
+                        )
+                    else:
+                        for line in response.iter_lines():
+                            if self.stopped.is_set():
+                                return
+                            if line:
+                                self.parse(line)
+                                backoff = 1.0
+            except RequestException:
+                print("[-] OANDA-API pricing stream disconnected")
+
+            self.stopped.wait(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    def parse(self, line: bytes):
+        msg = json.loads(line)
+        if msg["type"] == "PRICE":
+            self.board.update(
+                Quote(
+                    instrument=msg["instrument"],
+                    time=float(msg["time"]),
+                    bid_price=float(msg["bids"][0]["price"]),
+                    ask_price=float(msg["asks"][0]["price"]),
+                    tradeable=msg.get("tradeable", msg.get("status") == "tradeable"),
+                )
+            )
+        elif msg["type"] == "HEARTBEAT":
+            self.board.beat()
@@ -1,3 +1,8 @@
+import statistics
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+
 import numpy as np
 import pandas as pd
 
@@ -5,31 +10,61 @@ from .candles import *
 from .indicators import *
 
 
-def get_trend(df: pd.DataFrame):
+def get_body(df: pd.DataFrame) -> tuple[np.ndarray, np.ndarray]:
+    """Return maximum and minimum of the candle bodies."""
+    o, c = df.Open.to_numpy(), df.Close.to_numpy()
+    return np.fmax(o, c), np.fmin(o, c)
+
+
+def calc_swings(bmax: np.ndarray, bmin: np.ndarray) -> np.ndarray:
+    """
+    Price direction of candle bodies, 1-D or 2-D (pairs x time):
+    1 for a higher high, -1 for a lower low, 0 for neither.
+    If a body has both, the one that has the closest bar without it looking backwards is dropped,
+    bars before the previous body with both don't count.
+    """
+    h = np.zeros(bmax.shape, dtype=bool)
+    l = np.zeros(bmin.shape, dtype=bool)
+    h[..., 1:] = bmax[..., 1:] > bmax[..., :-1]
+    l[..., 1:] = bmin[..., 1:] < bmin[..., :-1]
+    both = h & l
+
+    n = np.broadcast_to(np.arange(h.shape[-1]), h.shape)
+    last_both = np.zeros(h.shape, dtype=int)
+    last_both[..., 1:] = np.maximum.accumulate(np.where(both, n, 0), axis=-1)[..., :-1]
+    zh = np.maximum.accumulate(np.where(h, 0, n), axis=-1)
+    zl = np.maximum.accumulate(np.where(l, 0, n), axis=-1)
+    zh = np.where(zh >= last_both, zh, 0)
+    zl = np.where(zl >= last_both, zl, 0)
+
+    side = h.astype(np.int8) - l.astype(np.int8)
+    side[both] = np.where(zh > zl, -1, 1)[both]
+    return side
+
+
+def get_trend(
+    df: pd.DataFrame,
+    body: tuple[np.ndarray, np.ndarray] | None = None,
+    swings: np.ndarray | None = None,
+):
     """
     Find important trend points.
     "H", "L": minor swings, highs and lows;
     "BP":  minor swing levels' values;
     "HH", "LL": higher highs and lower lows;
     "UpT", "DnT": trend break points
+    "body" is the result of "get_body" and "swings" of "calc_swings" if they're known already.
     """
 
     df.insert(5, "H", False, True)
     df.insert(5, "L", False, True)
 
     # Find price direction
-    df["Bmax"] = df[["Open", "Close"]].max(axis=1)
-    df["Bmin"] = df[["Open", "Close"]].min(axis=1)
-    delta = df[["Bmax", "Bmin"]].diff()
-    h = np.where([(delta.Bmax > 0)], 1, 0)[0]
-    l = np.where([(delta.Bmin < 0)], 1, 0)[0]
-
-    # If both are "1", zero the one that has has the closest "0" looking backwards.
-    n = np.arange(h.size)
-    idx = np.where(h * l == 1)[0]
-    idx2 = _clossest_zero(h, idx, n) > _clossest_zero(l, idx, n)
-    h[idx[idx2]] = 0
-    l[idx[~idx2]] = 0
+    df["Bmax"], df["Bmin"] = body or get_body(df)
+    if swings is None:
+        swings = calc_swings(df.Bmax.to_numpy(), df.Bmin.to_numpy())
+    h = (swings > 0).astype(int)
+    l = (swings < 0).astype(int)
 
     # Find highest/lowest peaks/valleys in clusters
     h2 = np.where([h == 1], df.Bmax, 0)[0]
@@ -100,52 +135,442 @@ def get_trend(df: pd.DataFrame):
     return df
 
 
-def get_value_zones(df: pd.DataFrame):
-    """Return DF with potential value zones."""
+class TrendDetector:
+    """
+    Streaming counterpart of `get_trend`, kept per pair and interval.
+    Swings of complete bars are detected once and kept as pivots, only the run of swings
+    that isn't closed by an opposite swing yet is re-evaluated together with the incomplete bar.
+    A sliding window's first swings differ from the ones seen since the detector was seeded,
+    so pivots are folded again from the window's swings until both start the same run.
+    Higher highs, lower lows and the trend point filters run on the window's pivots only.
+    Flags equal `get_trend` over the same window.
+    """
 
-    atr = df.ATR.mean() * 0.75  # Bandwidth of the zone
-    df2 = df[:-1]
-    df3 = df2[df2.UpT | df2.DnT]
+    def __init__(self, size=500):
+        self.size = size  # Bars of pivots to keep
+        self.n = 0  # Complete bars seen
+        self.time = None  # Time of the last complete bar
+        self.start = None  # Time of the first bar
+        self.prev = (np.nan, np.nan)  # Body max/min of the last complete bar
+        self.zero = [-1, -1]  # Last bar without a higher high/lower low
+        self.both = 0  # Last bar with both
+        self.run = (0, np.nan, [])  # Open run of swings: side, level, bars
+        self.pivots: list[tuple[int, int, float, bool]] = []  # Bar, side, BP, HH/LL
+        self.sides = array("b")  # Swings of the latest complete bars
 
-    # Add Fibonacci retracement levels
-    # df2 = pd.concat([df2.BP[:-1], pd.DataFrame(get_fibonacci(df), columns=["BP"])])
-
-    dfz = pd.DataFrame(
-        {
-            "Top": map(lambda x: x + atr / 2, df3.BP),  # type: ignore
-            "Bottom": map(lambda x: x - atr / 2, df3.BP),  # type: ignore
-        }
-    ).sort_values(by=["Bottom", "Top"])
+    def _swing(
+        self, i: int, bmax: float, bmin: float, side: int | None = None
+    ) -> tuple[int, int]:
+        """
+        Return sides of the bar's swing (1 high, -1 low, 0 none) and of the closest zeros.
+        "side" is the swing of the bar if it's known already.
+        """
+        h = int(bmax > self.prev[0])
+        l = int(bmin < self.prev[1])
+        if side is not None:
+            return side, h * 2 + l
+        side = h - l
+        if h and l:
+            zh = self.zero[0] if self.zero[0] >= self.both else 0
+            zl = self.zero[1] if self.zero[1] >= self.both else 0
+            side = -1 if zh > zl else 1
+        return side, h * 2 + l
 
-    # Merge overlapping zones
-    dfz = _merge_overlaps(dfz, atr)
+    def _fold(self, run: tuple, i: int, side: int, level: float, pivots: list):
+        """Add the swing to the run, return the new run, closed pivots are appended."""
+        if not side:
+            return run
+        run_side, run_level, bars = run
+        if side == run_side:
+            if level == run_level:
+                return run_side, run_level, bars + [i]
+            if (level > run_level) == (side > 0):
+                return side, level, [i]
+            return run
+        self._close(run, pivots)
+        return side, level, [i]
 
-    return dfz
+    def _close(self, run: tuple, pivots: list):
+        side, level, bars = run
+        for i in bars:
+            bp2 = pivots[-2][2] if len(pivots) > 1 else np.nan
+            pivots.append((i, side, level, bool(side * (level - bp2) > 0)))
 
+    def update(self, time: int, bmax: float, bmin: float, side: int | None = None):
+        """Add a complete bar, "side" is its swing if it's known already."""
+        i = self.n
+        side, hl = self._swing(i, bmax, bmin, side)
+        if hl == 3:
+            self.both = i
+        if not hl & 2:
+            self.zero[0] = i
+        if not hl & 1:
+            self.zero[1] = i
+        self.prev = (bmax, bmin)
+        self.run = self._fold(
+            self.run, i, side, bmax if side > 0 else bmin, self.pivots
+        )
+        self.sides.append(side)
+        self.n += 1
+        self.time = time
+        if self.start is None:
+            self.start = time
 
-def _clossest_zero(arr: np.ndarray, arr_idx: np.ndarray, n: np.ndarray) -> np.ndarray:
-    """Return an array where each value corresponds to the index of the closest 0 in the "arr" looking back relative to "peaks" in "arr_idx"."""
-    return np.maximum.reduceat((1 - arr) * n, np.r_[0, arr_idx])[:-1]
+        if len(self.pivots) > 64 and self.pivots[32][0] < self.n - self.size:
+            del self.pivots[:32]
+        if len(self.sides) > 2 * self.size:
+            del self.sides[: -self.size]
 
+    def reset(self):
+        self.__init__(self.size)
 
-def _merge_overlaps(dfz: pd.DataFrame, atr: float):
-    """Merge overlapping value zones."""
-    dfz = (
-        dfz.assign(
-            max_Top=lambda d: d["Top"].cummax(),
-            group=lambda d: d["Bottom"].ge(d["max_Top"].shift(fill_value=0)).cumsum(),
-        )
-        .groupby("group", as_index=False)
-        .agg(
-            {
-                "Top": "mean",
-                "Bottom": "mean",
-            }
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the pivots and the open run."""
+        pivot = sys.getsizeof((0, 0, 0.0, False)) + 2 * sys.getsizeof(0.0)
+        return (
+            sys.getsizeof(self.pivots)
+            + len(self.pivots) * pivot
+            + sys.getsizeof(self.run[2])
+            + len(self.run[2]) * sys.getsizeof(0)
+            + sys.getsizeof(self.sides)
         )
-        .drop("group", axis=1)
-    )  # type: ignore
 
-    dfz.Top = dfz.Top - (dfz.Top - dfz.Bottom) / 2 + atr / 2
-    dfz.Bottom = dfz.Top - atr
+    def _sync(
+        self,
+        times: np.ndarray,
+        bmax: np.ndarray,
+        bmin: np.ndarray,
+        complete: int,
+        swings: np.ndarray | None = None,
+    ):
+        """
+        Add complete bars the detector hasn't seen, start over if they don't follow.
+        "swings" of the window are only used when starting over,
+        later bars depend on swings before the window.
+        """
+        if (
+            self.time is not None
+            and complete
+            and times[0] >= self.start
+            and len(times) <= self.size
+        ):
+            k = np.searchsorted(times[:complete], self.time)
+            if k < complete and times[k] == self.time:
+                for j in range(k + 1, complete):
+                    self.update(times[j], bmax[j], bmin[j])
+                return
+        self.reset()
+        self.size = max(self.size, len(times))
+        sides = [None] * complete if swings is None else swings[:complete].tolist()
+        for j in range(complete):
+            self.update(times[j], bmax[j], bmin[j], sides[j])
+
+    def _realign(self, swings: np.ndarray, complete: int) -> int:
+        """
+        First bar of the window from which its complete bars fold into the same runs as the
+        detector's, "complete" if there is none. Swings are equal from it on and it closes a run.
+        """
+        seen = np.frombuffer(self.sides, dtype=np.int8)[len(self.sides) - complete :]
+        if len(seen) < complete:
+            return complete
+        differ = np.flatnonzero(swings[:complete] != seen)
+        start = differ[-1] + 1 if differ.size else 0
+        bars = np.flatnonzero(swings[start:complete]) + start
+        sides = swings[bars]
+        changes = bars[1:][sides[1:] != sides[:-1]]
+        return int(changes[0]) if changes.size else complete
+
+    def _window_pivots(
+        self,
+        bmax: np.ndarray,
+        bmin: np.ndarray,
+        complete: int,
+        swings: np.ndarray,
+    ) -> list:
+        """
+        Pivots of the window including the open run and incomplete bars, bars are rows.
+        Bars before the window's runs realign with the detector's are folded again.
+        """
+        first = self.n - complete
+        start = self._realign(swings, complete)
+        pivots = []
+        run = (0, np.nan, [])
+        for j in range(start):
+            side = int(swings[j])
+            run = self._fold(run, j, side, bmax[j] if side > 0 else bmin[j], pivots)
+        if start < complete:
+            self._close(run, pivots)
+            k = bisect_left(self.pivots, first + start, key=lambda x: x[0])
+            pivots += [(i - first, *x) for i, *x in self.pivots[k:]]
+            side, level, bars = self.run
+            run = side, level, [i - first for i in bars]
+        for j in range(complete, len(bmax)):
+            side = int(swings[j])
+            run = self._fold(run, j, side, bmax[j] if side > 0 else bmin[j], pivots)
+        self._close(run, pivots)
+        return pivots
+
+    def detect(
+        self,
+        times: np.ndarray,
+        bmax: np.ndarray,
+        bmin: np.ndarray,
+        complete: int | None = None,
+        swings: np.ndarray | None = None,
+    ) -> dict[str, np.ndarray]:
+        """
+        Columns of `get_trend` but "Bmax" and "Bmin" for the window of candle bodies.
+        "times" are nanoseconds, first "complete" bars are complete, by default all but the last one.
+        "swings" are the result of "calc_swings" if it's known already.
+        """
+        n = len(times)
+        if complete is None:
+            complete = n - 1
+        if swings is None:
+            swings = calc_swings(bmax, bmin)
+        self._sync(times, bmax, bmin, complete, swings)
+        pivots = self._window_pivots(bmax, bmin, complete, swings)
+
+        h = np.zeros(n, dtype=bool)
+        l = np.zeros(n, dtype=bool)
+        bp = np.full(n, np.nan)
+        hh = np.zeros(n, dtype=bool)
+        ll = np.zeros(n, dtype=bool)
+        points = []  # Trend points: row, side, BP
+        for k, (j, side, level, _) in enumerate(pivots):
+            (h if side > 0 else l)[j] = True
+            bp[j] = level
+            # Higher highs and lower lows of the window, its first pivots have none before
+            if k > 1 and side * (level - pivots[k - 2][2]) > 0:
+                (hh if side > 0 else ll)[j] = True
+                points.append((j, side, level))
+        upt = np.zeros(n, dtype=bool)
+        dnt = np.zeros(n, dtype=bool)
+        for j, side in _filter_trend_points(points):
+            (upt if side > 0 else dnt)[j] = True
+        return {"H": h, "L": l, "BP": bp, "UpT": upt, "DnT": dnt, "HH": hh, "LL": ll}
+
+    def apply(
+        self,
+        df: pd.DataFrame,
+        complete: int | None = None,
+        body: tuple[np.ndarray, np.ndarray] | None = None,
+        swings: np.ndarray | None = None,
+    ) -> pd.DataFrame:
+        """
+        Add the columns of `get_trend` to the window of candles, see "detect".
+        "body" is the result of "get_body" if it's known already.
+        """
+        bmax, bmin = body or get_body(df)
+        flags = self.detect(df.Date.values.view("i8"), bmax, bmin, complete, swings)
+        df.insert(5, "H", flags["H"], True)
+        df.insert(5, "L", flags["L"], True)
+        df["Bmax"] = bmax
+        df["Bmin"] = bmin
+        df["BP"] = flags["BP"]
+        df.insert(7, "UpT", flags["UpT"], True)
+        df.insert(7, "DnT", flags["DnT"], True)
+        df.insert(7, "HH", flags["HH"], True)
+        df.insert(7, "LL", flags["LL"], True)
+        return df
+
+
+def _runs(sides: list) -> list[list[int]]:
+    """Split positions into runs of equal consecutive values."""
+    runs = []
+    for k, side in enumerate(sides):
+        if k and side == sides[k - 1]:
+            runs[-1].append(k)
+        else:
+            runs.append([k])
+    return runs
+
+
+def _filter_trend_points(points: list[tuple[int, int, float]]) -> list[tuple[int, int]]:
+    """The steps of `get_trend` after higher highs and lower lows, on its trend points."""
+    # Trend change points
+    runs = _runs([side for _, side, _ in points])
+    tops = {max(points[k][2] for k in run) for run in runs}
+    bottoms = {min(points[k][2] for k in run) for run in runs}
+    points = [x for x in points if x[2] in (tops if x[1] > 0 else bottoms)]
+
+    # Redundant trend points
+    points = [points[run[-1]] for run in _runs([side for _, side, _ in points])]
+
+    # Major swing levels
+    major = [
+        x
+        for k, x in enumerate(points)
+        if k > 1 and x[1] * (x[2] - points[k - 2][2]) > 0
+    ]
+    if major:
+        rising = [False] + [major[k][2] > major[k - 1][2] for k in range(1, len(major))]
+        keep = {major[run[-1]] for run in _runs(rising)} | {major[0]}
+        points = [x for x in major if x in keep]
+    else:
+        points = []
+
+    # Swings height
+    if len(points) > 1:
+        heights = [abs(points[k][2] - points[k - 1][2]) for k in range(1, len(points))]
+        median = statistics.median(heights)
+        top = max(x[2] for x in points)
+        bottom = min(x[2] for x in points)
+        points = points[:1] + [
+            x
+            for x, height in zip(points[1:], heights)
+            if not (height < median and x[2] != top and x[2] != bottom)
+        ]
+
+    return [(j, side) for j, side, _ in points]
+
+
+class ValueZoneIndex:
+    """
+    Sorted, non-overlapping value zones of equal width around break points.
+    Break points closer than the width to their neighbours share a zone centred at their mean.
+    Zones are kept as sorted "bottoms" and "tops" arrays, lookups bisect them.
+    """
+
+    def __init__(self, width: float, points=()):
+        self.width = float(width)
+        self.bottoms = array("d")
+        self.tops = array("d")
+        self._lo = array("d")  # Lowest break point of the zone
+        self._hi = array("d")  # Highest break point of the zone
+        self._sum = array("d")
+        self._count = array("l")
+
+        c = np.sort(np.asarray(points, dtype=float))
+        c = c[~np.isnan(c)]
+        if c.size:
+            half = width / 2
+            starts = np.r_[0, np.flatnonzero(c[1:] - half >= c[:-1] + half) + 1]
+            ends = np.r_[starts[1:], c.size]
+            self._lo.extend(c[starts])
+            self._hi.extend(c[ends - 1])
+            self._sum.extend(np.add.reduceat(c, starts))
+            self._count.extend((ends - starts).tolist())
+            self.tops.extend(np.asarray(self._sum) / (ends - starts) + half)
+            self.bottoms.extend(np.asarray(self.tops) - width)
+
+    def __len__(self):
+        return len(self.tops)
+
+    def __iter__(self):
+        """Zones as (bottom, top) from the lowest."""
+        return zip(self.bottoms, self.tops)
+
+    def __copy__(self):
+        other = ValueZoneIndex(self.width)
+        for name in ["bottoms", "tops", "_lo", "_hi", "_sum", "_count"]:
+            setattr(
+                other, name, array(getattr(self, name).typecode, getattr(self, name))
+            )
+        return other
+
+    @property
+    def nbytes(self) -> int:
+        arrays = [self.bottoms, self.tops, self._lo, self._hi, self._sum, self._count]
+        return sum(x.itemsize * len(x) for x in arrays)
+
+    def _zone(self, k: int) -> tuple[float, float]:
+        return self.bottoms[k], self.tops[k]
+
+    def contains(self, price: float) -> tuple[float, float] | None:
+        """Return the highest zone containing the price."""
+        k = bisect_right(self.bottoms, price) - 1
+        if k >= 0 and self.tops[k] >= price:
+            return self._zone(k)
+        return None
+
+    def above(self, price: float) -> tuple[float, float] | None:
+        """Return the nearest zone above the price."""
+        k = bisect_right(self.bottoms, price)
+        return self._zone(k) if k < len(self) else None
+
+    def below(self, price: float) -> tuple[float, float] | None:
+        """Return the nearest zone below the price."""
+        k = bisect_left(self.tops, price) - 1
+        return self._zone(k) if k >= 0 else None
+
+    def insert(self, point: float):
+        """Add a break point, merging the zones it overlaps."""
+        if np.isnan(point):
+            return
+        half = self.width / 2
+        k = bisect_right(self._lo, point)
+        left = k > 0 and point - half < self._hi[k - 1] + half
+        right = k < len(self) and self._lo[k] - half < point + half
+
+        if left and right:
+            self._lo[k] = self._lo[k - 1]
+            self._sum[k] += self._sum[k - 1]
+            self._count[k] += self._count[k - 1]
+            for x in [
+                self._lo,
+                self._hi,
+                self._sum,
+                self._count,
+                self.bottoms,
+                self.tops,
+            ]:
+                del x[k - 1]
+            k -= 1
+        elif left:
+            k -= 1
+        elif not right:
+            for x in [self._lo, self._hi, self._sum, self.bottoms, self.tops]:
+                x.insert(k, point)
+            self._sum[k] = 0.0
+            self._count.insert(k, 0)
+
+        self._lo[k] = min(self._lo[k], point)
+        self._hi[k] = max(self._hi[k], point)
+        self._sum[k] += point
+        self._count[k] += 1
+        self.tops[k] = self._sum[k] / self._count[k] + half
+        self.bottoms[k] = self.tops[k] - self.width
+
+    def to_dict(self) -> dict:
+        return {
+            "width": self.width,
+            "zones": [
+                [self._lo[k], self._hi[k], self._sum[k], self._count[k]]
+                for k in range(len(self))
+            ],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        self = cls(data["width"])
+        half = self.width / 2
+        for lo, hi, total, count in data["zones"]:
+            self._lo.append(lo)
+            self._hi.append(hi)
+            self._sum.append(total)
+            self._count.append(count)
+            self.tops.append(total / count + half)
+            self.bottoms.append(self.tops[-1] - self.width)
+        return self
+
+
+def get_value_zones(df: pd.DataFrame) -> ValueZoneIndex:
+    """Return potential value zones around the trend points."""
+
+    # Add Fibonacci retracement levels
+    # df2 = pd.concat([df2.BP[:-1], pd.DataFrame(get_fibonacci(df), columns=["BP"])])
+
+    return value_zones(
+        df.ATR.to_numpy(), df.UpT.to_numpy(), df.DnT.to_numpy(), df.BP.to_numpy()
+    )
+
 
-    return dfz
+def value_zones(
+    atr: np.ndarray, upt: np.ndarray, dnt: np.ndarray, bp: np.ndarray
+) -> ValueZoneIndex:
+    """Value zones around the trend points of all but the last candle."""
+    width = np.nanmean(atr) * 0.75  # Bandwidth of the zone
+    points = (upt | dnt)[:-1]
+    return ValueZoneIndex(width, bp[:-1][points])
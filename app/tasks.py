@@ -1,3 +1,6 @@
+from django.conf import settings
+
+from . import metrics
 from .celery import app
 from .models import BotGroup
 
@@ -6,4 +9,12 @@ bg = BotGroup.objects.get(id=1)
 
 @app.task
 def run_bots():
+    # Served from the process that runs the bots, a prefork pool's children start on first use
+    if settings.OANDA_METRICS_PORT:
+        metrics.serve(settings.OANDA_METRICS_PORT, settings.OANDA_METRICS_HOST)
     bg.run()
+
+
+@app.task
+def refresh_instruments():
+    BotGroup.import_instruments()
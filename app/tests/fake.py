@@ -0,0 +1,40 @@
+from unittest import mock
+
+from .. import api, fakeoanda
+from ..metrics import Registry
+from ..oanda import Endpoint
+from ..throttle import CircuitBreaker, TokenBucket
+
+
+class FakeServerMixin:
+    """Runs the fake OANDA server for the test case, "api" requests go to it."""
+
+    pairs = 3
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = fakeoanda.start(pairs=cls.pairs)
+        cls.instruments = list(cls.server.fake.market.instruments)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        self.endpoint = self.get_endpoint()
+        for name, value in [("api", self.endpoint), ("RESAMPLE_BASE", None)]:
+            patcher = mock.patch.object(api, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def get_endpoint(self, **kwargs) -> Endpoint:
+        kwargs = {
+            "limiters": {"default": TokenBucket(1000)},
+            "breaker": CircuitBreaker(),
+            "metrics": Registry(),
+        } | kwargs
+        return Endpoint("101-A", "token", self.server.url, **kwargs)
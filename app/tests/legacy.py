@@ -0,0 +1,308 @@
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from .. import candles, enums, indicators, ta
+
+
+def prep_data(candles: list[dict]) -> pd.DataFrame:
+    """Candle decoding as it was done before columnar arrays, kept as a baseline."""
+    df = pd.DataFrame([{**x, **x["mid"]} for x in candles])
+    df.drop(df.columns[[0, 3]], axis=1, inplace=True)  # type: ignore
+    df.rename(
+        columns={
+            "time": "Date",
+            "o": "Open",
+            "h": "High",
+            "l": "Low",
+            "c": "Close",
+            "volume": "Volume",
+        },
+        inplace=True,
+    )
+    df = df.astype(
+        {
+            "Date": "float",
+            "Open": "float",
+            "High": "float",
+            "Low": "float",
+            "Close": "float",
+            "Volume": "int",
+        }
+    )
+    df["Date"] = pd.to_datetime(df["Date"], unit="s", utc=True)
+    df["Date"] = df["Date"].dt.tz_convert(settings.TIME_ZONE)
+    return df
+
+
+def get_rsi(df: pd.DataFrame, period=14):
+    """`indicators.get_rsi` as it was before NumPy arrays, kept as a baseline."""
+
+    delta = df["Close"].diff().dropna()
+    u = delta * 0
+    d = u.copy()
+    u[delta > 0] = delta[delta > 0]  # type: ignore
+    d[delta < 0] = -delta[delta < 0]  # type: ignore
+    u[u.index[period - 1]] = np.mean(u[:period])
+    u = u.drop(u.index[: (period - 1)])
+    d[d.index[period - 1]] = np.mean(d[:period])
+    d = d.drop(d.index[: (period - 1)])
+    rs = (
+        pd.DataFrame.ewm(u, com=period - 1, adjust=False).mean()  # type: ignore
+        / pd.DataFrame.ewm(d, com=period - 1, adjust=False).mean()  # type: ignore
+    )
+    df["RSI"] = 100 - 100 / (1 + rs)
+    return df
+
+
+def get_stochastic_oscillator(df: pd.DataFrame, period=14):
+    """`indicators.get_stochastic_oscillator` before NumPy arrays, kept as a baseline."""
+
+    df2 = df.copy()
+    df2["L14"] = df2["Low"].rolling(period).min()
+    df2["H14"] = df2["High"].rolling(period).max()
+    df2["%K"] = 100 * ((df2["Close"] - df2["L14"]) / (df2["H14"] - df2["L14"]))
+    df2["%D"] = df2["%K"].rolling(3).mean()
+
+    df2["Sell Entry"] = (
+        (df2["%K"] < df2["%D"]) & (df2["%K"].shift(1) > df2["%D"].shift(1))
+    ) & (df2["%D"] > 80)
+    df2["Sell Exit"] = (df2["%K"] > df2["%D"]) & (
+        df2["%K"].shift(1) < df2["%D"].shift(1)
+    )
+    df2["Short"] = np.nan
+    df2.loc[df2["Sell Entry"], "Short"] = -1
+    df2.loc[df2["Sell Exit"], "Short"] = 0
+    df2.loc[0, "Short"] = 0
+    df2["Short"] = df2["Short"].ffill()
+
+    df2["Buy Entry"] = (
+        (df2["%K"] > df2["%D"]) & (df2["%K"].shift(1) < df2["%D"].shift(1))
+    ) & (df2["%D"] < 20)
+    df2["Buy Exit"] = (df2["%K"] < df2["%D"]) & (
+        df2["%K"].shift(1) > df2["%D"].shift(1)
+    )
+    df2["Long"] = np.nan
+    df2.loc[df2["Buy Entry"], "Long"] = 1
+    df2.loc[df2["Buy Exit"], "Long"] = 0
+    df2.loc[0, "Long"] = 0
+    df2["Long"] = df2["Long"].ffill()
+
+    df["SO"] = df2["Long"] + df2["Short"]
+    return df
+
+
+def get_elliott(df: pd.DataFrame):
+    """`indicators.get_elliott` before the single pass, kept as a baseline."""
+
+    df.insert(9, "Wave", 0, True)
+
+    # Get waves "1"
+    df2 = df[df.HH | df.LL]
+    df.loc[df2[df2.WL > df2.ATR].index, "Wave"] = 1  # type: ignore
+
+    # Get waves "2"
+    df2 = df[df.HH | df.LL]
+    df3 = df2[
+        (df2.Wave.shift() == 1)
+        & (
+            (df2.LL & (df2.BP > df2.BP.shift(2)))
+            | (df2.HH & (df2.BP < df2.BP.shift(2)))
+        )
+    ]
+    df.loc[df3.index, "Wave"] = 2  # type: ignore
+
+    # Get waves "3"
+    df2 = df[df.HH | df.LL]
+    try:
+        df3 = df2[
+            (df2.Wave.shift() == 2)
+            & ((df2.WL > df2.WL.shift(2)) | (df2.WL > df2.WL.shift(-2)))
+        ]
+        df.loc[df3.index, "Wave"] = 3  # type: ignore
+    except IndexError:
+        df3 = df2[(df2.Wave.shift() == 2) & (df2.WL > df2.WL.shift(2))]
+        df.loc[df3.index, "Wave"] = 3  # type: ignore
+
+    # Get waves "4"
+    df2 = df[df.HH | df.LL]
+    df3 = df2[
+        (df2.Wave.shift() == 3)
+        & (
+            (df2.LL & (df2.BP > df2.BP.shift(3)))
+            | (df2.HH & (df2.BP < df2.BP.shift(3)))
+        )
+    ]
+    df.loc[df3.index, "Wave"] = 4  # type: ignore
+
+    # Get waves "5"
+    df2 = df[df.HH | df.LL]
+    df3 = df2[
+        (df2.Wave.shift() == 4)
+        & (
+            (df2.HH & (df2.BP > df2.BP.shift(2)))
+            | (df2.LL & (df2.BP < df2.BP.shift(2)))
+        )
+    ]
+    df.loc[df3.index, "Wave"] = 5  # type: ignore
+
+    n = 5
+    while not df3.empty:  # type: ignore
+        df2 = df[df.HH | df.LL]
+        df3 = df2[
+            (df2.Wave.shift() == n)
+            & (
+                (df2.LL & (df2.BP > df2.BP.shift(2)))
+                | (df2.HH & (df2.BP < df2.BP.shift(2)))
+            )
+        ]
+        df.loc[df3.index, "Wave"] = n + 1  # type: ignore
+
+        df2 = df[df.HH | df.LL]
+        df3 = df2[(df2.Wave.shift() == n + 1)]
+        df.loc[df3.index, "Wave"] = n + 2  # type: ignore
+
+        n += 2
+
+    return df
+
+
+def random_swings(n: int, seed: int = 0) -> pd.DataFrame:
+    """Random swings for "get_elliott", dense enough for high wave numbers."""
+    rng = np.random.default_rng(seed)
+    side = rng.integers(0, 3, n)
+    df = pd.DataFrame(np.zeros((n, 9)), columns=[f"c{i}" for i in range(9)])
+    df["HH"] = side == 1
+    df["LL"] = side == 2
+    df["BP"] = np.where(side > 0, rng.normal(0, 1, n), np.nan)
+    df["WL"] = np.where(rng.random(n) < 0.8, rng.random(n), np.nan)
+    df["ATR"] = rng.random(n) * 0.1
+    return df
+
+
+def get_value_zones(df: pd.DataFrame):
+    """`ta.get_value_zones` as it was before `ta.ValueZoneIndex`, kept as a baseline."""
+
+    atr = df.ATR.mean() * 0.75  # Bandwidth of the zone
+    df2 = df[:-1]
+    df3 = df2[df2.UpT | df2.DnT]
+
+    # Add Fibonacci retracement levels
+    # df2 = pd.concat([df2.BP[:-1], pd.DataFrame(get_fibonacci(df), columns=["BP"])])
+
+    dfz = pd.DataFrame(
+        {
+            "Top": map(lambda x: x + atr / 2, df3.BP),  # type: ignore
+            "Bottom": map(lambda x: x - atr / 2, df3.BP),  # type: ignore
+        }
+    ).sort_values(by=["Bottom", "Top"])
+
+    # Merge overlapping zones
+    dfz = merge_overlaps(dfz, atr)
+
+    return dfz
+
+
+def merge_overlaps(dfz: pd.DataFrame, atr: float):
+    """Merge overlapping value zones."""
+    dfz = (
+        dfz.assign(
+            max_Top=lambda d: d["Top"].cummax(),
+            group=lambda d: d["Bottom"].ge(d["max_Top"].shift(fill_value=0)).cumsum(),
+        )
+        .groupby("group", as_index=False)
+        .agg(
+            {
+                "Top": "mean",
+                "Bottom": "mean",
+            }
+        )
+        .drop("group", axis=1)
+    )  # type: ignore
+
+    dfz.Top = dfz.Top - (dfz.Top - dfz.Bottom) / 2 + atr / 2
+    dfz.Bottom = dfz.Top - atr
+
+    return dfz
+
+
+def get_ohlc_analysis(df: pd.DataFrame) -> dict:
+    """Analysis as it was before the pipeline, every stage runs on every call."""
+    df = indicators.get_ema(df)
+    df = indicators.get_atr(df)
+    df = ta.get_trend(df)
+    return {"df": df, "dfz": ta.get_value_zones(df)}
+
+
+def calc_swings(bmax: np.ndarray, bmin: np.ndarray) -> np.ndarray:
+    """Price direction as "get_trend" found it before "calc_swings"."""
+    delta = pd.DataFrame({"Bmax": bmax, "Bmin": bmin}).diff()
+    h = np.where([delta.Bmax > 0], 1, 0)[0]
+    l = np.where([delta.Bmin < 0], 1, 0)[0]
+    n = np.arange(h.size)
+    idx = np.where(h * l == 1)[0]
+    zh = np.maximum.reduceat((1 - h) * n, np.r_[0, idx])[:-1]
+    zl = np.maximum.reduceat((1 - l) * n, np.r_[0, idx])[:-1]
+    h[idx[zh > zl]] = 0
+    l[idx[~(zh > zl)]] = 0
+    return h - l
+
+
+def bucket_starts(times: np.ndarray, minutes: int) -> np.ndarray:
+    """Candle open times by flooring wall times in New York with pandas."""
+    times = times.astype(np.int64)
+    if minutes <= 60:
+        return times // (minutes * 60) * (minutes * 60)
+    ny = "America/New_York"
+    wall = pd.to_datetime(times, unit="s", utc=True).tz_convert(ny).tz_localize(None)
+    wall -= pd.Timedelta(hours=17)
+    if minutes == enums.Interval.ONE_WEEK:
+        day = wall.normalize()
+        key = day - pd.to_timedelta((day.weekday - 4) % 7, unit="D")
+    else:
+        key = wall.floor(f"{minutes}min")
+    key = (key + pd.Timedelta(hours=17)).tz_localize(ny)
+    return key.tz_convert("UTC").asi8 // 10**9
+
+
+def aggregate(candles: dict, minutes: int) -> pd.DataFrame:
+    df = pd.DataFrame(candles)
+    df["key"] = bucket_starts(candles["time"], minutes).astype(float)
+    g = df.groupby("key", sort=True)
+    return pd.DataFrame(
+        {
+            "time": g.key.first(),
+            "open": g.open.first(),
+            "high": g.high.max(),
+            "low": g.low.min(),
+            "close": g.close.last(),
+            "volume": g.volume.sum(),
+        }
+    ).reset_index(drop=True)
+
+
+def candle_analysis(df: pd.DataFrame) -> tuple[int, ...]:
+    """
+    Patterns of the last candle as the single-bar functions found them, kept as a baseline.
+    They read the prices with "df.iloc[-2, 1:5]", which is Date, Open, High and Low,
+    here they're read by name as "calc_candle_patterns" does.
+    """
+    o1, h1, l1, c1 = df[candles.OHLC].iloc[-2].to_numpy()
+    o2, h2, l2, c2 = df[candles.OHLC].iloc[-1].to_numpy()
+    breakout = 2 if c2 == h2 and c2 > h1 else 1 if c2 == l2 and c2 < l1 else 0
+    if c2 > o2:
+        engulf = 2 if (c2 - o2) > abs(o1 - c1) else 0
+        closed = 2 if c2 > h1 else 0
+    elif c2 < o2:
+        engulf = 1 if (o2 - c2) > abs(o1 - c1) else 0
+        closed = 1 if c2 < l1 else 0
+    else:
+        engulf = closed = 0
+
+    fri382 = h2 - ((h2 - l2) * 0.382)
+    if o2 > fri382 and c2 > fri382:
+        hammer = 2
+    else:
+        fri382 = l2 + ((h2 - l2) * 0.382)
+        hammer = 1 if o2 < fri382 and c2 < fri382 else 0
+    return breakout, engulf, closed, hammer
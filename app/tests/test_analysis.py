@@ -0,0 +1,336 @@
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase
+
+from .. import (
+    benchmarks,
+    candles,
+    enums,
+    incremental,
+    indicators,
+    panel,
+    pipeline,
+    resample,
+    ta,
+)
+from ..oanda import decode_candles, loads
+from ..utils import get_ohlc_analysis, prep_data
+from . import legacy
+
+TREND = ["H", "L", "BP", "UpT", "DnT", "HH", "LL"]
+
+
+def market_frame(n: int, seed: int = 0, decimals: int = 5) -> pd.DataFrame:
+    """Candles of "benchmarks.market_candles", fewer decimals make ties more likely."""
+    candles = benchmarks.market_candles(n, seed=seed)
+    for k in ["open", "high", "low", "close"]:
+        candles[k] = np.round(candles[k], decimals)
+    return prep_data({"ohlc": candles})["df"]
+
+
+class DecodeTests(SimpleTestCase):
+    def test_columnar_matches_legacy(self):
+        candles = loads(benchmarks.candles_payload(300))["candles"]
+        pd.testing.assert_frame_equal(
+            prep_data({"ohlc": decode_candles(candles)})["df"],
+            legacy.prep_data(candles),
+        )
+
+
+class IncrementalTests(SimpleTestCase):
+    def test_updates_match_batch(self):
+        n = 300
+        df = benchmarks.ohlc_frame(n)
+        batch = benchmarks._batch_indicators(df)
+
+        ind = benchmarks._incremental_indicators()
+        rows = []
+        for i, (high, low, close) in enumerate(zip(df.High, df.Low, df.Close)):
+            if i == n // 2:  # Across a serialization round trip
+                ind = incremental.loads(incremental.dumps(ind))
+            rows.append(benchmarks._update(ind, high, low, close))
+        streamed = pd.DataFrame(rows)
+        for column in streamed:
+            np.testing.assert_allclose(
+                streamed[column], batch[column], rtol=1e-9, atol=1e-12
+            )
+
+    def test_incomplete_subclass(self):
+        class Indicator(incremental.Indicator):
+            pass
+
+        with self.assertRaises(TypeError):
+            Indicator()
+
+    def assertColumnsClose(self, columns: dict, df: pd.DataFrame):
+        """Columns match the batch functions over "df", the window may start later."""
+        true_range = indicators.calc_true_range(
+            df.High.values, df.Low.values, df.Close.shift().values
+        )
+        batch = {
+            "MA": indicators.calc_ema(df.Close.values),
+            "ATR": indicators.calc_atr(true_range),
+            "RSI": indicators.calc_rsi(df.Close.values),
+        }
+        for name, values in batch.items():
+            np.testing.assert_allclose(
+                columns[name],
+                values[len(df) - len(columns[name]) :],
+                rtol=1e-9,
+                err_msg=name,
+            )
+
+    def test_columns_growing_window(self):
+        df = benchmarks.ohlc_frame(400)
+        state = incremental.Columns(size=400)
+        for end in range(100, 401, 20):
+            window = df.iloc[:end]
+            self.assertColumnsClose(analyze(window, state), window)
+
+    def test_columns_sliding_window(self):
+        df = benchmarks.ohlc_frame(300)
+        state = incremental.Columns(size=150)
+        for start in range(0, 150, 3):
+            window = df.iloc[start : start + 150]
+            columns = analyze(window, state)
+            with self.subTest(start=start):
+                # Indicators continue from the first window instead of starting over
+                self.assertColumnsClose(columns, df.iloc[: start + 150])
+                self.assertEqual(len(columns["MA"]), len(window))
+
+    def test_columns_skipping_bars(self):
+        df = benchmarks.ohlc_frame(400)
+        state = incremental.Columns(size=100)
+        for start in range(0, 300, 120):
+            window = df.iloc[start : start + 100]
+            self.assertColumnsClose(analyze(window, state), window)
+
+
+def analyze(df: pd.DataFrame, state: incremental.Columns) -> dict:
+    frame = df.reset_index(drop=True)
+    pipeline.analyze(frame, ["MA", "ATR", "RSI"], indicators=state)
+    return {name: frame[name].to_numpy() for name in ["MA", "ATR", "RSI"]}
+
+
+class VectorizedTests(SimpleTestCase):
+    def test_series_match_legacy(self):
+        _, high, low, close = benchmarks.ohlc_arrays(500)
+        df = pd.DataFrame({"High": high, "Low": low, "Close": close})
+        np.testing.assert_array_equal(
+            indicators.calc_rsi(close), legacy.get_rsi(df.copy()).RSI
+        )
+        np.testing.assert_array_equal(
+            indicators.calc_stochastic_oscillator(high, low, close),
+            legacy.get_stochastic_oscillator(df.copy()).SO,
+        )
+
+    def test_pairs_match_legacy(self):
+        _, high, low, close = benchmarks.ohlc_arrays((5, 100))
+        rsi = indicators.calc_rsi(close)
+        so = indicators.calc_stochastic_oscillator(high, low, close)
+        for k in range(5):
+            df = pd.DataFrame({"High": high[k], "Low": low[k], "Close": close[k]})
+            np.testing.assert_array_equal(rsi[k], legacy.get_rsi(df).RSI)
+            np.testing.assert_array_equal(
+                so[k], legacy.get_stochastic_oscillator(df).SO
+            )
+
+
+class TrendDetectorTests(SimpleTestCase):
+    def assertTrendEqual(self, df: pd.DataFrame, expected: pd.DataFrame):
+        for column in TREND:
+            np.testing.assert_array_equal(df[column], expected[column], column)
+
+    def test_growing_window(self):
+        df = benchmarks.ohlc_frame(400)
+        detector = ta.TrendDetector(size=400)
+        for end in range(100, 401, 20):
+            window = df.iloc[:end]
+            self.assertTrendEqual(
+                detector.apply(window.copy()), ta.get_trend(window.copy())
+            )
+
+    def test_sliding_window(self):
+        for df in [benchmarks.ohlc_frame(300, 1), market_frame(300, 2, decimals=3)]:
+            detector = ta.TrendDetector(size=150)
+            for start in range(150):
+                window = df.iloc[start : start + 150].reset_index(drop=True)
+                with self.subTest(start=start):
+                    self.assertTrendEqual(
+                        detector.apply(window.copy()), ta.get_trend(window.copy())
+                    )
+
+    def test_sliding_window_skipping_bars(self):
+        df = market_frame(400, 3)
+        detector = ta.TrendDetector(size=100)
+        for start in range(0, 300, 7):
+            window = df.iloc[start : start + 100].reset_index(drop=True)
+            self.assertTrendEqual(
+                detector.apply(window.copy()), ta.get_trend(window.copy())
+            )
+
+
+class ElliottTests(SimpleTestCase):
+    def test_random_swings_match_legacy(self):
+        # Trends of synthetic candles rarely get past wave 2
+        for seed in range(20):
+            df = legacy.random_swings(300, seed)
+            pd.testing.assert_frame_equal(
+                indicators.get_elliott(df.copy()),
+                legacy.get_elliott(df.copy()),
+            )
+
+    def test_trend_matches_legacy(self):
+        df = benchmarks.ohlc_frame(500)
+        df = indicators.get_wave_length(ta.get_trend(indicators.get_atr(df)))
+        pd.testing.assert_frame_equal(
+            indicators.get_elliott(df.copy()),
+            legacy.get_elliott(df.copy()),
+        )
+
+
+class ValueZoneTests(SimpleTestCase):
+    def setUp(self):
+        self.df = ta.get_trend(indicators.get_atr(benchmarks.ohlc_frame(2000)))
+        self.zones = ta.get_value_zones(self.df)
+
+    def test_zones_match_legacy(self):
+        former = legacy.get_value_zones(self.df)
+        np.testing.assert_allclose(self.zones.bottoms, former.Bottom, rtol=1e-12)
+        np.testing.assert_allclose(self.zones.tops, former.Top, rtol=1e-12)
+
+    def test_inserted_match_built(self):
+        df = self.df.iloc[:-1]
+        points = df[df.UpT | df.DnT].BP.to_numpy()
+        inserted = ta.ValueZoneIndex(self.zones.width)
+        for point in np.random.default_rng(0).permutation(points):
+            inserted.insert(point)
+        np.testing.assert_allclose(inserted.tops, self.zones.tops, rtol=1e-12)
+        np.testing.assert_allclose(inserted.bottoms, self.zones.bottoms, rtol=1e-12)
+
+
+class PipelineTests(SimpleTestCase):
+    def setUp(self):
+        pipeline.window_cache.clear()
+
+    def test_analysis_matches_legacy(self):
+        df = benchmarks.ohlc_frame(500)
+        former = legacy.get_ohlc_analysis(df.copy())
+        for _ in range(2):  # Cold and memoized
+            analysis = get_ohlc_analysis({"df": df.copy()})
+            pd.testing.assert_frame_equal(analysis["df"], former["df"])
+            self.assertEqual(list(analysis["dfz"]), list(former["dfz"]))
+
+    def test_zones_are_not_shared(self):
+        df = benchmarks.ohlc_frame(500)
+        zones = get_ohlc_analysis({"df": df.copy()})["dfz"]
+        expected = list(zones)
+        zones.insert(df.Close.max() + 1)
+        self.assertEqual(list(get_ohlc_analysis({"df": df.copy()})["dfz"]), expected)
+
+
+class CompactFrameTests(SimpleTestCase):
+    def test_restored_frame(self):
+        payloads = [benchmarks.candles_payload(500, seed) for seed in range(3)]
+        full = benchmarks._bot_group(1, False, payloads)[0]
+        small = benchmarks._bot_group(1, True, payloads)[0]
+        for i in full.data:
+            df = full.cached_data(i)["df"].drop(columns=["Bmax", "Bmin"])
+            restored = small.cached_data(i)["df"]
+            pd.testing.assert_frame_equal(restored, df, check_exact=False, rtol=1e-6)
+            # Only moving average and ATR lose precision
+            columns = df.columns.difference(["MA", "ATR"])
+            pd.testing.assert_frame_equal(restored[columns], df[columns])
+
+
+class PanelTests(SimpleTestCase):
+    def setUp(self):
+        pipeline.window_cache.clear()
+        self.frames = {k: benchmarks.ohlc_frame(300, k) for k in range(5)}
+
+    def test_rows_match_single_pairs(self):
+        columns = panel.COLUMNS + ["RSI", "BBL", "BBH", "BBD"] + candles.PATTERNS
+        values = panel.compute(self.frames, columns)
+        for k, df in self.frames.items():
+            single = pipeline.Analysis(df)
+            for name, value in values[k].items():
+                np.testing.assert_array_equal(value, single[name])
+                self.assertIsNone(value.base)  # Doesn't keep the panel alive
+            swings = legacy.calc_swings(single["Bmax"], single["Bmin"])
+            np.testing.assert_array_equal(values[k]["swing"], swings)
+
+    def test_analysis_matches_single_pairs(self):
+        values = panel.compute(self.frames)
+        for k, df in self.frames.items():
+            pipeline.window_cache.clear()
+            pd.testing.assert_frame_equal(
+                get_ohlc_analysis({"df": df.copy()}, values=values[k])["df"],
+                get_ohlc_analysis({"df": df.copy()})["df"],
+            )
+
+
+class ResampleTests(SimpleTestCase):
+    base = enums.Interval.FIVE_MIN
+    intervals = [x.value for x in enums.Interval if x > enums.Interval.FIVE_MIN]
+
+    def test_aggregate_matches_wall_time(self):
+        window = benchmarks.base_candles(5000)
+        for minutes in self.intervals:
+            pd.testing.assert_frame_equal(
+                pd.DataFrame(resample.aggregate(window, minutes, self.base)).drop(
+                    columns="complete"
+                ),
+                legacy.aggregate(window, minutes),
+            )
+
+    def test_rolled_match_rebuilt(self):
+        n = 3000
+        candles = benchmarks.base_candles(n + 100)
+        resampler = resample.Resampler(self.base, n)
+        resampler.update({k: v[:n] for k, v in candles.items()})
+        for minutes in self.intervals:
+            resampler.get(minutes, n)
+        # Every tick the incomplete candle is replaced and a new one starts
+        for j in range(n, n + 100):
+            tick = {k: v[j - 1 : j + 1].copy() for k, v in candles.items()}
+            tick["complete"][:] = [True, False]
+            resampler.update(tick)
+
+        last = {k: v[100:] for k, v in candles.items()}
+        last["complete"] = np.r_[np.ones(n - 1, dtype=bool), False]
+        for minutes in self.intervals:
+            full = resample.aggregate(last, minutes, self.base)
+            first = resample.bucket_starts(last["time"][:1], minutes)[0]
+            cut = int(first != last["time"][0])
+            rolled = resampler.get(minutes, n)
+            for k in resample.FIELDS:
+                np.testing.assert_array_equal(rolled[k], full[k][cut:])
+
+
+class CandlePatternTests(SimpleTestCase):
+    def setUp(self):
+        # Prices in pips, so candles closing at their high or low and dojis occur
+        prices = [np.round(x, 4) for x in benchmarks.ohlc_arrays(500)]
+        self.df = pd.DataFrame(dict(zip(candles.OHLC, prices)))
+        self.patterns = candles.calc_candle_patterns(*prices)
+        self.expected = np.array(
+            [
+                legacy.candle_analysis(self.df.iloc[i - 1 : i + 1])
+                for i in range(1, len(self.df))
+            ],
+            dtype=np.int8,
+        ).T
+
+    def test_patterns_match_legacy(self):
+        for name, values in zip(candles.PATTERNS, self.expected):
+            np.testing.assert_array_equal(self.patterns[name][1:], values)
+            self.assertTrue(values.any(), name)
+
+    def test_last_candle_views(self):
+        for i in range(2, len(self.df) + 1):
+            window = self.df.iloc[i - 2 : i].copy()
+            breakout, *patterns = self.expected[:, i - 2]
+            self.assertEqual(candles.candle_is_bullish(window), breakout == 2)
+            self.assertEqual(candles.candle_is_bearish(window), breakout == 1)
+            last = candles.get_candle_analysis(window).iloc[-1]
+            self.assertEqual(list(last[candles.PATTERNS[1:]]), patterns)
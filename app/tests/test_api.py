@@ -0,0 +1,198 @@
+import time
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from .. import api, enums
+from ..stream import Quote, QuoteBoard
+from .fake import FakeServerMixin
+
+
+class ChangesTests(FakeServerMixin, SimpleTestCase):
+    def open_trade(self) -> str:
+        data = self.endpoint.place_order(self.instruments[0], 1000)
+        return data["orderFillTransaction"]["tradeOpened"]["tradeID"]
+
+    def test_closed_trades(self):
+        trade_id = self.open_trade()
+        since = api.get_account()["last_transaction_id"]
+        self.assertEqual(api.get_trade(trade_id), {"status": enums.OrderStatus.OPEN})
+        self.assertEqual(api.get_changes(since)["closed"], {})
+
+        self.endpoint.close_position(self.instruments[0])
+        changes = api.get_changes(since)
+        trade = self.server.fake.trades[trade_id]
+        self.assertEqual(list(changes["closed"]), [trade_id])
+        closed = changes["closed"][trade_id]
+        self.assertEqual(closed, api.get_trade(trade_id))
+        self.assertEqual(closed["status"], enums.OrderStatus.CLOSED)
+        self.assertEqual(closed["closeprice"], float(trade["averageClosePrice"]))
+        self.assertEqual(closed["net"], round(float(trade["realizedPL"]), 2))
+        self.assertAlmostEqual(
+            closed["closetm"].timestamp(), float(trade["closeTime"]), places=5
+        )
+        self.assertIsNotNone(closed["closetm"].tzinfo)
+        self.assertEqual(changes["last_transaction_id"], self.server.fake.last_id)
+        self.assertIsInstance(changes["account_margin"], float)
+
+    def test_failed_request(self):
+        future = str(int(self.server.fake.last_id) + 1)
+        self.assertEqual(api.get_changes(future), {})
+
+
+def window(times: list[float], close: float = 1.0) -> dict[str, np.ndarray]:
+    """Decoded candles at the times, the last one incomplete."""
+    n = len(times)
+    complete = np.ones(n, dtype=bool)
+    complete[-1:] = False
+    return {
+        "time": np.array(times, dtype=float),
+        "open": np.full(n, close),
+        "high": np.full(n, close),
+        "low": np.full(n, close),
+        "close": np.full(n, close),
+        "volume": np.ones(n, dtype=np.int64),
+        "complete": complete,
+    }
+
+
+class CandleCacheTests(SimpleTestCase):
+    def test_merge(self):
+        cache = api.CandleCache()
+        self.assertIsNone(cache.since("EUR_USD", "M5", 5))
+        cache.merge("EUR_USD", "M5", 5, window([0, 300, 600, 900, 1200]))
+        since = cache.since("EUR_USD", "M5", 5)
+        self.assertEqual(since, 900)
+        self.assertIsNone(cache.since("EUR_USD", "M5", 6))  # Not filled yet
+
+        merged = cache.merge("EUR_USD", "M5", 4, window([1200, 1500], 2.0), since)
+        # The incomplete candle is replaced and the oldest one evicted
+        np.testing.assert_array_equal(merged["time"], [600, 900, 1200, 1500])
+        np.testing.assert_array_equal(merged["close"], [1, 1, 2, 2])
+        np.testing.assert_array_equal(merged["complete"], [True, True, True, False])
+        self.assertEqual(cache.size(("EUR_USD", "M5")), 5)
+        self.assertEqual(cache.since("EUR_USD", "M5", 5), 1200)
+        self.assertFalse(merged["close"].flags.writeable)
+
+
+class OhlcDataTests(FakeServerMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.now = float(int(time.time()) // 300 * 300 + 100)
+        for target, name, value in [
+            (api, "candle_cache", api.CandleCache()),
+            (self.server.fake, "clock", lambda: self.now),
+        ]:
+            patcher = mock.patch.object(target, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def fetch(self) -> tuple[dict, list[dict]]:
+        """Candles of the cached window and the parameters of every request."""
+        with mock.patch.object(
+            self.endpoint, "candles", wraps=self.endpoint.candles
+        ) as candles:
+            data = api.get_ohlc_data(self.instruments[0], "M5", 50)
+        return data["ohlc"], [x.kwargs for x in candles.call_args_list]
+
+    def assertWhole(self, candles: dict):
+        """Candles equal the ones of a window fetched whole."""
+        with mock.patch.object(api, "candle_cache", api.CandleCache()):
+            whole = api.get_ohlc_data(self.instruments[0], "M5", 50)["ohlc"]
+        for k, v in whole.items():
+            np.testing.assert_array_equal(candles[k], v, k)
+
+    def test_new_candles_only(self):
+        candles, requests = self.fetch()
+        self.assertEqual(requests, [{"count": 50}])
+        since = candles["time"][-2]
+
+        self.now += 600
+        candles, requests = self.fetch()
+        self.assertEqual(
+            requests, [{"count": 50, "since": since, "include_first": False}]
+        )
+        self.assertEqual(candles["time"][-1], since + 900)
+        self.assertWhole(candles)
+
+    def test_gap_fetches_whole_window(self):
+        self.fetch()
+        self.now += 50 * 300
+        candles, requests = self.fetch()
+        self.assertEqual(len(requests), 2)
+        self.assertIn("since", requests[0])
+        self.assertEqual(requests[1], {"count": 50})
+        self.assertWhole(candles)
+
+
+class PricingTests(FakeServerMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.quotes = QuoteBoard()
+        patcher = mock.patch.object(api, "quotes", self.quotes)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_snapshot(self):
+        snapshot = api.PricingSnapshot(
+            {
+                "prices": [
+                    {
+                        "instrument": "EUR_USD",
+                        "status": "tradeable",
+                        "bids": [{"price": "1.10000"}],
+                        "asks": [{"price": "1.10010"}],
+                    },
+                    {
+                        "instrument": "USD_JPY",
+                        "status": "non-tradeable",
+                        "bids": [{"price": "150.000"}],
+                        "asks": [{"price": "150.020"}],
+                    },
+                ],
+                "homeConversions": [
+                    {"currency": "EUR", "accountLoss": "1.1"},
+                    {"currency": "USD", "accountLoss": "1"},
+                ],
+            }
+        )
+        self.assertEqual(
+            snapshot.get("EUR_USD", "EUR", "USD"),
+            {
+                "tradeable": True,
+                "bid_price": 1.1,
+                "ask_price": 1.1001,
+                "baseconfac": 1.1,
+                "quoteconfac": 1.0,
+            },
+        )
+        # Without a home conversion of the yen
+        self.assertEqual(snapshot.get("USD_JPY", "USD", "JPY"), {})
+        self.assertEqual(snapshot.get("GBP_USD", "GBP", "USD"), {})
+
+    def test_one_request_for_all_pairs(self):
+        with mock.patch.object(
+            self.endpoint, "pricing", wraps=self.endpoint.pricing
+        ) as pricing:
+            snapshot = api.get_pricing(self.instruments)
+        pricing.assert_called_once_with(self.instruments)
+        for pair in self.instruments:
+            base, quote = pair.split("_")
+            price = snapshot.get(pair, base, quote)
+            self.assertLess(price["bid_price"], price["ask_price"])
+            self.assertEqual(price["quoteconfac"], self.server.fake._conversion(quote))
+        self.assertEqual(snapshot.confacs["USD"], 1)
+        self.assertEqual(self.quotes.confacs, snapshot.confacs)
+
+    def test_streamed_quotes(self):
+        api.get_pricing(self.instruments)  # Home conversions aren't streamed
+        for pair in self.instruments:
+            self.quotes.update(Quote(pair, 0, 1.0, 1.1, True))
+        with mock.patch.object(self.endpoint, "pricing") as pricing:
+            snapshot = api.get_pricing(self.instruments)
+        pricing.assert_not_called()
+        base, quote = self.instruments[0].split("_")
+        self.assertEqual(
+            snapshot.get(self.instruments[0], base, quote)["ask_price"], 1.1
+        )
@@ -0,0 +1,119 @@
+import json
+import threading
+from http.server import ThreadingHTTPServer
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from .. import metrics
+from ..metrics import Histogram, Registry
+
+
+def sample() -> Registry:
+    registry = Registry()
+    registry.observe("GET", "accounts/101-A/summary", 200, 0.02, 0, 512)
+    registry.observe("GET", "accounts/101-A/summary", 503, 0.3, 0, 64)
+    registry.observe("PUT", "accounts/101-A/orders/12/cancel", None, 3.0, 10, 0)
+    registry.observe("PUT", "accounts/101-A/orders/13/cancel", 200, 0.04, 10, 128)
+    return registry
+
+
+class RegistryTests(SimpleTestCase):
+    def test_quantile(self):
+        histogram = Histogram((1, 2, 4))
+        self.assertIsNone(histogram.quantile(0.5))
+        for value in [0.5, 1.5, 1.5, 3]:
+            histogram.observe(value)
+        self.assertEqual(histogram.quantile(0.25), 1)
+        self.assertEqual(histogram.quantile(0.5), 1.5)
+        self.assertEqual(histogram.quantile(1), 4)
+        histogram.observe(10)  # The last bucket is unbounded
+        self.assertEqual(histogram.quantile(1), 4)
+        self.assertEqual(histogram.count, 5)
+
+    def test_routes(self):
+        registry = sample()
+        self.assertEqual(
+            list(registry.state()),
+            [
+                "GET accounts/{accountID}/summary",
+                "PUT accounts/{accountID}/orders/{orderSpecifier}/cancel",
+            ],
+        )
+        cancel = registry.state()[
+            "PUT accounts/{accountID}/orders/{orderSpecifier}/cancel"
+        ]
+        self.assertEqual(cancel["statuses"], {"error": 1, "200": 1})
+        self.assertEqual(cancel["bytes_sent"], 20)
+
+    def test_dump_and_load(self):
+        registry = sample()
+        loaded = Registry.load(json.loads(json.dumps(registry.dump())))
+        self.assertEqual(loaded.state(), registry.state())
+        self.assertEqual(loaded.prometheus(), registry.prometheus())
+
+    def test_prometheus(self):
+        lines = sample().prometheus().splitlines()
+        labels = 'method="GET",route="accounts/{accountID}/summary"'
+        for line in [
+            "# TYPE oanda_requests_total counter",
+            f'oanda_requests_total{{{labels},status="200"}} 1',
+            f'oanda_requests_total{{{labels},status="503"}} 1',
+            f"oanda_response_bytes_total{{{labels}}} 576",
+            f'oanda_request_duration_seconds_bucket{{{labels},le="0.025"}} 1',
+            f'oanda_request_duration_seconds_bucket{{{labels},le="0.2"}} 1',
+            f'oanda_request_duration_seconds_bucket{{{labels},le="0.3"}} 2',
+            f'oanda_request_duration_seconds_bucket{{{labels},le="+Inf"}} 2',
+            f"oanda_request_duration_seconds_count{{{labels}}} 2",
+        ]:
+            self.assertIn(line, lines)
+
+    def test_processes(self):
+        text = metrics.prometheus({"web": Registry(), "worker": sample()})
+        self.assertIn(
+            'oanda_requests_total{process="worker",method="GET",'
+            'route="accounts/{accountID}/summary",status="200"} 1',
+            text,
+        )
+        self.assertNotIn('process="web"', text)
+
+    def test_fetch_served_registry(self):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), metrics.MetricsHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        registry = sample()
+        with mock.patch.object(metrics, "registry", registry):
+            host, port = server.server_address[:2]
+            fetched = metrics.fetch(f"http://{host}:{port}/metrics.json")
+        self.assertEqual(fetched.state(), registry.state())
+        self.assertIsNone(metrics.fetch(f"http://{host}:{port}/missing"))
+
+
+class MetricsViewTests(TestCase):
+    def setUp(self):
+        self.url = reverse("app:oanda_metrics")
+        self.user = User.objects.create_user("trader", password="secret")
+
+    def test_login_required(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 302)
+
+    @override_settings(OANDA_METRICS_WORKER_URL="")
+    def test_metrics(self):
+        self.client.force_login(self.user)
+        with mock.patch.object(metrics, "registry", sample()):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'route="accounts/{accountID}/summary"', response.content)
+        self.assertNotIn(b"process=", response.content)
+
+    @override_settings(OANDA_METRICS_WORKER_URL="http://127.0.0.1:9101/metrics.json")
+    def test_worker_metrics(self):
+        self.client.force_login(self.user)
+        with mock.patch.object(metrics, "fetch", return_value=sample()) as fetch:
+            response = self.client.get(self.url)
+        fetch.assert_called_once_with("http://127.0.0.1:9101/metrics.json")
+        self.assertIn(b'process="worker"', response.content)
@@ -0,0 +1,222 @@
+from unittest import mock
+
+import numpy as np
+from django.test import TestCase
+
+from .. import api, enums
+from ..models import Asset, Bot, BotGroup, Candle, Order, Pair
+from .fake import FakeServerMixin
+from .test_api import window
+
+
+class TradingMixin(FakeServerMixin):
+    """Bot group of the fake server's instruments, orders are placed on the fake account."""
+
+    def setUp(self):
+        super().setUp()
+        self.bg = BotGroup.import_instruments()
+
+    def load(self) -> BotGroup:
+        """Bot group as the worker loads it, e.g. after a restart."""
+        return BotGroup.objects.get(pk=self.bg.pk)
+
+    def open_trade(self, bot: Bot) -> Order:
+        bid, ask = self.server.fake.market.quote(
+            bot.pair.name, self.server.fake.clock()
+        )
+        bot.bg = self.bg
+        bot.order = Order(
+            bot=bot,
+            order_dir=enums.OrderDir.LONG,
+            price=ask,
+            stopprice=round(bid * 0.98, bot.pair.cost_decimals),
+            tpprice=round(ask * 1.04, bot.pair.cost_decimals),
+            vol=1000,
+        )
+        bot._place_order()
+        return bot.order
+
+    def close_trade(self, order: Order):
+        self.assertIsNotNone(self.endpoint.close_position(order.bot.pair.name))
+
+
+class ReconcileTests(TradingMixin, TestCase):
+    def assertClosed(self, order: Order):
+        order.refresh_from_db()
+        self.assertEqual(order.status, enums.OrderStatus.CLOSED)
+        trade = self.server.fake.trades[order.trade_id]
+        self.assertEqual(order.closeprice, float(trade["averageClosePrice"]))
+        self.assertEqual(order.net, round(float(trade["realizedPL"]), 2))
+
+    def test_closed_trades_are_tracked_by_changes(self):
+        bots = list(Bot.objects.all())
+        orders = [self.open_trade(bot) for bot in bots[:2]]
+
+        bg = self.load()
+        self.assertTrue(bg._reconcile(bg.open_orders()))  # Open trades are polled once
+        self.assertEqual(self.load().last_transaction_id, self.server.fake.last_id)
+
+        self.close_trade(orders[0])
+        bg = self.load()  # Resumes from the persisted transaction ID
+        open_orders = bg.open_orders()
+        with (
+            mock.patch.object(api, "get_open_trades") as get_open_trades,
+            mock.patch.object(Bot, "_close_order", autospec=True) as close_order,
+        ):
+            self.assertTrue(bg._reconcile(open_orders))
+        get_open_trades.assert_not_called()
+        close_order.assert_called_once()
+        bot, data = close_order.call_args.args
+        self.assertEqual(bot.order.pk, orders[0].pk)
+        self.assertEqual(data["status"], enums.OrderStatus.CLOSED)
+        self.assertIsNone(open_orders[orders[0].bot_id])
+        self.assertEqual(open_orders[orders[1].bot_id].pk, orders[1].pk)
+        self.assertEqual(self.load().last_transaction_id, self.server.fake.last_id)
+
+    def test_closed_trades_are_closed(self):
+        order = self.open_trade(Bot.objects.first())
+        bg = self.load()
+        bg._reconcile(bg.open_orders())
+
+        self.close_trade(order)
+        bg = self.load()
+        bg._reconcile(bg.open_orders())
+        self.assertClosed(order)
+        self.assertEqual(bg.open_orders()[order.bot_id], None)
+
+    def test_disappeared_trades_are_closed_without_changes(self):
+        bots = list(Bot.objects.all())
+        orders = [self.open_trade(bot) for bot in bots[:2]]
+        self.close_trade(orders[0])
+
+        bg = self.load()
+        bg.last_transaction_id = "1"
+        with (
+            mock.patch.object(api, "get_changes", return_value={}),
+            mock.patch.object(api, "get_trade", wraps=api.get_trade) as get_trade,
+        ):
+            self.assertTrue(bg._reconcile(bg.open_orders()))
+        get_trade.assert_called_once_with(orders[0].trade_id)
+        self.assertClosed(orders[0])
+        self.assertEqual(Order.objects.get(pk=orders[1].pk).closeprice, None)
+        # Tracking starts over from the account's last transaction next tick
+        self.assertEqual(self.load().last_transaction_id, "")
+
+
+class CandleStoreTests(FakeServerMixin, TestCase):
+    def test_upsert_updates_existing_candles(self):
+        Candle.objects.upsert("EUR_USD", "M5", window([0, 300, 600]))
+        Candle.objects.upsert("EUR_USD", "M5", window([600, 900], 2.0))
+        Candle.objects.upsert("EUR_USD", "H1", window([0]))
+
+        candles = Candle.objects.arrays("EUR_USD", "M5")
+        np.testing.assert_array_equal(candles["time"], [0, 300, 600, 900])
+        np.testing.assert_array_equal(candles["close"], [1, 1, 2, 2])
+        np.testing.assert_array_equal(candles["complete"], [True, True, True, False])
+        self.assertEqual(candles["volume"].dtype, np.int64)
+        self.assertEqual(Candle.objects.count(), 5)
+
+    def test_window(self):
+        times = [x * 300 for x in range(10)]
+        Candle.objects.upsert("EUR_USD", "M5", window(times))
+        arrays = Candle.objects.arrays
+        np.testing.assert_array_equal(
+            arrays("EUR_USD", "M5", start=600, end=1500)["time"], times[2:5]
+        )
+        np.testing.assert_array_equal(
+            arrays("EUR_USD", "M5", count=3)["time"], times[-3:]
+        )
+        np.testing.assert_array_equal(
+            arrays("EUR_USD", "M5", end=1500, count=2)["time"], times[3:5]
+        )
+        self.assertEqual(len(arrays("EUR_USD", "H1")["time"]), 0)
+
+    def test_cache_is_seeded_from_store(self):
+        cache = api.CandleCache()
+        cache.store = Candle.objects
+        with mock.patch.object(api, "candle_cache", cache):
+            fetched = api.get_ohlc_data(self.instruments[0], "M5", 50)["ohlc"]
+
+        cache = api.CandleCache()
+        cache.store = Candle.objects
+        with (
+            mock.patch.object(api, "candle_cache", cache),
+            mock.patch.object(self.endpoint, "candles", return_value=None) as candles,
+        ):
+            api.get_ohlc_data(self.instruments[0], "M5", 50)
+            # Only candles after the last complete stored one are requested
+            self.assertEqual(candles.call_args.kwargs["since"], fetched["time"][-2])
+            stored = cache.windows[(self.instruments[0], "M5")]
+        for k, v in fetched.items():
+            np.testing.assert_array_equal(stored[k], v, k)
+
+
+class AccountTests(TradingMixin, TestCase):
+    def test_one_request_per_tick(self):
+        bg = self.load()
+        with mock.patch.object(
+            self.endpoint, "summary", wraps=self.endpoint.summary
+        ) as summary:
+            for bot in bg.bot_set:
+                self.assertTrue(bot._get_account())
+        summary.assert_called_once()
+
+    def test_changes_bring_account(self):
+        bg = self.load()
+        bg._reconcile(bg.open_orders())
+        bg.account = None
+        bg._reconcile(bg.open_orders())
+        with mock.patch.object(self.endpoint, "summary") as summary:
+            self.assertIsNotNone(bg.get_account())
+        summary.assert_not_called()
+
+    def test_requested_again_after_order(self):
+        bot = Bot.objects.first()
+        margin = self.bg.get_account()["account_margin"]
+        order = self.open_trade(bot)
+        self.assertEqual(order.status, enums.OrderStatus.PENDING)
+        self.assertIn(order.trade_id, self.server.fake.trades)
+        self.assertIsNone(self.bg.account)
+        self.assertLess(self.bg.get_account()["account_margin"], margin)
+
+
+def instruments(n: int, margin_rate: str = "0.05") -> list[dict]:
+    currencies = ["EUR", "USD", "JPY", "GBP", "CHF", "AUD", "CAD", "NZD"]
+    pairs = [(a, b) for a in currencies for b in currencies if a != b][:n]
+    return [
+        {
+            "name": f"{a}_{b}",
+            "displayName": f"{a}/{b}",
+            "pipLocation": -2 if "JPY" in (a, b) else -4,
+            "tradeUnitsPrecision": 0,
+            "minimumTradeSize": "1",
+            "marginRate": margin_rate,
+        }
+        for a, b in pairs
+    ]
+
+
+class ImportTests(TestCase):
+    def import_instruments(self, pairs: list[dict], queries: int):
+        with mock.patch.object(api, "get_instruments", return_value=pairs):
+            with self.assertNumQueries(queries):
+                Pair.add_pairs()
+
+    def test_queries(self):
+        # Queries don't depend on the number of instruments
+        for n in [2, 20]:
+            with self.subTest(n=n):
+                Asset.objects.all().delete()
+                self.import_instruments(instruments(n), 7)
+                self.import_instruments(instruments(n), 5)  # Nothing changed
+                self.import_instruments(instruments(n, "0.02"), 6)
+                with self.assertNumQueries(4):
+                    Bot.add_bots()
+                with self.assertNumQueries(3):  # Every pair has a bot
+                    Bot.add_bots()
+
+        pair = Pair.objects.get(name="EUR_JPY")
+        self.assertEqual(pair.max_leverage, 50)
+        self.assertEqual(pair.cost_decimals, 2)
+        self.assertEqual((pair.base.name, pair.quote.name), ("EUR", "JPY"))
+        self.assertEqual(Bot.objects.count(), Pair.objects.count())
@@ -0,0 +1,214 @@
+import os
+import tempfile
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from .. import enums
+from ..cassette import Cassette
+from ..metrics import Registry
+from ..oanda import Api, Endpoint
+from ..throttle import CircuitBreaker, TokenBucket
+from .fake import FakeServerMixin
+
+
+class Clock:
+    """Replaces "time.monotonic" of the throttles, advanced by hand."""
+
+    def __init__(self):
+        self.now = float(int(time.monotonic()))  # Whole seconds add up exactly
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class ThrottleTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = Clock()
+        patcher = mock.patch("app.throttle.time.monotonic", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_token_bucket_delay(self):
+        limiter = TokenBucket(2)
+        self.assertEqual([limiter.delay() for _ in range(4)], [0, 0, 0.5, 1])
+        self.clock.now += 1
+        self.assertEqual(limiter.delay(), 0.5)
+        self.clock.now += 10
+        self.assertEqual(limiter.delay(), 0)  # Refilled up to the capacity only
+        self.assertEqual(limiter.delay(), 0)
+        self.assertEqual(limiter.delay(), 0.5)
+
+    def test_breaker_closes_after_trial(self):
+        breaker = CircuitBreaker(threshold=2, reset_timeout=10)
+        breaker.failure()
+        self.assertTrue(breaker.allow())
+        breaker.failure()
+        self.assertEqual(breaker.status, breaker.OPEN)
+        self.assertFalse(breaker.allow())
+
+        self.clock.now += 10
+        self.assertEqual(breaker.status, breaker.HALF_OPEN)
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())  # One trial at a time
+        breaker.success()
+        self.assertEqual(breaker.status, breaker.CLOSED)
+        self.assertTrue(breaker.allow())
+
+    def test_breaker_reopens_after_failed_trial(self):
+        breaker = CircuitBreaker(threshold=1, reset_timeout=10)
+        breaker.failure()
+        self.clock.now += 10
+        self.assertTrue(breaker.allow())
+        breaker.failure()
+        self.assertEqual(breaker.status, breaker.OPEN)
+        self.assertFalse(breaker.allow())
+
+    def test_breaker_replaces_lost_trial(self):
+        breaker = CircuitBreaker(threshold=1, reset_timeout=10)
+        breaker.failure()
+        self.clock.now += 10
+        self.assertTrue(breaker.allow())
+        breaker.release()  # Throttled, decided nothing
+        self.assertTrue(breaker.allow())
+        self.clock.now += 5
+        self.assertFalse(breaker.allow())
+        self.clock.now += 5
+        self.assertTrue(breaker.allow())
+
+
+@mock.patch("app.oanda.backoff", return_value=0.5)
+class RetryDelayTests(SimpleTestCase):
+    def setUp(self):
+        self.api = Api("101-A", "token", "http://127.0.0.1/v3/", retries=2)
+
+    def test_throttled_requests_of_any_method(self, backoff):
+        for method in enums.Method:
+            self.assertEqual(self.api.get_retry_delay(method, 429, 0, "2"), 2)
+            self.assertEqual(self.api.get_retry_delay(method, 429, 1, None), 0.5)
+            self.assertIsNone(self.api.get_retry_delay(method, 429, 2, "2"))
+
+    def test_server_errors_of_get_only(self, backoff):
+        for status in [None, 500, 503]:
+            self.assertEqual(self.api.get_retry_delay(enums.Method.GET, status, 0), 0.5)
+            self.assertIsNone(self.api.get_retry_delay(enums.Method.GET, status, 2))
+            self.assertIsNone(self.api.get_retry_delay(enums.Method.POST, status, 0))
+            self.assertIsNone(self.api.get_retry_delay(enums.Method.PUT, status, 0))
+
+    def test_client_errors(self, backoff):
+        for status in [200, 400, 404]:
+            self.assertIsNone(self.api.get_retry_delay(enums.Method.GET, status, 0))
+
+
+@mock.patch("app.oanda.backoff", return_value=0)
+class FakeServerTests(FakeServerMixin, SimpleTestCase):
+    """Requests against the fake server, "inject" decides the error of every attempt."""
+
+    def setUp(self):
+        super().setUp()
+        self.breaker = CircuitBreaker(threshold=2, reset_timeout=30)
+        self.endpoint = self.get_endpoint(breaker=self.breaker)
+        self.pair = self.instruments[0]
+
+    def inject(self, *errors):
+        """Errors of the next attempts, None lets the request through."""
+        return mock.patch.object(self.server.fake, "inject", side_effect=errors)
+
+    def test_throttled_requests_are_retried(self, backoff):
+        with self.inject((429, {"Retry-After": "0"}), None) as inject:
+            self.assertIn(
+                "orderFillTransaction", self.endpoint.place_order(self.pair, 10)
+            )
+        self.assertEqual(inject.call_count, 2)
+        with self.inject((429, {"Retry-After": "0"}), None) as inject:
+            self.assertIn("account", self.endpoint.summary())
+        self.assertEqual(inject.call_count, 2)
+
+    def test_server_errors_are_retried_for_get_only(self, backoff):
+        with self.inject((503, {}), None) as inject:
+            self.assertIn("account", self.endpoint.summary())
+        self.assertEqual(inject.call_count, 2)
+
+        orders = len(self.server.fake.orders)
+        with self.inject((503, {}), None) as inject:
+            self.assertIsNone(self.endpoint.place_order(self.pair, 10))
+        self.assertEqual(inject.call_count, 1)
+        self.assertEqual(len(self.server.fake.orders), orders)
+
+    def test_limiter_delay_is_waited(self, backoff):
+        self.endpoint.api.limiters = {"default": TokenBucket(1, 1)}
+        with mock.patch("app.oanda.time.sleep") as sleep:
+            self.endpoint.summary()
+            self.endpoint.summary()
+        # The server's injected latency sleeps too
+        delays = [call.args[0] for call in sleep.call_args_list]
+        self.assertAlmostEqual(max(delays), 1, places=1)
+
+    def test_breaker_fails_fast_until_trial_succeeds(self, backoff):
+        clock = Clock()
+        with mock.patch("app.throttle.time.monotonic", clock):
+            with self.inject(*[(503, {})] * 4) as inject:
+                self.assertIsNone(self.endpoint.summary())
+                self.assertEqual(inject.call_count, 2)  # Opened by the retry
+                self.assertIsNone(self.endpoint.summary())
+                self.assertEqual(inject.call_count, 2)
+                self.assertEqual(self.breaker.status, self.breaker.OPEN)
+
+            clock.now += 30
+            with self.inject(None) as inject:
+                self.assertIn("account", self.endpoint.summary())
+            self.assertEqual(inject.call_count, 1)
+            self.assertEqual(self.breaker.status, self.breaker.CLOSED)
+
+
+@mock.patch("app.oanda.backoff", return_value=0)
+class CassetteTests(FakeServerMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "oanda.jsonl.gz")
+
+    def session(self, endpoint: Endpoint) -> list:
+        pair = self.instruments[0]
+        return [
+            endpoint.summary(),
+            endpoint.candles(pair, "M5", 20),
+            endpoint.place_order(pair, 10),
+            endpoint.place_order(pair, 0),  # Rejected
+            endpoint.candles(pair, "M5", 20),
+            endpoint.pricing(self.instruments),
+        ]
+
+    def test_replay(self, backoff):
+        cassette = Cassette(self.path, Cassette.RECORD)
+        errors = [(503, {}), None, None, None, None, None, None]
+        with mock.patch.object(self.server.fake, "inject", side_effect=errors):
+            recorded = self.session(self.get_endpoint(cassette=cassette))
+        cassette.close()
+
+        # Nothing listens there, every response comes from the cassette
+        replay = Endpoint(
+            "101-A",
+            "token",
+            "http://127.0.0.1:9/v3/",
+            cassette=Cassette(self.path, Cassette.REPLAY),
+            metrics=Registry(),
+        )
+        with mock.patch("app.oanda.time.sleep") as sleep:
+            self.assertEqual(self.session(replay), recorded)
+        self.assertIsNone(recorded[3])
+        self.assertFalse(any(call.args[0] for call in sleep.call_args_list))
+        # The retried attempt is replayed as well
+        summary = replay.api.metrics.state()["GET accounts/{accountID}/summary"]
+        self.assertEqual(summary["statuses"], {"503": 1, "200": 1})
+
+        replay.api.cassette.rewind()
+        self.assertEqual(replay.summary(), recorded[0])
+        # Other queries of a recorded path get its responses
+        self.assertEqual(
+            replay.candles(self.instruments[0], "M5", 10)["candles"],
+            recorded[1]["candles"],
+        )
+        self.assertIsNone(replay.get_trade("1"))
@@ -0,0 +1,70 @@
+import json
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from ..stream import PricingStream, QuoteBoard
+from .fake import FakeServerMixin
+from .test_oanda import Clock
+
+
+class PricingStreamTests(FakeServerMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.clock = Clock()
+        patcher = mock.patch("app.stream.time.monotonic", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.board = QuoteBoard(timeout=10)
+        self.stream = PricingStream(
+            "101-A", "token", self.server.url, self.instruments, self.board
+        )
+
+    def parse(self, msg: dict):
+        self.stream.parse(json.dumps(msg).encode())
+
+    def test_parse(self):
+        self.assertFalse(self.board.live)
+        self.parse({"type": "HEARTBEAT", "time": "1700000000.000000000"})
+        self.assertTrue(self.board.live)
+        self.assertFalse(self.board.has(["EUR_USD"]))
+
+        self.parse(
+            {
+                "type": "PRICE",
+                "instrument": "EUR_USD",
+                "time": "1700000001.500000000",
+                "status": "non-tradeable",
+                "bids": [{"price": "1.10000"}],
+                "asks": [{"price": "1.10010"}],
+            }
+        )
+        quote = self.board.get("EUR_USD")
+        self.assertEqual(quote.time, 1700000001.5)
+        self.assertEqual((quote.bid_price, quote.ask_price), (1.1, 1.1001))
+        self.assertFalse(quote.tradeable)
+        self.assertTrue(self.board.has(["EUR_USD"]))
+
+    def test_quotes_expire(self):
+        self.parse(self.server.fake.price(self.instruments[0]))
+        self.clock.now += 9
+        self.assertIsNotNone(self.board.get(self.instruments[0]))
+        self.clock.now += 1
+        self.assertFalse(self.board.live)
+        self.assertIsNone(self.board.get(self.instruments[0]))
+        self.assertFalse(self.board.has(self.instruments[:1]))
+        self.parse({"type": "HEARTBEAT", "time": "1700000000.000000000"})
+        self.assertIsNotNone(self.board.get(self.instruments[0]))
+
+    def test_stream(self):
+        self.stream.start()
+        self.addCleanup(self.stream.stop)
+        deadline = time.time() + 5
+        while not self.board.has(self.instruments) and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertTrue(self.board.has(self.instruments))
+        for pair in self.instruments:
+            quote = self.board.get(pair)
+            self.assertLess(quote.bid_price, quote.ask_price)
+            self.assertTrue(quote.tradeable)
@@ -0,0 +1,110 @@
+import random
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Token-bucket rate limiter shared between threads and event loops.
+    A token is reserved right away and the caller sleeps for the returned delay,
+    so it works with both "time.sleep" and "asyncio.sleep".
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def delay(self) -> float:
+        """Reserve a token and return the number of seconds to wait for it."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            self.tokens -= 1
+            return max(0.0, -self.tokens / self.rate)
+
+    def state(self) -> dict:
+        return {
+            "rate": self.rate,
+            "capacity": self.capacity,
+            "tokens": round(self.tokens, 2),
+        }
+
+
+class CircuitBreaker:
+    """
+    Fails requests fast after "threshold" failures in a row.
+    After "reset_timeout" seconds a single trial request is let through and its result decides
+    whether the circuit closes or stays open, other requests are refused meanwhile.
+    A trial that never reports back is replaced after another "reset_timeout" seconds.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, threshold: int = 5, reset_timeout: float = 30):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened = 0.0
+        self.probing = 0.0  # Start of the trial request while half-open, 0 if none
+        self.lock = threading.Lock()
+
+    @property
+    def status(self) -> str:
+        if self.failures < self.threshold:
+            return self.CLOSED
+        if time.monotonic() - self.opened < self.reset_timeout:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def allow(self) -> bool:
+        with self.lock:
+            status = self.status
+            if status != self.HALF_OPEN:
+                return status == self.CLOSED
+            now = time.monotonic()
+            if self.probing and now - self.probing < self.reset_timeout:
+                return False
+            self.probing = now
+            return True
+
+    def success(self):
+        with self.lock:
+            if self.failures >= self.threshold:
+                print("[!] OANDA-API circuit breaker closed...")
+            self.failures = 0
+            self.probing = 0.0
+
+    def failure(self):
+        with self.lock:
+            self.probing = 0.0
+            self.failures += 1
+            if self.failures >= self.threshold:
+                if self.failures == self.threshold:
+                    print("[!] OANDA-API circuit breaker opened...")
+                self.opened = time.monotonic()
+
+    def release(self):
+        """Let another trial request through, the last one decided nothing."""
+        with self.lock:
+            self.probing = 0.0
+
+    def state(self) -> dict:
+        return {
+            "status": self.status,
+            "failures": self.failures,
+            "threshold": self.threshold,
+            "reset_timeout": self.reset_timeout,
+        }
+
+
+def backoff(attempt: int, base: float = 0.25, cap: float = 4) -> float:
+    """Return exponential backoff delay with full jitter."""
+    return random.uniform(0, min(cap, base * 2**attempt))
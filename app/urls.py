@@ -11,4 +11,5 @@ urlpatterns = [
     path("bot/group/<int:pk>/start", views.bot_start, name="bot_start"),
     path("bot/group/<int:pk>/stop", views.bot_stop, name="bot_stop"),
     path("bot/group/<int:pk>/reset", views.bot_reset, name="bot_reset"),
+    path("metrics/oanda", views.oanda_metrics, name="oanda_metrics"),
 ]
@@ -2,39 +2,29 @@ import numpy as np
 import pandas as pd
 from django.conf import settings
 
-from . import indicators
+from . import pipeline
 from .candles import *
+from .incremental import Columns
 from .patterns import *
 from .ta import *
 
 
 def prep_data(data: dict, smooth=False) -> dict:
-    df = pd.DataFrame([{**x, **x.pop("mid")} for x in data["ohlc"]])
-    df.drop(df.columns[[0, 3]], axis=1, inplace=True)  # type: ignore
-    df.rename(
-        columns={
-            "time": "Date",
-            "o": "Open",
-            "h": "High",
-            "l": "Low",
-            "c": "Close",
-            "volume": "Volume",
-        },
-        inplace=True,
-    )
-
-    df = df.astype(
+    """Wrap decoded candle arrays into a DataFrame, prices aren't copied."""
+    ohlc = data["ohlc"]
+    df = pd.DataFrame(
         {
-            "Date": "float",
-            "Open": "float",
-            "High": "float",
-            "Low": "float",
-            "Close": "float",
-            "Volume": "int",
-        }
+            "Volume": ohlc["volume"],
+            "Date": pd.to_datetime(ohlc["time"], unit="s", utc=True).tz_convert(
+                settings.TIME_ZONE
+            ),
+            "Open": ohlc["open"],
+            "High": ohlc["high"],
+            "Low": ohlc["low"],
+            "Close": ohlc["close"],
+        },
+        copy=False,
     )
-    df["Date"] = pd.to_datetime(df["Date"], unit="s", utc=True)
-    df["Date"] = df["Date"].dt.tz_convert(settings.TIME_ZONE)
 
     # Smooth candles
     if smooth:
@@ -51,22 +41,30 @@ def prep_data(data: dict, smooth=False) -> dict:
     }
 
 
-def get_ohlc_analysis(data: dict, trend=True, vz=True):
+def get_ohlc_analysis(
+    data: dict,
+    trend=True,
+    vz=True,
+    detector: TrendDetector | None = None,
+    columns: list[str] | None = None,
+    values: dict | None = None,
+    indicators: Columns | None = None,
+):
+    """
+    Add moving average, ATR and trend points to the candles, or only the "columns" requested.
+    Trend points are taken from the "detector" if it's given, see "ta.TrendDetector".
+    "dfz" are the value zones if "vz".
+    "values" are stage results computed already, see "panel.compute".
+    Moving average and ATR are continued from the "indicators" if they're given, see "incremental.Columns".
+    """
     df: pd.DataFrame = data["df"]  # type: ignore
 
-    # Get Indicators
-    df = indicators.get_ema(df)
-    df = indicators.get_atr(df)
-
-    # Identify trend
-    if trend:
-        df = get_trend(df)
+    if columns is None:
+        columns = ["MA", "ATR"] + (list(pipeline.TREND) if trend else [])
+    analysis = pipeline.analyze(df, columns, detector, values, indicators)
 
     # Get Support and Resistance
-    if vz:
-        dfz = get_value_zones(df)
-    else:
-        dfz = None
+    dfz = analysis["zones"] if vz else None
 
     return {"df": df, "dfz": dfz}
 
@@ -1,9 +1,10 @@
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.db.models import Avg
-from django.http import HttpResponseBadRequest
+from django.http import HttpResponse, HttpResponseBadRequest
 from django.shortcuts import redirect, render
 
-from . import chart
+from . import chart, metrics
 from .enums import CloseStatus
 from .models import Bot, BotGroup, Log, Order
 
@@ -88,6 +89,26 @@ def bot_reset(request, pk):
         return HttpResponseBadRequest("Invalid request")
 
 
+@login_required
+def oanda_metrics(request):
+    """
+    OANDA-API request metrics in the Prometheus text format.
+    Bots run in the worker, its metrics are added with a "process" label if its URL is set.
+    """
+    if request.method == "GET":
+        text = metrics.registry.prometheus()
+        if settings.OANDA_METRICS_WORKER_URL:
+            registries = {"web": metrics.registry}
+            if worker := metrics.fetch(settings.OANDA_METRICS_WORKER_URL):
+                registries["worker"] = worker
+            text = metrics.prometheus(registries)
+        return HttpResponse(
+            text, content_type="text/plain; version=0.0.4; charset=utf-8"
+        )
+    else:
+        return HttpResponseBadRequest("Invalid request")
+
+
 def _get_orders_context():
     orders = Order.objects.filter(closeprice__isnull=False)
     won = orders.filter(close_status=CloseStatus.PROFIT)
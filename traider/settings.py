@@ -202,9 +202,41 @@ CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP = True
 
 OANDA_API = os.environ.get(f"{APP_NAME}_OANDA_DEMO_API")
 OANDA_SECRET = os.environ.get(f"{APP_NAME}_OANDA_DEMO_SECRET")
+# Point both URLs at "manage.py fakeoanda" to run without an OANDA account
 OANDA_BASE_URL = os.environ.get(
     f"{APP_NAME}_OANDA_BASE_URL", "https://api-fxpractice.oanda.com/v3/"
 )
+OANDA_STREAM_URL = os.environ.get(
+    f"{APP_NAME}_OANDA_STREAM_URL", "https://stream-fxpractice.oanda.com/v3/"
+)
+OANDA_STREAMING = bool(int(os.environ.get(f"{APP_NAME}_OANDA_STREAMING", 0)))
+OANDA_CONCURRENCY = int(os.environ.get(f"{APP_NAME}_OANDA_CONCURRENCY", 10))
+# Requests per second and burst per endpoint class: "candles", "pricing", "trading", "account".
+# Classes without their own limit share the "default" one.
+OANDA_RATE_LIMITS = {
+    "default": (100, 100),
+}
+# Failures in a row before requests fail fast and seconds before they are retried
+OANDA_CIRCUIT_BREAKER = (5, 30)
+# Granularity longer ones are resampled from instead of being fetched, e.g. "M5",
+# and base candles kept per instrument, windows that need more are fetched directly
+OANDA_RESAMPLE_BASE = os.environ.get(f"{APP_NAME}_OANDA_RESAMPLE_BASE")
+OANDA_RESAMPLE_SIZE = int(os.environ.get(f"{APP_NAME}_OANDA_RESAMPLE_SIZE", 30000))
+# Port and address the process running the bots serves its request metrics on, "/metrics"
+# and "/metrics.json", 0 turns it off. The web process adds the metrics of the JSON URL to its own.
+OANDA_METRICS_PORT = int(os.environ.get(f"{APP_NAME}_OANDA_METRICS_PORT", 0))
+OANDA_METRICS_HOST = os.environ.get(f"{APP_NAME}_OANDA_METRICS_HOST", "127.0.0.1")
+OANDA_METRICS_WORKER_URL = os.environ.get(f"{APP_NAME}_OANDA_METRICS_WORKER_URL")
+# Candle windows the analysis keeps stage results of besides the ones of the bot group,
+# 0 turns memoizing off
+ANALYSIS_CACHE_SIZE = int(os.environ.get(f"{APP_NAME}_ANALYSIS_CACHE_SIZE", 128))
+# Gzipped file requests are recorded to ("record") or replayed from ("replay"),
+# replays wait as long as the original requests took if "REALTIME" is set
+OANDA_CASSETTE = os.environ.get(f"{APP_NAME}_OANDA_CASSETTE")
+OANDA_CASSETTE_MODE = os.environ.get(f"{APP_NAME}_OANDA_CASSETTE_MODE", "replay")
+OANDA_CASSETTE_REALTIME = bool(
+    int(os.environ.get(f"{APP_NAME}_OANDA_CASSETTE_REALTIME", 0))
+)
 
 # Telegram
 